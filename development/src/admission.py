@@ -0,0 +1,110 @@
+# development/src/admission.py
+"""
+Module giới hạn số notebook chạy đồng thời (toàn cục và theo từng section).
+
+Mỗi notebook chạy tốn hai tiến trình (tiến trình chạy + kernel), nên việc khởi động
+hàng chục notebook cùng lúc dễ làm treo máy. Yêu cầu chạy được đưa vào hàng đợi và
+chỉ được cấp phép (admit) khi còn slot trống và CPU/RAM chưa vượt ngưỡng.
+Không phụ thuộc Qt: việc hẹn giờ thử lại được truyền vào qua `schedule_retry`.
+"""
+
+from collections import OrderedDict
+
+try:
+    import psutil
+except ImportError:
+    # psutil là tùy chọn, thiếu thì chỉ giới hạn theo số lượng
+    psutil = None
+
+import config
+
+
+class AdmissionController:
+    def __init__(self, max_global=None, max_cpu_percent=None, max_memory_percent=None, schedule_retry=None):
+        self.max_global = config.MAX_PARALLEL_NOTEBOOKS if max_global is None else max_global
+        self.max_cpu_percent = config.ADMISSION_MAX_CPU_PERCENT if max_cpu_percent is None else max_cpu_percent
+        self.max_memory_percent = config.ADMISSION_MAX_MEMORY_PERCENT if max_memory_percent is None else max_memory_percent
+        self.schedule_retry = schedule_retry
+        self._running = {}
+        self._waiting = OrderedDict()
+        self._retry_pending = False
+        if psutil is not None:
+            # Lần gọi đầu tiên của cpu_percent(None) luôn trả về 0, gọi trước để làm mốc
+            psutil.cpu_percent(interval=None)
+
+    @property
+    def running_count(self):
+        return len(self._running)
+
+    @property
+    def waiting_count(self):
+        return len(self._waiting)
+
+    def running_in_section(self, section_id):
+        return sum(1 for sid in self._running.values() if sid == section_id)
+
+    def counts_by_section(self):
+        """{section_id: (số đang chạy, số đang chờ)}, dùng cho metrics."""
+        counts = {}
+        for section_id in list(self._running.values()):
+            running, waiting = counts.get(section_id, (0, 0))
+            counts[section_id] = (running + 1, waiting)
+        for section_id, _, _ in list(self._waiting.values()):
+            running, waiting = counts.get(section_id, (0, 0))
+            counts[section_id] = (running, waiting + 1)
+        return counts
+
+    def is_queued(self, key):
+        return key in self._waiting
+
+    def request(self, key, section_id, section_limit, start_callback):
+        """
+        Yêu cầu chạy `key`. Trả về True nếu được chạy ngay, False nếu phải chờ;
+        start_callback() sẽ được gọi khi yêu cầu được cấp phép.
+        """
+        if key in self._running or key in self._waiting:
+            return key in self._running
+        self._waiting[key] = (section_id, section_limit, start_callback)
+        self.pump()
+        return key in self._running
+
+    def release(self, key):
+        """Gọi khi một lần chạy kết thúc để nhường slot cho yêu cầu đang chờ."""
+        if self._running.pop(key, None) is not None:
+            self.pump()
+
+    def cancel(self, key):
+        return self._waiting.pop(key, None) is not None
+
+    def _resources_available(self):
+        if psutil is None:
+            return True
+        if self.max_cpu_percent and psutil.cpu_percent(interval=None) > self.max_cpu_percent:
+            return False
+        if self.max_memory_percent and psutil.virtual_memory().percent > self.max_memory_percent:
+            return False
+        return True
+
+    def pump(self):
+        """Cấp phép cho các yêu cầu đang chờ theo thứ tự FIFO, bỏ qua yêu cầu bị chặn bởi giới hạn section."""
+        blocked_by_resources = False
+        for key, (section_id, section_limit, start_callback) in list(self._waiting.items()):
+            if self.max_global and len(self._running) >= self.max_global:
+                break
+            if section_limit and self.running_in_section(section_id) >= section_limit:
+                continue
+            # Luôn cho phép ít nhất một notebook chạy để hàng đợi không bị treo vĩnh viễn
+            if self._running and not self._resources_available():
+                blocked_by_resources = True
+                break
+            del self._waiting[key]
+            self._running[key] = section_id
+            start_callback()
+
+        if blocked_by_resources and self.schedule_retry and not self._retry_pending:
+            self._retry_pending = True
+            self.schedule_retry(config.ADMISSION_RETRY_INTERVAL, self._retry)
+
+    def _retry(self):
+        self._retry_pending = False
+        self.pump()
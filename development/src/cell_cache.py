@@ -0,0 +1,324 @@
+# development/src/cell_cache.py
+"""
+Module cache (memoization) kết quả của từng cell tốn thời gian.
+
+Cell được bật cache bằng tag `cache` (config.CELL_CACHE_TAG). Trước khi chạy, mã
+nguồn của cell được thay bằng lời gọi tới helper trong kernel. Helper băm mã nguồn
+cell cùng giá trị các biến phía trên mà cell đọc. Nếu khóa đã có trên đĩa, các biến
+do cell gán được khôi phục thay vì chạy lại. Nếu chưa có, cell được chạy bình thường
+rồi các biến đó được lưu bằng pickle. Thư mục cache bị giới hạn dung lượng, file ít
+dùng nhất (mtime cũ nhất) bị xóa trước.
+
+Khóa còn gồm mtime/kích thước của các file module/import và các file "inputs" khai
+báo trong metadata notebook, nên cache tự mất hiệu lực khi dữ liệu nguồn thay đổi.
+Biến kiểu chuỗi trỏ tới một file có sẵn cũng được băm theo mtime/kích thước file.
+Cell chỉ thay đổi object tại chỗ (vd: df.drop(..., inplace=True)) nên gán lại kết quả
+để thay đổi được lưu. Không phụ thuộc Qt.
+"""
+
+import ast
+import builtins
+import copy
+import hashlib
+import os
+import symtable
+
+import nbformat
+
+import config
+from cell_profiling import cell_number
+from run_cache import collect_input_files, declared_inputs
+
+
+HELPER_NAME = "__nbrunner_cell_cache"
+
+# Mã chạy trong kernel, định nghĩa helper thực hiện tra cứu/lưu cache cho từng cell
+HELPER_CODE = '''
+class _NBRunnerCellCache:
+    MODULE_MARKER = "__nbrunner_module__"
+
+    def __init__(self, cache_dir, max_bytes, context):
+        self.cache_dir, self.max_bytes, self.context = cache_dir, max_bytes, context
+
+    def _token(self, value):
+        import hashlib, os, pickle, types, uuid
+        if isinstance(value, types.ModuleType):
+            return "module:" + value.__name__
+        code = getattr(value, "__code__", None)
+        if code is not None:
+            body = code.co_code + repr(code.co_consts).encode("utf-8", "replace")
+            return f"function:{getattr(value, '__module__', '')}.{getattr(value, '__qualname__', '')}:" + hashlib.sha256(body).hexdigest()
+        if isinstance(value, type):
+            return f"class:{value.__module__}.{value.__qualname__}"
+        if isinstance(value, str) and len(value) < 4096 and os.path.isfile(value):
+            stat = os.stat(value)
+            return f"file:{value}:{stat.st_mtime_ns}:{stat.st_size}"
+        if type(value).__module__.startswith("pandas") and type(value).__name__ in ("DataFrame", "Series"):
+            import pandas
+            hashed = pandas.util.hash_pandas_object(value, index=True).values.tobytes()
+            return "pandas:" + hashlib.sha256(hashed + repr(getattr(value, "columns", value.name)).encode()).hexdigest()
+        try:
+            return hashlib.sha256(pickle.dumps(value, protocol=4)).hexdigest()
+        except Exception:
+            # Không băm được thì tạo khóa ngẫu nhiên: cell luôn chạy lại, không bao giờ dùng nhầm cache
+            return uuid.uuid4().hex
+
+    def _restore(self, path, ns):
+        import importlib, os, pickle
+        with open(path, "rb") as f:
+            saved = pickle.load(f)
+        for name, value in saved["values"].items():
+            if isinstance(value, tuple) and len(value) == 2 and value[0] == self.MODULE_MARKER:
+                value = importlib.import_module(value[1])
+            ns[name] = value
+        os.utime(path)
+        return saved
+
+    def _save(self, path, values, result):
+        import os, pickle, types
+        payload = {}
+        for name, value in values.items():
+            payload[name] = (self.MODULE_MARKER, value.__name__) if isinstance(value, types.ModuleType) else value
+        try:
+            pickle.dumps(result, protocol=4)
+        except Exception:
+            # Giá trị hiển thị của cell không pickle được thì chỉ lưu các biến
+            result = None
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                pickle.dump({"values": payload, "result": result}, f, protocol=4)
+            os.replace(tmp_path, path)
+        except Exception as e:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            print(f"[cache] Không lưu được cache của cell: {type(e).__name__}: {e}")
+            return
+        self._evict()
+
+    def _evict(self):
+        import os
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if name.endswith(".pkl"):
+                stat = os.stat(os.path.join(self.cache_dir, name))
+                entries.append((stat.st_mtime, stat.st_size, name))
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.cache_dir, name))
+                total -= size
+            except OSError:
+                pass
+
+    def run(self, source, reads, writes, ns):
+        import ast, hashlib, os
+        digest = hashlib.sha256((self.context + "\\0" + source).encode("utf-8"))
+        for name in reads:
+            if name in ns:
+                digest.update(f"\\0{name}\\0{self._token(ns[name])}".encode("utf-8"))
+        path = os.path.join(self.cache_dir, digest.hexdigest() + ".pkl")
+
+        if os.path.exists(path):
+            try:
+                saved = self._restore(path, ns)
+                print(f"[cache] Khôi phục {len(saved['values'])} biến từ cache, không chạy lại cell.")
+                return saved["result"]
+            except Exception:
+                pass
+
+        tree = ast.parse(source)
+        last_expr = None
+        if tree.body and isinstance(tree.body[-1], ast.Expr):
+            last_expr = ast.Expression(tree.body.pop().value)
+        exec(compile(tree, "<cell>", "exec"), ns)
+        result = eval(compile(last_expr, "<cell>", "eval"), ns) if last_expr is not None else None
+        self._save(path, {name: ns[name] for name in writes if name in ns}, result)
+        return result
+'''
+
+
+class _CellNameCollector(ast.NodeVisitor):
+    """Thu thập tên biến cell đọc từ namespace và tên biến cell gán ở cấp module."""
+
+    def __init__(self):
+        self.reads, self.writes = [], []
+
+    def _add(self, names, name):
+        if name not in names:
+            names.append(name)
+
+    def visit_Name(self, node):
+        if isinstance(node.ctx, ast.Load):
+            if name_is_external(node.id, self.writes):
+                self._add(self.reads, node.id)
+        else:
+            self._add(self.writes, node.id)
+
+    def _visit_mutation_target(self, target):
+        # df["x"] = ... hoặc obj.attr = ... thay đổi object đã có, object đó cũng cần được lưu
+        if not isinstance(target, (ast.Subscript, ast.Attribute)):
+            return
+        while isinstance(target, (ast.Subscript, ast.Attribute)):
+            target = target.value
+        if isinstance(target, ast.Name):
+            if name_is_external(target.id, self.writes):
+                self._add(self.reads, target.id)
+            self._add(self.writes, target.id)
+
+    def visit_Assign(self, node):
+        self.visit(node.value)
+        for target in node.targets:
+            self._visit_mutation_target(target)
+            self.visit(target)
+
+    def visit_AugAssign(self, node):
+        self.visit(node.value)
+        self._visit_mutation_target(node.target)
+        if isinstance(node.target, ast.Name) and name_is_external(node.target.id, self.writes):
+            self._add(self.reads, node.target.id)
+        self.visit(node.target)
+
+    def visit_Import(self, node):
+        for alias in node.names:
+            self._add(self.writes, alias.asname or alias.name.split(".")[0])
+
+    def visit_ImportFrom(self, node):
+        for alias in node.names:
+            if alias.name != "*":
+                self._add(self.writes, alias.asname or alias.name)
+
+    def _visit_definition_time(self, node):
+        # Giá trị mặc định của tham số được tính ngay khi định nghĩa, trong namespace của cell.
+        # Biến mà thân hàm/lambda/lớp đọc từ namespace được lấy bằng symtable (_nested_scope_names).
+        args = node.args
+        for default in args.defaults + [d for d in args.kw_defaults if d is not None]:
+            self.visit(default)
+
+    def _visit_function(self, node):
+        for decorator in node.decorator_list:
+            self.visit(decorator)
+        self._visit_definition_time(node)
+        self._add(self.writes, node.name)
+
+    visit_FunctionDef = visit_AsyncFunctionDef = _visit_function
+
+    def visit_ClassDef(self, node):
+        for expression in node.decorator_list + node.bases + [keyword.value for keyword in node.keywords]:
+            self.visit(expression)
+        self._add(self.writes, node.name)
+
+    def visit_Lambda(self, node):
+        self._visit_definition_time(node)
+
+    def _visit_comprehension(self, node):
+        # Biến vòng lặp của comprehension là cục bộ, chỉ iterator đầu tiên được tính trong namespace của cell
+        self.visit(node.generators[0].iter)
+        named = [n.target.id for n in ast.walk(node) if isinstance(n, ast.NamedExpr)]
+        bound = {n.id for n in ast.walk(node) if isinstance(n, ast.Name) and isinstance(n.ctx, ast.Store)} - set(named)
+        for child in ast.walk(node):
+            if isinstance(child, ast.Name) and isinstance(child.ctx, ast.Load) and child.id not in bound:
+                if name_is_external(child.id, self.writes):
+                    self._add(self.reads, child.id)
+        for name in named:
+            # Phép gán := trong comprehension gán vào namespace của cell
+            self._add(self.writes, name)
+
+    visit_ListComp = visit_SetComp = visit_DictComp = visit_GeneratorExp = _visit_comprehension
+
+
+def name_is_external(name, assigned):
+    return name not in assigned and not hasattr(builtins, name)
+
+
+def _nested_scope_names(table):
+    """
+    (biến đọc, biến gán) trên namespace của notebook từ thân các hàm, lambda, lớp và
+    comprehension lồng trong cell. Tham số và biến cục bộ của scope lồng (kể cả biến của
+    hàm bao ngoài) không được tính.
+    """
+    reads, writes = [], []
+    for child in table.get_children():
+        for symbol in child.get_symbols():
+            name = symbol.get_name()
+            if not symbol.is_global():
+                continue
+            if (symbol.is_referenced() or symbol.is_declared_global()) and name not in reads and not hasattr(builtins, name):
+                reads.append(name)
+            if symbol.is_declared_global() and symbol.is_assigned() and name not in writes:
+                # Hàm khai báo `global x` rồi gán: gọi hàm trong cell sẽ sửa biến của notebook
+                writes.append(name)
+        child_reads, child_writes = _nested_scope_names(child)
+        reads.extend(name for name in child_reads if name not in reads)
+        writes.extend(name for name in child_writes if name not in writes)
+    return reads, writes
+
+
+def analyze_cell(source):
+    """Trả về (biến đọc, biến gán) của cell, hoặc None nếu cell không phải mã Python thuần (vd: có magic %)."""
+    try:
+        tree = ast.parse(source)
+        table = symtable.symtable(source, "<cell>", "exec")
+    except SyntaxError:
+        return None
+    collector = _CellNameCollector()
+    collector.visit(tree)
+    # Thân hàm chạy khi được gọi, có thể sau phép gán trong cell: đọc biến toàn cục trong thân
+    # hàm luôn được tính vào khóa cache, kể cả khi cell cũng gán biến đó
+    nested_reads, nested_writes = _nested_scope_names(table)
+    reads = collector.reads + [name for name in nested_reads if name not in collector.reads]
+    writes = collector.writes + [name for name in nested_writes if name not in collector.writes]
+    return reads, writes
+
+
+def context_token(notebook_path, nb, watch_dirs):
+    """Dấu vân tay của các file module/import và file đầu vào khai báo trong metadata notebook."""
+    digest = hashlib.sha256()
+    for path in collect_input_files(notebook_path, declared_inputs(nb) or [], watch_dirs):
+        try:
+            stat = os.stat(path)
+            digest.update(f"\0{path}\0{stat.st_mtime_ns}\0{stat.st_size}".encode("utf-8"))
+        except OSError:
+            digest.update(f"\0{path}\0missing".encode("utf-8"))
+    return digest.hexdigest()
+
+
+def apply_cell_cache(nb, context, cache_dir=None, max_mb=None):
+    """
+    Trả về (bản sao notebook đã gắn cache, số thứ tự trong notebook gốc của các cell không cache được).
+    Notebook không có cell nào gắn tag được trả về nguyên vẹn.
+    """
+    cache_dir = cache_dir or os.path.join(config.CACHE_DIR, "cells")
+    max_bytes = int((config.CELL_CACHE_MAX_MB if max_mb is None else max_mb) * 1024 * 1024)
+
+    tagged = [
+        index
+        for index, cell in enumerate(nb.cells)
+        if cell.cell_type == "code" and config.CELL_CACHE_TAG in cell.get("metadata", {}).get("tags", [])
+    ]
+    if not tagged:
+        return nb, []
+
+    nb = copy.deepcopy(nb)
+    cached_count, skipped = 0, []
+    for index in tagged:
+        cell = nb.cells[index]
+        names = analyze_cell(cell.source)
+        if names is None:
+            skipped.append(cell_number(cell, index))
+            continue
+        reads, writes = names
+        cell.source = f"{HELPER_NAME}.run({cell.source!r}, {reads!r}, {writes!r}, globals())"
+        cached_count += 1
+
+    if cached_count:
+        helper_source = (
+            HELPER_CODE
+            + f"\n{HELPER_NAME} = _NBRunnerCellCache({cache_dir!r}, {max_bytes}, {context!r})\ndel _NBRunnerCellCache\n"
+        )
+        helper_cell = nbformat.v4.new_code_cell(helper_source, metadata={config.NOTEBOOK_METADATA_KEY: {"internal": True}})
+        nb.cells.insert(0, helper_cell)
+    return nb, skipped
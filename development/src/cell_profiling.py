@@ -0,0 +1,151 @@
+# development/src/cell_profiling.py
+"""
+Module đo thời gian và tài nguyên của từng cell, và profile cell được chọn.
+
+- Hook trong kernel (pre_run_cell/post_run_cell của IPython) đo CPU time và mức
+  thay đổi RSS của mỗi cell, gửi về qua một output có mimetype riêng. Output này
+  được StreamingNotebookClient lọc ra, không hiện trong log.
+- Thời gian chạy (wall time) lấy từ timestamp nbclient ghi vào metadata của cell.
+- Cell gắn tag `profile` (config.PROFILE_CELL_TAG) được chạy dưới cProfile (%%prun),
+  file .prof được lưu trong thư mục profile để mở bằng snakeviz/pstats.
+
+Không phụ thuộc Qt.
+"""
+
+import os
+import time
+from datetime import datetime
+
+import config
+
+
+CELL_STATS_MIME = "application/vnd.nbrunner.cell-stats+json"
+
+# Chạy một lần khi làm nóng kernel. Hook được đăng ký trên shell nên vẫn còn sau %reset
+CELL_STATS_HOOK_CODE = f"""
+def __nbrunner_install_cell_stats():
+    import os, time
+    from IPython import get_ipython
+    from IPython.display import display
+    try:
+        import psutil
+        process = psutil.Process(os.getpid())
+    except Exception:
+        process = None
+    state = {{}}
+
+    def rss_mb():
+        return process.memory_info().rss / (1024 * 1024) if process is not None else None
+
+    def pre_run_cell(info=None):
+        state.update(wall=time.perf_counter(), cpu=time.process_time(), rss=rss_mb())
+
+    def post_run_cell(result=None):
+        if "wall" not in state:
+            return
+        rss_after = rss_mb()
+        stats = {{
+            "wall": time.perf_counter() - state["wall"],
+            "cpu": time.process_time() - state["cpu"],
+            "rss_delta_mb": rss_after - state["rss"] if rss_after is not None and state["rss"] is not None else None,
+        }}
+        state.clear()
+        display({{{CELL_STATS_MIME!r}: stats}}, raw=True)
+
+    shell = get_ipython()
+    if shell is not None:
+        shell.events.register("pre_run_cell", pre_run_cell)
+        shell.events.register("post_run_cell", post_run_cell)
+
+__nbrunner_install_cell_stats()
+del __nbrunner_install_cell_stats
+"""
+
+NBCLIENT_TIMESTAMP_FORMAT = "%Y-%m-%dT%H:%M:%S.%fZ"
+
+
+def mark_cell_positions(nb):
+    """Ghi vị trí gốc của cell vào metadata, để nhãn/tên file vẫn đúng sau khi notebook bị tách hoặc chèn cell."""
+    for index, cell in enumerate(nb.cells):
+        cell.setdefault("metadata", {}).setdefault(config.NOTEBOOK_METADATA_KEY, {})["position"] = index
+    return nb
+
+
+def cell_number(cell, fallback_index):
+    """Số thứ tự (bắt đầu từ 1) của cell trong notebook gốc."""
+    return cell.get("metadata", {}).get(config.NOTEBOOK_METADATA_KEY, {}).get("position", fallback_index) + 1
+
+
+def cell_label(cell, fallback_index):
+    """Nhãn ngắn của cell: số thứ tự và dòng mã đầu tiên."""
+    first_line = next((line.strip() for line in cell.source.splitlines() if line.strip()), "")
+    if len(first_line) > 50:
+        first_line = first_line[:47] + "..."
+    return f"[{cell_number(cell, fallback_index)}] {first_line}"
+
+
+def _nbclient_wall_time(cell):
+    execution = cell.get("metadata", {}).get("execution", {})
+    started, finished = execution.get("iopub.execute_input"), execution.get("shell.execute_reply")
+    if not started or not finished:
+        return None
+    try:
+        return (
+            datetime.strptime(finished, NBCLIENT_TIMESTAMP_FORMAT) - datetime.strptime(started, NBCLIENT_TIMESTAMP_FORMAT)
+        ).total_seconds()
+    except ValueError:
+        return None
+
+
+def collect_cell_timings(nb, hook_stats):
+    """
+    Ghép số liệu từ hook trong kernel (theo chỉ số cell) với timestamp của nbclient.
+    Trả về danh sách dict: cell_id, label, wall, cpu, rss_delta_mb.
+    """
+    timings = []
+    for index, cell in enumerate(nb.cells):
+        if cell.cell_type != "code":
+            continue
+        if cell.get("metadata", {}).get(config.NOTEBOOK_METADATA_KEY, {}).get("internal"):
+            # Cell do NBRunner chèn vào (vd: helper của cache cell), không thuộc notebook
+            continue
+        stats = hook_stats.get(index)
+        wall = _nbclient_wall_time(cell)
+        if stats is None and wall is None:
+            continue
+        stats = stats or {}
+        timings.append(
+            {
+                "cell_id": cell.get("id", ""),
+                "label": cell_label(cell, index),
+                "wall": wall if wall is not None else stats.get("wall"),
+                "cpu": stats.get("cpu"),
+                "rss_delta_mb": stats.get("rss_delta_mb"),
+            }
+        )
+    return timings
+
+
+def apply_cell_profiling(nb, notebook_path, profile_dir=None):
+    """
+    Chạy các cell gắn tag PROFILE_CELL_TAG dưới %%prun và lưu file .prof.
+    Trả về (notebook, danh sách đường dẫn file profile sẽ được tạo).
+    """
+    profile_dir = profile_dir or config.PROFILE_DIR
+    notebook_dir = os.path.dirname(notebook_path)
+    profile_paths = []
+    stamp = time.strftime("%Y%m%d-%H%M%S")
+    nb_name = os.path.splitext(os.path.basename(notebook_path))[0]
+    for index, cell in enumerate(nb.cells):
+        if cell.cell_type != "code" or config.PROFILE_CELL_TAG not in cell.get("metadata", {}).get("tags", []):
+            continue
+        os.makedirs(profile_dir, exist_ok=True)
+        path = os.path.join(profile_dir, f"{nb_name}_cell{cell_number(cell, index)}_{stamp}.prof")
+        try:
+            # Đường dẫn tương đối (từ thư mục làm việc của kernel) tránh khoảng trắng trong tham số của %%prun
+            magic_path = os.path.relpath(path, notebook_dir)
+        except ValueError:
+            magic_path = path
+        cell.source = f"%%prun -q -D {magic_path}\n{cell.source}"
+        profile_paths.append(path)
+    return nb, profile_paths
@@ -0,0 +1,104 @@
+# development/src/cell_timeouts.py
+"""
+Module chọn timeout cho từng cell khi chạy notebook.
+
+Thứ tự ưu tiên:
+1. Metadata của cell: `"nbrunner": {"timeout": 120}` (giây).
+2. Timeout thích ứng (khi bật): p99 thời gian chạy của cell trong lịch sử các lần
+   chạy thành công gần nhất nhân với một hệ số, không nhỏ hơn
+   ADAPTIVE_TIMEOUT_MIN_SECONDS. Cell treo (vd: gọi mạng không phản hồi) bị dừng sau
+   vài giây thay vì chờ hết timeout mặc định. Cell gắn tag `cache` không dùng timeout
+   thích ứng vì lịch sử của chúng chủ yếu là các lần lấy từ cache.
+3. Timeout mặc định của card/section (hoặc CELL_TIMEOUT).
+
+Thời gian còn lại của lần lặp (giới hạn thời gian mỗi lần lặp) luôn được áp dụng sau
+cùng trong engine. Không phụ thuộc Qt.
+"""
+
+import threading
+import time
+
+import config
+from cell_profiling import cell_label
+
+
+TIMEOUT_SOURCE_LABELS = {
+    "cell": "metadata của cell",
+    "adaptive": "thích ứng",
+    "default": "mặc định",
+    "iteration": "giới hạn lần lặp",
+}
+
+
+def cell_history_key(cell_id, label):
+    """Khóa nhận diện cell trong lịch sử: id của cell (nbformat 4.5+), nếu không có thì nhãn."""
+    return cell_id or label
+
+
+def cell_timeout_override(cell):
+    """Timeout khai báo trong metadata của cell, None nếu không khai báo hoặc không hợp lệ."""
+    value = cell.get("metadata", {}).get(config.NOTEBOOK_METADATA_KEY, {}).get("timeout")
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or value <= 0:
+        return None
+    return float(value)
+
+
+def invalid_cell_timeouts(nb):
+    """Nhãn các cell khai báo timeout không hợp lệ trong metadata (để cảnh báo)."""
+    invalid = []
+    for index, cell in enumerate(nb.cells):
+        metadata = cell.get("metadata", {}).get(config.NOTEBOOK_METADATA_KEY, {})
+        if "timeout" in metadata and cell_timeout_override(cell) is None:
+            invalid.append(cell_label(cell, index))
+    return invalid
+
+
+class CellTimeoutPolicy:
+    """
+    Tính timeout cho từng cell. load_percentiles() trả về {khóa cell: p99 thời gian chạy},
+    được gọi lại sau mỗi ADAPTIVE_TIMEOUT_REFRESH giây; None thì tắt timeout thích ứng.
+    An toàn khi dùng từ nhiều luồng (fan-out).
+    """
+
+    def __init__(self, default_timeout, adaptive_factor=0, load_percentiles=None):
+        self.default_timeout = default_timeout
+        self.adaptive_factor = adaptive_factor if load_percentiles is not None else 0
+        self._load_percentiles = load_percentiles
+        self._percentiles = {}
+        self._loaded_at = None
+        self._lock = threading.Lock()
+
+    def refresh(self):
+        """Đọc lại lịch sử. Trả về số cell đủ lịch sử để dùng timeout thích ứng."""
+        with self._lock:
+            self._percentiles = self._load_percentiles()
+            self._loaded_at = time.monotonic()
+            return len(self._percentiles)
+
+    def _adaptive_percentiles(self):
+        with self._lock:
+            if self._loaded_at is None or time.monotonic() - self._loaded_at >= config.ADAPTIVE_TIMEOUT_REFRESH:
+                try:
+                    self._percentiles = self._load_percentiles()
+                except Exception:
+                    # Không đọc được lịch sử thì giữ số liệu cũ, thử lại sau
+                    pass
+                self._loaded_at = time.monotonic()
+            return self._percentiles
+
+    def timeout_for(self, cell):
+        """Trả về (số giây, nguồn), nguồn là một khóa của TIMEOUT_SOURCE_LABELS."""
+        override = cell_timeout_override(cell)
+        if override is not None:
+            return override, "cell"
+        metadata = cell.get("metadata", {})
+        if (
+            self.adaptive_factor
+            and not metadata.get(config.NOTEBOOK_METADATA_KEY, {}).get("internal")
+            and config.CELL_CACHE_TAG not in metadata.get("tags", [])
+        ):
+            p99 = self._adaptive_percentiles().get(cell_history_key(cell.get("id"), cell_label(cell, 0)))
+            if p99 is not None:
+                adaptive = max(config.ADAPTIVE_TIMEOUT_MIN_SECONDS, p99 * self.adaptive_factor)
+                return min(self.default_timeout, adaptive), "adaptive"
+        return self.default_timeout, "default"
@@ -27,10 +27,14 @@ if getattr(sys, "frozen", False):
     MODULES_DIR = os.path.join(ROOT_DIR, "module")
     NOTEBOOKS_DIR = os.path.join(ROOT_DIR, "notebook")
     IMPORT_DIR = os.path.join(ROOT_DIR, "import")
+    CACHE_DIR = os.path.join(ROOT_DIR, "cache")
+    OUTPUT_DIR = os.path.join(ROOT_DIR, "output")
 else:
     MODULES_DIR = os.path.join(ROOT_DIR, "app", "module")
     NOTEBOOKS_DIR = os.path.join(ROOT_DIR, "app", "notebook")
     IMPORT_DIR = os.path.join(ROOT_DIR, "app", "import")
+    CACHE_DIR = os.path.join(ROOT_DIR, "app", "cache")
+    OUTPUT_DIR = os.path.join(ROOT_DIR, "app", "output")
 
 APP_BUILD_DIR = os.path.join(ROOT_DIR, "app")
 
@@ -40,9 +44,106 @@ NOTEBOOK_LIST_WIDTH = 300
 RUN_SECTION_WIDTH = 350
 SCHEDULE_MANAGER_WIDTH = 350
 SPLITTER_INITIAL_SIZES = [NOTEBOOK_LIST_WIDTH]
+ELAPSED_CLOCK_REFRESH_MS = 100  # Chu kỳ cập nhật đồng hồ của các card đang chạy
+ELAPSED_CLOCK_IDLE_REFRESH_MS = 1000  # Chu kỳ khi cửa sổ bị thu nhỏ/che khuất
 
 # ===== CÀI ĐẶT LOGGING (MỚI) =====
 LOG_TITLE_NOTEBOOK_PRINT = "Output từ '{nb_name}' tại '{section_name}'"
 LOG_TITLE_NOTEBOOK_ERROR = "Lỗi khi chạy '{nb_name}' tại '{section_name}'"
 MAX_CONSECUTIVE_ERRORS_CONTINOUS = 99
 MAX_CONSECUTIVE_ERRORS_FINITE = 5
+CARD_LOG_MAX_LINES = 500  # Số dòng log tối đa giữ lại trong mỗi card, dòng cũ nhất bị xóa trước
+
+# ===== CÀI ĐẶT THỰC THI =====
+SEQUENTIAL_CONTINUOUS_DELAY = 60  # Chạy lần lượt: số giây chờ trước khi chạy notebook kế tiếp sau một notebook vô hạn
+STOP_GRACE_PERIOD = 2.0  # Số giây chờ tiến trình tự dừng trước khi buộc dừng
+STOP_KILL_TIMEOUT = 3.0  # Số giây chờ sau terminate trước khi kill hẳn tiến trình
+
+# ===== CÀI ĐẶT GIỚI HẠN CHẠY ĐỒNG THỜI =====
+MAX_PARALLEL_NOTEBOOKS = os.cpu_count() or 4  # Số notebook chạy đồng thời tối đa trên toàn ứng dụng (0 = không giới hạn)
+ADMISSION_MAX_CPU_PERCENT = 90  # Tạm hoãn khởi động notebook mới khi CPU vượt ngưỡng (cần psutil)
+ADMISSION_MAX_MEMORY_PERCENT = 85  # Tạm hoãn khởi động notebook mới khi RAM vượt ngưỡng (cần psutil)
+ADMISSION_RETRY_INTERVAL = 2.0  # Số giây giữa các lần thử lại khi bị hoãn vì tài nguyên
+
+# ===== CÀI ĐẶT KERNEL POOL =====
+KERNEL_POOL_MAX_IDLE = 1  # Số kernel nhàn rỗi tối đa giữ lại cho mỗi loại kernel (0 = tắt pool)
+KERNEL_RESET_NAMESPACE = True  # Xóa namespace sau mỗi lần lặp (module đã import vẫn được giữ)
+KERNEL_MAX_RUNS = 50  # Khởi động lại kernel sau N lần chạy (0 = không giới hạn)
+KERNEL_MAX_RSS_MB = 2048  # Khởi động lại kernel khi RSS vượt ngưỡng (0 = không giới hạn, cần psutil)
+KERNEL_STARTUP_TIMEOUT = 60
+KERNEL_PRELOAD_MODULES = ["pandas", "numpy"]
+NOTEBOOK_METADATA_KEY = "nbrunner"  # Khóa metadata của notebook chứa cấu hình riêng của NBRunner (vd: depends_on)
+LOOP_CELL_TAG = "loop"  # Tag đánh dấu cell được chạy lại mỗi lần lặp ở chế độ giữ kernel
+
+# ===== CÀI ĐẶT CACHE KẾT QUẢ =====
+RUN_CACHE_ENABLED = True  # Bỏ qua lần chạy khi notebook có khai báo "inputs" và không có đầu vào nào thay đổi
+CELL_CACHE_ENABLED = True  # Cache kết quả của các cell gắn tag CELL_CACHE_TAG
+CELL_CACHE_TAG = "cache"
+CELL_CACHE_MAX_MB = 1024  # Dung lượng tối đa của cache cell, xóa file ít dùng nhất khi vượt
+
+# ===== CÀI ĐẶT LỊCH SỬ CHẠY =====
+HISTORY_ENABLED = True  # Ghi mỗi lần lặp vào SQLite để thống kê p50/p95 (python main.py --history)
+HISTORY_DB_PATH = os.path.join(OUTPUT_DIR, "run_history.sqlite3")
+HISTORY_BUSY_TIMEOUT = 10.0  # Số giây chờ khi file lịch sử đang bị tiến trình khác khóa
+RESOURCE_SAMPLE_INTERVAL = 1.0  # Chu kỳ lấy mẫu RSS của kernel khi đang chạy (cần psutil)
+CELL_STATS_ENABLED = True  # Đo thời gian, CPU time và thay đổi RAM của từng cell
+PROFILE_CELL_TAG = "profile"  # Cell gắn tag này được chạy dưới cProfile
+PROFILE_DIR = os.path.join(OUTPUT_DIR, "profiles")
+
+# ===== CÀI ĐẶT STREAM OUTPUT =====
+STREAM_BATCH_MAX_CHARS = 8192  # Gửi lô output khi bộ đệm đạt số ký tự này
+STREAM_BATCH_INTERVAL = 0.5  # Hoặc sau mỗi khoảng thời gian này (giây)
+
+# ===== CÀI ĐẶT METRICS (PROMETHEUS) =====
+METRICS_ENABLED = True  # Mở endpoint /metrics cho Prometheus
+METRICS_HOST = "127.0.0.1"  # Chỉ nghe trên máy local, đổi thành "0.0.0.0" để máy khác scrape được
+METRICS_PORT = 9464  # 0 = không mở endpoint HTTP
+METRICS_TEXTFILE_PATH = None  # Đường dẫn file .prom cho textfile collector của node_exporter, None = tắt
+METRICS_TEXTFILE_INTERVAL = 15.0  # Chu kỳ ghi file .prom (giây)
+
+# ===== CÀI ĐẶT LOG CÓ CẤU TRÚC =====
+STRUCTURED_LOG_ENABLED = True  # Ghi log dạng JSONL (mỗi dòng một bản ghi) vào LOG_DIR
+LOG_DIR = os.path.join(OUTPUT_DIR, "logs")
+LOG_FILE_MAX_MB = 50  # Xoay vòng file log khi vượt dung lượng này
+LOG_ROTATE_INTERVAL = 86400  # Hoặc sau mỗi khoảng thời gian này (giây)
+LOG_BACKUP_COUNT = 30  # Số file log cũ được giữ lại
+LOG_COMPRESS = True  # Nén gzip file log cũ
+CONSOLE_LOG_ENABLED = True  # In log ra console
+CONSOLE_LOG_MAX_PER_SECOND = 50  # Số bản ghi tối đa in ra console mỗi giây (0 = không giới hạn)
+
+# ===== CÀI ĐẶT THEO DÕI THƯ MỤC =====
+WATCH_ENABLED = True  # Tự cập nhật danh sách notebook khi thư mục notebook/module thay đổi
+WATCH_DEBOUNCE_MS = 500  # Gom các sự kiện file liên tiếp trong khoảng này thành một lần quét
+WATCH_POLL_INTERVAL = 5.0  # Chu kỳ quét (giây) khi hệ điều hành không hỗ trợ theo dõi thư mục
+
+# ===== CÀI ĐẶT DANH SÁCH NOTEBOOK =====
+DESCRIPTION_LOADER_WORKERS = 4  # Số luồng nạp mô tả notebook trong nền khi dựng danh sách
+NOTEBOOK_SEARCH_DEBOUNCE_MS = 150  # Chờ người dùng ngừng gõ trong khoảng này rồi mới lọc danh sách
+
+# ===== CÀI ĐẶT LẬP LỊCH =====
+SCHEDULE_FILE = os.path.join(OUTPUT_DIR, "schedules.json")  # Nơi lưu các tác vụ hẹn giờ của giao diện
+SCHEDULER_DEFAULT_CATCH_UP = "once"  # Xử lý lần chạy bị lỡ: "once" (chạy bù 1 lần), "skip" (bỏ qua), "all" (chạy bù tất cả)
+SCHEDULER_MISFIRE_GRACE = 60  # Chế độ "skip": vẫn chạy nếu trễ không quá số giây này
+SCHEDULER_MAX_CATCH_UP = 10  # Chế độ "all": số lần chạy bù tối đa cho mỗi tác vụ
+SCHEDULER_MAX_SLEEP = 60  # Số giây tối đa giữa hai lần kiểm tra, để bắt kịp khi đồng hồ hệ thống thay đổi
+
+# ===== CÀI ĐẶT THAM SỐ & FAN-OUT =====
+FANOUT_MAX_WORKERS = os.cpu_count() or 4  # Số kernel chạy song song tối đa trong một lần chạy theo lưới tham số
+FANOUT_OUTPUT_DIR = os.path.join(OUTPUT_DIR, "runs")  # Notebook kết quả của từng bộ tham số và file summary.json
+FANOUT_REUSE_SETUP = True  # Chạy các cell phía trước cell 'parameters' một lần trên mỗi kernel, chụp namespace rồi chỉ chạy phần còn lại cho từng bộ tham số
+
+# ===== CÀI ĐẶT GIỚI HẠN TÀI NGUYÊN =====
+CELL_TIMEOUT = 3600  # Số giây tối đa cho một cell (timeout của nbclient), card/section hoặc metadata "nbrunner.timeout" của cell có thể ghi đè
+NOTEBOOK_MAX_MEMORY_MB = 0  # RAM tối đa của kernel, section/card có thể ghi đè (0 = không giới hạn)
+NOTEBOOK_MAX_SECONDS = 0  # Thời gian tối đa của một lần lặp (0 = không giới hạn)
+NOTEBOOK_NICE = 0  # Mức ưu tiên của tiến trình notebook (0-19, càng lớn càng nhường CPU)
+NOTEBOOK_CPU_AFFINITY = None  # Danh sách CPU được dùng, vd: "0-3" (None = tất cả)
+RESOURCE_CGROUP_PARENT = None  # Thư mục cgroup v2 được ủy quyền (Linux), vd: "/sys/fs/cgroup/user.slice/.../nbrunner"
+LIMIT_ADDRESS_SPACE = False  # Giới hạn thêm bằng RLIMIT_AS (bộ nhớ ảo, lớn hơn RSS nhiều với numpy/pandas)
+MAX_CONSECUTIVE_LIMIT_BREACHES = 3  # Dừng khi vượt giới hạn số lần liên tiếp này (không tính vào số lỗi liên tiếp)
+ADAPTIVE_TIMEOUT_FACTOR = 0  # Timeout thích ứng: p99 thời gian chạy của cell nhân hệ số này, card/section có thể bật riêng (0 = tắt)
+ADAPTIVE_TIMEOUT_PERCENTILE = 0.99  # Phân vị thời gian chạy dùng cho timeout thích ứng
+ADAPTIVE_TIMEOUT_HISTORY = 200  # Số lần chạy thành công gần nhất dùng để tính phân vị
+ADAPTIVE_TIMEOUT_MIN_SAMPLES = 20  # Cell có ít mẫu hơn dùng timeout mặc định
+ADAPTIVE_TIMEOUT_MIN_SECONDS = 30  # Timeout thích ứng không nhỏ hơn số giây này
+ADAPTIVE_TIMEOUT_REFRESH = 600  # Số giây giữa hai lần đọc lại lịch sử khi chạy liên tục
@@ -0,0 +1,153 @@
+# development/src/dag.py
+"""
+Module chạy các notebook trong một section theo đồ thị phụ thuộc (DAG).
+
+Phụ thuộc được khai báo trong metadata của notebook:
+
+    "metadata": {"nbrunner": {"depends_on": ["employee_analysis.ipynb"]}}
+
+hoặc trong file cấu hình section của chế độ headless (khóa `depends_on`).
+Các notebook không phụ thuộc nhau được chạy song song, notebook phía sau bị bỏ qua
+khi một notebook nó phụ thuộc bị lỗi, và đường găng (critical path) được báo cáo
+khi chạy xong. Không phụ thuộc Qt.
+"""
+
+import os
+import time
+
+from notebook_index import shared_index
+
+
+def read_notebook_dependencies(path):
+    """Đọc danh sách notebook phụ thuộc từ metadata của notebook (qua chỉ mục metadata)."""
+    entry = shared_index().get(path)
+    return list(entry["depends_on"]) if entry else []
+
+
+def build_dependencies(paths, extra_dependencies=None):
+    """
+    Tạo ánh xạ notebook -> tập notebook phụ thuộc (chỉ trong phạm vi `paths`).
+    Phụ thuộc được so khớp theo tên file. Trả về (dependencies, warnings).
+    """
+    by_name = {os.path.basename(p): p for p in paths}
+    dependencies, warnings = {}, []
+    for path in paths:
+        names = read_notebook_dependencies(path) + list((extra_dependencies or {}).get(path, []))
+        resolved = set()
+        for name in names:
+            dep_path = by_name.get(os.path.basename(name))
+            if dep_path is None:
+                warnings.append(f"'{os.path.basename(path)}' phụ thuộc '{name}' không có trong section, bỏ qua.")
+            elif dep_path != path:
+                resolved.add(dep_path)
+        dependencies[path] = resolved
+    return dependencies, warnings
+
+
+class DagRun:
+    """Trạng thái của một lần chạy theo DAG: pending -> running -> success/failed, hoặc skipped."""
+
+    def __init__(self, dependencies):
+        self.dependencies = {node: set(deps) for node, deps in dependencies.items()}
+        self.dependents = {node: set() for node in self.dependencies}
+        for node, deps in self.dependencies.items():
+            for dep in deps:
+                self.dependents[dep].add(node)
+        self.order = self._topological_order()
+        self.state = {node: "pending" for node in self.order}
+        self.started_at = {}
+        self.durations = {}
+
+    def _topological_order(self):
+        remaining = {node: len(deps) for node, deps in self.dependencies.items()}
+        # Giữ thứ tự khai báo của section để kết quả ổn định
+        ready = [node for node in self.dependencies if remaining[node] == 0]
+        order = []
+        while ready:
+            node = ready.pop(0)
+            order.append(node)
+            for dependent in self.dependents[node]:
+                remaining[dependent] -= 1
+                if remaining[dependent] == 0:
+                    ready.append(dependent)
+        if len(order) != len(self.dependencies):
+            cycle = sorted(os.path.basename(n) for n, count in remaining.items() if count > 0)
+            raise ValueError(f"Phát hiện phụ thuộc vòng giữa: {', '.join(cycle)}")
+        return order
+
+    def ready_nodes(self):
+        return [
+            node
+            for node in self.order
+            if self.state[node] == "pending" and all(self.state[dep] == "success" for dep in self.dependencies[node])
+        ]
+
+    def mark_started(self, node):
+        self.state[node] = "running"
+        self.started_at[node] = time.time()
+
+    def claim_ready_nodes(self):
+        """
+        Lấy các node sẵn sàng và đánh dấu đang chạy ngay. Lần gọi lồng nhau (node lỗi ngay khi
+        khởi động kích hoạt lượt tiếp theo) chỉ nhận node mới, không khởi động lại node đã lấy.
+        """
+        nodes = self.ready_nodes()
+        for node in nodes:
+            self.mark_started(node)
+        return nodes
+
+    def mark_finished(self, node, success):
+        """Đánh dấu node kết thúc, trả về danh sách node phía sau bị bỏ qua do node này lỗi."""
+        self.state[node] = "success" if success else "failed"
+        self.durations[node] = time.time() - self.started_at.get(node, time.time())
+        if success:
+            return []
+        skipped = []
+        stack = list(self.dependents[node])
+        while stack:
+            dependent = stack.pop()
+            if self.state[dependent] == "pending":
+                self.state[dependent] = "skipped"
+                skipped.append(dependent)
+                stack.extend(self.dependents[dependent])
+        return skipped
+
+    @property
+    def is_finished(self):
+        return all(state not in ("pending", "running") for state in self.state.values())
+
+    def critical_path(self):
+        """Chuỗi phụ thuộc dài nhất theo thời gian chạy thực tế, trả về (danh sách node, tổng số giây)."""
+        best, previous = {}, {}
+        for node in self.order:
+            if node not in self.durations:
+                continue
+            candidates = [dep for dep in self.dependencies[node] if dep in best]
+            longest_dep = max(candidates, key=lambda dep: best[dep], default=None)
+            best[node] = self.durations[node] + (best[longest_dep] if longest_dep else 0)
+            previous[node] = longest_dep
+        if not best:
+            return [], 0.0
+        node = max(best, key=best.get)
+        total = best[node]
+        path = []
+        while node:
+            path.append(node)
+            node = previous[node]
+        return list(reversed(path)), total
+
+    def summary(self):
+        counts = {}
+        for state in self.state.values():
+            counts[state] = counts.get(state, 0) + 1
+        return counts
+
+    def report(self):
+        """Dòng tóm tắt kết quả và đường găng để ghi log."""
+        counts = self.summary()
+        path, total = self.critical_path()
+        critical = " → ".join(os.path.basename(node) for node in path) if path else "-"
+        return (
+            f"Thành công: {counts.get('success', 0)}, lỗi: {counts.get('failed', 0)}, "
+            f"bỏ qua: {counts.get('skipped', 0)}. Đường găng: {critical} ({total:.1f}s)"
+        )
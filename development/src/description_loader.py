@@ -0,0 +1,59 @@
+# development/src/description_loader.py
+"""
+Module nạp mô tả và metadata notebook trong nền cho danh sách notebook.
+
+Notebook được thêm vào danh sách ngay với mô tả tạm, còn việc đọc notebook (qua chỉ
+mục metadata) chạy trong một thread pool. Kết quả được phát qua tín hiệu Qt để cập nhật card
+trên luồng giao diện, nhờ vậy cửa sổ chính hiện ra ngay cả khi có hàng nghìn notebook.
+"""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from PyQt6.QtCore import QObject, Qt, pyqtSignal
+
+import config
+from notebook_index import UNREADABLE_DESCRIPTION, shared_index
+from structured_log import log_message
+
+
+LOADING_DESCRIPTION = "Đang tải mô tả..."
+
+
+class DescriptionLoader(QObject):
+    # Đường dẫn notebook, mô tả, entry của chỉ mục metadata (None nếu không đọc được)
+    description_loaded = pyqtSignal(str, str, object)
+
+    def __init__(self, on_loaded, parent=None):
+        super().__init__(parent)
+        self._executor = ThreadPoolExecutor(max_workers=config.DESCRIPTION_LOADER_WORKERS, thread_name_prefix="DescriptionLoader")
+        self._lock = threading.Lock()
+        self._pending = 0
+        self.description_loaded.connect(on_loaded, Qt.ConnectionType.QueuedConnection)
+
+    def request(self, paths):
+        """Nạp mô tả cho `paths` theo thứ tự truyền vào (notebook ở đầu danh sách được nạp trước)."""
+        paths = list(paths)
+        if not paths:
+            return
+        with self._lock:
+            self._pending += len(paths)
+        for path in paths:
+            self._executor.submit(self._load, path)
+
+    def _load(self, path):
+        try:
+            entry = shared_index().get(path)
+            self.description_loaded.emit(path, entry["description"] if entry else UNREADABLE_DESCRIPTION, entry)
+        except Exception as e:
+            log_message(f"Lỗi khi nạp mô tả notebook {path}: {e}", level="ERROR")
+        finally:
+            with self._lock:
+                self._pending -= 1
+                finished = self._pending == 0
+            if finished:
+                # Lưu chỉ mục một lần sau mỗi đợt nạp
+                shared_index().save()
+
+    def close(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
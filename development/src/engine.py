@@ -0,0 +1,966 @@
+# development/src/engine.py
+"""
+Module chứa lõi thực thi notebook, không phụ thuộc vào Qt.
+Được dùng chung bởi giao diện PyQt6 và chế độ chạy headless (CLI/daemon).
+"""
+
+import copy
+import math
+import os
+import sqlite3
+import time
+import traceback
+import textwrap
+import threading
+import nbformat
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing import Process, Event
+
+from nbclient.exceptions import CellExecutionError, CellTimeoutError
+
+try:
+    import psutil
+except ImportError:
+    # psutil là tùy chọn, thiếu thì không dọn được tiến trình kernel khi buộc dừng
+    psutil = None
+
+import config
+from kernel_pool import KernelPool, build_preload_code
+from run_cache import RunCache
+from cell_cache import apply_cell_cache, context_token
+from run_history import RunHistory
+from structured_log import log_iteration_end, log_message, log_notebook_output
+from cell_profiling import (
+    CELL_STATS_HOOK_CODE,
+    apply_cell_profiling,
+    cell_label,
+    cell_number,
+    collect_cell_timings,
+    mark_cell_positions,
+)
+from cell_timeouts import TIMEOUT_SOURCE_LABELS, CellTimeoutPolicy, invalid_cell_timeouts
+from namespace_snapshot import restore_snapshot, take_snapshot
+from resource_limits import ResourceLimits, apply_process_limits, cgroup_oom_kills
+from parameters import (
+    expand_grid,
+    format_parameters,
+    inject_parameters,
+    run_output_dir,
+    run_output_name,
+    save_executed_notebook,
+    split_at_parameters,
+    write_summary,
+)
+
+
+# Ánh xạ giữa lựa chọn trên giao diện và chế độ thực thi của tiến trình chạy notebook
+EXECUTION_MODE_LABELS = {
+    "continuous": "Lặp lại vô hạn",
+    "count": "Lặp lại hữu hạn",
+    "persistent": "Giữ kernel (lặp cell 'loop')",
+    "fanout": "Chạy theo lưới tham số",
+}
+# Các chế độ chạy vô hạn cho đến khi bị dừng
+CONTINUOUS_MODES = ("continuous", "persistent")
+
+
+def output_to_text(output):
+    """Chuyển một output của cell thành văn bản hiển thị trong log."""
+    output_type = output.get("output_type")
+    if output_type == "stream":
+        return output.get("text", "")
+    if output_type in ("display_data", "execute_result"):
+        text = output.get("data", {}).get("text/plain", "")
+        if text and not text.endswith("\n"):
+            text += "\n"
+        return text
+    # Lỗi được báo riêng qua EXECUTION_ERROR
+    return ""
+
+
+class OutputBatcher:
+    """
+    Gom output của notebook thành từng lô rồi gửi về giao diện qua log_queue dưới
+    dạng NOTEBOOK_PRINT. Một lô được gửi khi đủ kích thước hoặc sau mỗi khoảng thời
+    gian cố định, nên output hiện ra gần như tức thời mà bộ đệm luôn có giới hạn.
+    """
+
+    def __init__(self, log_queue, max_chars=None, interval=None):
+        self.log_queue = log_queue
+        self.max_chars = max_chars or config.STREAM_BATCH_MAX_CHARS
+        self.interval = interval or config.STREAM_BATCH_INTERVAL
+        self._chunks = []
+        self._size = 0
+        self._lock = threading.Lock()
+        self._closed = threading.Event()
+        self._thread = threading.Thread(target=self._flush_loop, daemon=True)
+        self._thread.start()
+
+    def add_output(self, output):
+        self.add(output_to_text(output))
+
+    def add(self, text):
+        if not text:
+            return
+        with self._lock:
+            self._chunks.append(text)
+            self._size += len(text)
+            if self._size >= self.max_chars:
+                self._flush_locked()
+
+    def flush(self):
+        with self._lock:
+            self._flush_locked()
+
+    def _flush_locked(self):
+        if not self._chunks:
+            return
+        combined_output = "".join(self._chunks)
+        self._chunks.clear()
+        self._size = 0
+        if combined_output.strip():
+            self.log_queue.put(("NOTEBOOK_PRINT", combined_output))
+
+    def _flush_loop(self):
+        while not self._closed.wait(self.interval):
+            self.flush()
+
+    def close(self):
+        self._closed.set()
+        self.flush()
+
+
+class KernelResourceSampler:
+    """
+    Lấy mẫu RSS của kernel trong lúc chạy để biết RSS đỉnh, kèm CPU time đã dùng.
+    Khi RSS vượt max_rss_mb, on_limit() được gọi một lần (từ luồng lấy mẫu).
+    """
+
+    def __init__(self, kernel, interval=None, max_rss_mb=0, on_limit=None):
+        self.kernel = kernel
+        self.interval = interval or config.RESOURCE_SAMPLE_INTERVAL
+        self.max_rss_mb = max_rss_mb
+        self.on_limit = on_limit
+        self.limit_exceeded = False
+        self.peak_rss_mb = None
+        self.cpu_time = None
+        self._cpu_start = None
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._sample_loop, daemon=True)
+
+    def _sample(self):
+        rss_mb = self.kernel.rss_mb()
+        if rss_mb is not None:
+            self.peak_rss_mb = max(self.peak_rss_mb or 0, rss_mb)
+            if self.max_rss_mb and rss_mb > self.max_rss_mb and not self.limit_exceeded:
+                self.limit_exceeded = True
+                if self.on_limit is not None:
+                    self.on_limit()
+
+    def _sample_loop(self):
+        while not self._stopped.wait(self.interval):
+            self._sample()
+
+    def start(self):
+        self._cpu_start = self.kernel.cpu_seconds()
+        if self._cpu_start is not None:
+            self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        if self._cpu_start is None:
+            return
+        self._sample()
+        cpu_end = self.kernel.cpu_seconds()
+        if cpu_end is not None:
+            self.cpu_time = cpu_end - self._cpu_start
+
+
+def split_loop_cells(nb):
+    """
+    Tách notebook thành phần khởi tạo (các cell trước cell gắn tag 'loop' đầu tiên, chạy
+    một lần) và phần lặp (từ cell 'loop' đầu tiên tới hết notebook, chạy lại theo đúng thứ
+    tự mỗi lần lặp, kể cả cell không gắn tag nằm xen giữa hoặc phía sau). Nếu không có cell
+    nào gắn tag, toàn bộ cell được lặp lại.
+    """
+    code_cells = [cell for cell in nb.cells if cell.cell_type == "code"]
+    first_loop = next(
+        (index for index, cell in enumerate(code_cells) if config.LOOP_CELL_TAG in cell.get("metadata", {}).get("tags", [])),
+        0,
+    )
+    setup_nb = nbformat.v4.new_notebook(metadata=nb.metadata, cells=code_cells[:first_loop])
+    loop_nb = nbformat.v4.new_notebook(metadata=nb.metadata, cells=code_cells[first_loop:])
+    return setup_nb, loop_nb
+
+
+def untagged_loop_cells(loop_nb):
+    """Số thứ tự các cell không gắn tag 'loop' nhưng nằm sau cell 'loop' đầu tiên (được chạy lại mỗi lần lặp)."""
+    return [
+        cell_number(cell, index)
+        for index, cell in enumerate(loop_nb.cells)
+        if config.LOOP_CELL_TAG not in cell.get("metadata", {}).get("tags", [])
+        and not cell.get("metadata", {}).get(config.NOTEBOOK_METADATA_KEY, {}).get("internal")
+    ]
+
+
+def _execute_notebook_process(
+    notebook_path,
+    log_queue,
+    stop_event,
+    execution_mode,
+    execution_count,
+    execution_delay,
+    modules_path,
+    import_path,
+    force_run=False,
+    section_name="",
+    parameters=None,
+    parameter_grid=None,
+    limits=None,
+    fanout_workers=None,
+):
+    notebook_dir = os.path.dirname(notebook_path)
+
+    # Giới hạn tài nguyên được đặt trước khi khởi động kernel để kernel kế thừa
+    limits = limits or ResourceLimits()
+    cgroup_path, limit_messages = apply_process_limits(limits)
+    for message in limit_messages:
+        log_queue.put(("SECTION_LOG", message))
+
+    code_to_inject = f"""
+        import sys
+        import os
+
+        # Khối mã này cực kỳ quan trọng để file .exe hoạt động.
+        # Nó đảm bảo tiến trình kernel có thể tìm thấy tất cả các thư viện đã được đóng gói (như pandas).
+        if getattr(sys, 'frozen', False):
+            # Trong ứng dụng đã build, thư mục gốc là thư mục chứa file .exe
+            # Tất cả thư viện được PyInstaller đóng gói vào thư mục '_internal'.
+            root_dir = os.path.dirname(sys.executable)
+            internal_libs_path = os.path.join(root_dir, '_internal')
+            
+            # Thêm đường dẫn thư viện đã đóng gói vào sys.path
+            if os.path.exists(internal_libs_path) and internal_libs_path not in sys.path:
+                sys.path.insert(0, internal_libs_path)
+                print(f"NBRunner (Frozen): Added bundled libs path: {{internal_libs_path}}")
+
+        # Khối mã này đảm bảo các module tùy chỉnh của người dùng được tìm thấy.
+        # Nó nhận các đường dẫn tuyệt đối từ ứng dụng chính.
+        modules_path = {repr(modules_path)}
+        import_path = {repr(import_path)}
+
+        # Thêm thư mục 'module' vào sys.path
+        if os.path.exists(modules_path) and modules_path not in sys.path:
+            sys.path.insert(0, modules_path)
+
+        # Thêm thư mục 'import' vào sys.path
+        if os.path.exists(import_path) and import_path not in sys.path:
+            sys.path.insert(0, import_path)
+        """
+
+    # Kernel được khởi động và làm nóng một lần (mã inject + import thư viện nặng),
+    # sau đó được tái sử dụng giữa các lần lặp thay vì khởi động lại từ đầu.
+    warmup_code = textwrap.dedent(code_to_inject) + "\n" + build_preload_code(config.KERNEL_PRELOAD_MODULES)
+    if config.CELL_STATS_ENABLED:
+        warmup_code += "\n" + CELL_STATS_HOOK_CODE
+    pool = KernelPool(
+        warmup_code=warmup_code,
+        watch_dirs=[modules_path, import_path],
+        on_event=lambda message: log_queue.put(("SECTION_LOG", message)),
+    )
+
+    # Output được đẩy về giao diện ngay khi cell in ra, gom theo lô để giảm số message
+    output_batcher = OutputBatcher(log_queue)
+
+    # Số liệu của lần lặp hiện tại, gửi kèm ITERATION_END và ghi vào lịch sử chạy.
+    # Chế độ fan-out chạy nhiều lần lặp song song, mỗi luồng giữ số liệu riêng.
+    iteration_local = threading.local()
+
+    def begin_iteration(iteration, total=None, reset_timer=True, **extra):
+        started_at = time.time()
+        iteration_local.stats = dict(
+            peak_rss_mb=None,
+            cpu_time=None,
+            error=None,
+            limit=None,
+            cells=[],
+            started_at=started_at,
+            deadline=started_at + limits.timeout if limits.timeout else None,
+        )
+        if reset_timer:
+            log_queue.put(("RESET_TIMER", None))
+        log_queue.put(("ITERATION_START", {"iteration": iteration, "total": total, **extra}))
+
+    history = None
+    if config.HISTORY_ENABLED:
+        try:
+            history = RunHistory()
+        except (sqlite3.Error, OSError) as e:
+            log_queue.put(("SECTION_LOG", f"Không mở được lịch sử chạy: {e}"))
+
+    # Timeout từng cell: metadata của cell, timeout thích ứng theo lịch sử, rồi timeout của card/section
+    cell_timeout = limits.cell_timeout or config.CELL_TIMEOUT
+    load_percentiles = None
+    if limits.adaptive_timeout:
+        if history is None:
+            log_queue.put(("SECTION_LOG", "Timeout thích ứng cần lịch sử chạy (HISTORY_ENABLED), dùng timeout mặc định."))
+        else:
+
+            def load_percentiles():
+                return history.cell_duration_percentiles(notebook_path, config.ADAPTIVE_TIMEOUT_PERCENTILE)
+
+    timeout_policy = CellTimeoutPolicy(cell_timeout, limits.adaptive_timeout, load_percentiles)
+    if load_percentiles is not None:
+        try:
+            adaptive_cells = timeout_policy.refresh()
+            log_queue.put(
+                (
+                    "SECTION_LOG",
+                    f"Timeout thích ứng (p{config.ADAPTIVE_TIMEOUT_PERCENTILE * 100:g} x {limits.adaptive_timeout:g}): "
+                    f"{adaptive_cells} cell đủ lịch sử.",
+                )
+            )
+        except sqlite3.Error as e:
+            log_queue.put(("SECTION_LOG", f"Không đọc được lịch sử cho timeout thích ứng: {e}"))
+
+    def end_iteration(iteration, success, consecutive_errors, **extra):
+        iteration_stats = iteration_local.stats
+        finished_at = time.time()
+        started_at = iteration_stats["started_at"]
+        log_queue.put(
+            (
+                "ITERATION_END",
+                {
+                    "iteration": iteration,
+                    "success": success,
+                    "duration": finished_at - started_at,
+                    "consecutive_errors": consecutive_errors,
+                    "peak_rss_mb": iteration_stats["peak_rss_mb"],
+                    "cpu_time": iteration_stats["cpu_time"],
+                    "cells": iteration_stats["cells"],
+                    "limit": iteration_stats["limit"],
+                    **extra,
+                },
+            )
+        )
+        if history is not None:
+            try:
+                history.record_iteration(
+                    notebook_path,
+                    section_name,
+                    execution_mode,
+                    iteration,
+                    started_at,
+                    finished_at,
+                    success,
+                    iteration_stats["error"],
+                    iteration_stats["peak_rss_mb"],
+                    iteration_stats["cpu_time"],
+                    iteration_stats["cells"],
+                )
+            except sqlite3.Error as e:
+                log_queue.put(("SECTION_LOG", f"Không ghi được lịch sử chạy: {e}"))
+        return finished_at - started_at
+
+    def report_unexpected_error(e):
+        output_batcher.flush()
+        # Rút gọn thông báo cho các lỗi chung khác để log luôn sạch sẽ
+        error_details = f"Lỗi không mong muốn: {type(e).__name__}: {e}"
+        iteration_local.stats["error"] = error_details
+        log_queue.put(("EXECUTION_ERROR", {"details": error_details}))
+
+    def report_limit(kind, details):
+        """Lần lặp bị dừng vì vượt giới hạn tài nguyên: trạng thái riêng, không phải lỗi của notebook."""
+        output_batcher.flush()
+        iteration_local.stats["limit"] = kind
+        iteration_local.stats["error"] = details
+        log_queue.put(("LIMIT_EXCEEDED", {"kind": kind, "details": details}))
+
+    # Khi có yêu cầu dừng, ngắt kernel đang chạy để không phải chờ cell dài chạy xong
+    active_kernels = set()
+
+    def interrupt_on_stop():
+        stop_event.wait()
+        kernels = list(active_kernels)
+        if kernels:
+            log_queue.put(("SECTION_LOG", "Đang ngắt kernel..."))
+        for kernel in kernels:
+            kernel.interrupt()
+
+    threading.Thread(target=interrupt_on_stop, daemon=True).start()
+
+    def execute_and_report(kernel, nb, captured_output=None, keep_outputs=False):
+        """Chạy notebook trên kernel và gửi output/lỗi về giao diện. Trả về (thành công, kernel còn dùng được)."""
+        iteration_stats = iteration_local.stats
+
+        def output_sink(output):
+            output_batcher.add_output(output)
+            if captured_output is not None:
+                captured_output.append(output_to_text(output))
+
+        # Số liệu từng cell do hook trong kernel gửi về, theo chỉ số cell
+        cell_stats = {}
+
+        def cell_stats_sink(cell_index, stats):
+            cell_stats[cell_index] = stats
+
+        deadline = iteration_stats["deadline"]
+        # Timeout của cell đang chạy, để báo đúng nguyên nhân khi hết giờ
+        current_timeout = {}
+
+        def timeout_func(cell):
+            seconds, source = timeout_policy.timeout_for(cell)
+            if deadline is not None and deadline - time.time() < seconds:
+                # Cell chỉ được chạy trong phần thời gian còn lại của lần lặp
+                seconds, source = deadline - time.time(), "iteration"
+            current_timeout.update(cell=cell, seconds=seconds, source=source)
+            return max(1, math.ceil(seconds))
+
+        oom_kills_before = cgroup_oom_kills(cgroup_path)
+        active_kernels.add(kernel)
+        # Kernel vượt giới hạn RAM bị kill, lần chạy kết thúc với lỗi kernel chết
+        sampler = KernelResourceSampler(kernel, max_rss_mb=limits.memory_mb, on_limit=kernel.kill)
+        sampler.start()
+        try:
+            kernel.execute_notebook(
+                nb,
+                timeout=cell_timeout,
+                output_sink=output_sink,
+                cell_stats_sink=cell_stats_sink,
+                keep_outputs=keep_outputs,
+                timeout_func=timeout_func,
+            )
+            output_batcher.flush()
+            return True, True
+
+        except CellTimeoutError:
+            if stop_event.is_set():
+                output_batcher.flush()
+                return False, False
+            source = current_timeout.get("source", "default")
+            if source == "iteration":
+                report_limit("timeout", f"Lần lặp chạy quá {limits.timeout:g}s, đã dừng kernel.")
+            else:
+                label = cell_label(current_timeout["cell"], 0) if "cell" in current_timeout else ""
+                report_limit(
+                    "timeout",
+                    f"Cell {label} chạy quá {math.ceil(current_timeout.get('seconds', cell_timeout))}s "
+                    f"(timeout {TIMEOUT_SOURCE_LABELS[source]}), đã dừng kernel.",
+                )
+            # Cell có thể vẫn đang chạy trong kernel, không tái sử dụng kernel này
+            return False, False
+
+        except CellExecutionError as e:
+            # Đẩy hết output còn trong bộ đệm trước để thứ tự log không bị đảo
+            output_batcher.flush()
+            if stop_event.is_set():
+                # Cell bị ngắt do người dùng yêu cầu dừng, không phải lỗi của notebook
+                return False, True
+            if limits.memory_mb and getattr(e, "ename", "") == "MemoryError":
+                report_limit("memory", f"Kernel hết RAM cho phép ({limits.memory_mb}MB).")
+                return False, False
+            # Lấy traceback đầy đủ dưới dạng một chuỗi
+            full_traceback = traceback.format_exc()
+            # Dấu hiệu để tìm phần traceback cuối cùng và quan trọng nhất
+            separator = "---------------------------------------------------------------------------"
+            if separator in full_traceback:
+                # Tách chuỗi và chỉ lấy phần cuối cùng sau dấu phân cách
+                short_traceback = full_traceback.split(separator)[-1].strip()
+            else:
+                # Nếu không tìm thấy dấu phân cách, hiển thị lỗi gốc để không mất thông tin
+                short_traceback = str(e)
+            # Chỉ gửi phần lỗi đã được rút gọn về giao diện
+            iteration_stats["error"] = short_traceback
+            log_queue.put(("EXECUTION_ERROR", {"details": short_traceback}))
+            return False, True
+
+        except Exception as e:
+            # Lỗi ngoài cell (kernel chết, timeout...) thì không tái sử dụng kernel này nữa
+            oom_kills_after = cgroup_oom_kills(cgroup_path)
+            if sampler.limit_exceeded or (oom_kills_after or 0) > (oom_kills_before or 0):
+                peak_text = f", RSS đỉnh {sampler.peak_rss_mb:.0f}MB" if sampler.peak_rss_mb else ""
+                report_limit("memory", f"Kernel vượt giới hạn RAM {limits.memory_mb}MB{peak_text}, đã dừng kernel.")
+            else:
+                report_unexpected_error(e)
+            return False, False
+
+        finally:
+            active_kernels.discard(kernel)
+            sampler.stop()
+            # Chế độ giữ kernel có thể chạy nhiều phần notebook trong một lần lặp, cộng dồn số liệu
+            if sampler.peak_rss_mb is not None:
+                iteration_stats["peak_rss_mb"] = max(iteration_stats.get("peak_rss_mb") or 0, sampler.peak_rss_mb)
+            if sampler.cpu_time is not None:
+                iteration_stats["cpu_time"] = (iteration_stats.get("cpu_time") or 0) + sampler.cpu_time
+            if config.CELL_STATS_ENABLED:
+                iteration_stats.setdefault("cells", []).extend(collect_cell_timings(nb, cell_stats))
+
+    timeout_warnings = set()
+
+    def read_notebook():
+        with open(notebook_path, "r", encoding="utf-8") as f:
+            nb = mark_cell_positions(nbformat.read(f, as_version=4))
+        for label in invalid_cell_timeouts(nb):
+            if label not in timeout_warnings:
+                timeout_warnings.add(label)
+                log_queue.put(("SECTION_LOG", f"Cell {label}: 'timeout' trong metadata phải là số giây dương, dùng timeout mặc định."))
+        return nb
+
+    def checkout_kernel(nb):
+        kernel_name = nb.metadata.get("kernelspec", {}).get("name", "")
+        kernel = pool.checkout(kernel_name, notebook_dir)
+        if kernel.run_count == 0:
+            # Kernel mới khởi động (kể cả kernel được khởi động sẵn), báo thời gian khởi động cho metrics
+            log_queue.put(("KERNEL_STARTED", {"start_latency": kernel.start_latency}))
+        return kernel
+
+    # Cảnh báo về tham số chỉ gửi một lần cho mỗi tiến trình, kể cả khi fan-out chạy nhiều lần
+    parameter_warnings = set()
+
+    def apply_parameters(nb, run_parameters):
+        """Chèn cell tham số theo kiểu papermill sau cell gắn tag 'parameters'."""
+        nb, unknown, has_parameters_cell = inject_parameters(nb, run_parameters)
+        warnings = []
+        if not has_parameters_cell:
+            warnings.append("Notebook không có cell gắn tag 'parameters', tham số được chèn vào đầu notebook.")
+        if unknown:
+            warnings.append(f"Tham số không được khai báo trong cell 'parameters': {', '.join(unknown)}")
+        for warning in warnings:
+            if warning not in parameter_warnings:
+                parameter_warnings.add(warning)
+                log_queue.put(("SECTION_LOG", warning))
+        return nb
+
+    def checkout_kernel_for_notebook():
+        nb = apply_parameters(read_notebook(), parameters)
+        return nb, checkout_kernel(nb)
+
+    # Cache kết quả: bỏ qua lần chạy khi notebook và mọi đầu vào đã khai báo không đổi
+    run_cache = RunCache() if config.RUN_CACHE_ENABLED else None
+
+    def lookup_cache(nb):
+        """Trả về (entry cache trùng khớp hoặc None, fingerprint để lưu sau khi chạy hoặc None)."""
+        if run_cache is None:
+            return None, None
+        try:
+            previous = run_cache.load(notebook_path)
+            fingerprint = run_cache.fingerprint(notebook_path, nb, [modules_path, import_path], previous)
+        except OSError as e:
+            log_queue.put(("SECTION_LOG", f"Không kiểm tra được cache: {e}"))
+            return None, None
+        if fingerprint is None or force_run or not previous or previous.get("key") != fingerprint[0]:
+            return None, fingerprint
+        return previous, fingerprint
+
+    def prepare_cell_cache(nb):
+        """Gắn cache cho các cell có tag CELL_CACHE_TAG."""
+        if not config.CELL_CACHE_ENABLED:
+            return nb
+        context = context_token(notebook_path, nb, [modules_path, import_path])
+        nb, skipped = apply_cell_cache(nb, context)
+        for number in skipped:
+            log_queue.put(("SECTION_LOG", f"Cell {number} có magic/cú pháp đặc biệt, không cache được."))
+        return nb
+
+    def prepare_notebook(nb):
+        """Gắn cache cell và cProfile cho các cell được đánh tag trước khi chạy."""
+        nb = prepare_cell_cache(nb)
+        nb, profile_paths = apply_cell_profiling(nb, notebook_path)
+        for path in profile_paths:
+            log_queue.put(("SECTION_LOG", f"Profile cell sẽ được lưu tại: {path}"))
+        return nb
+
+    def run_single_notebook(run_parameters=None, use_cache=True, output_path=None):
+        """
+        Chạy notebook một lần. use_cache=False bỏ qua cache kết quả (không tra, không ghi).
+        output_path: nơi lưu notebook kết quả (mã gốc kèm output).
+        """
+        nb = source_nb = None
+        try:
+            # Cell tham số được chèn trước khi tính fingerprint, nên cache kết quả phân biệt theo tham số
+            nb = apply_parameters(read_notebook(), parameters if run_parameters is None else run_parameters)
+            cached_entry, fingerprint = lookup_cache(nb) if use_cache else (None, None)
+            if cached_entry is not None:
+                finished_at = time.strftime("%H:%M:%S %d/%m", time.localtime(cached_entry["finished_at"]))
+                log_queue.put(("SECTION_LOG", f"Đầu vào không đổi từ lần chạy lúc {finished_at}, dùng kết quả cache."))
+                if cached_entry["output"].strip():
+                    log_queue.put(("NOTEBOOK_PRINT", cached_entry["output"]))
+                return True, nb
+            if output_path is not None:
+                source_nb = copy.deepcopy(nb)
+            nb = prepare_notebook(nb)
+            kernel = checkout_kernel(nb)
+        except Exception as e:
+            report_unexpected_error(e)
+            return False, nb
+
+        captured_output = [] if fingerprint is not None else None
+        success, kernel_healthy = execute_and_report(kernel, nb, captured_output, keep_outputs=source_nb is not None)
+        pool.checkin(kernel, healthy=kernel_healthy)
+        if source_nb is not None:
+            try:
+                save_executed_notebook(source_nb, nb, output_path)
+            except (OSError, ValueError) as e:
+                log_queue.put(("SECTION_LOG", f"Không lưu được notebook kết quả: {e}"))
+        if success and fingerprint is not None:
+            try:
+                run_cache.store(notebook_path, fingerprint[0], fingerprint[1], "".join(captured_output))
+            except OSError as e:
+                log_queue.put(("SECTION_LOG", f"Không ghi được cache: {e}"))
+        return success, nb
+
+    # Chế độ giữ kernel: cell khởi tạo chỉ chạy một lần, các lần lặp chỉ chạy lại cell gắn tag 'loop'
+    persistent_state = {"kernel": None, "loop_nb": None}
+
+    def run_persistent_iteration():
+        kernel = persistent_state["kernel"]
+        if kernel is None:
+            try:
+                nb, kernel = checkout_kernel_for_notebook()
+            except Exception as e:
+                report_unexpected_error(e)
+                return False, None
+
+            setup_nb, loop_nb = split_loop_cells(prepare_notebook(nb))
+            if not setup_nb.cells:
+                log_queue.put(("SECTION_LOG", f"Không có cell gắn tag '{config.LOOP_CELL_TAG}', chạy lại toàn bộ mỗi lần lặp."))
+            else:
+                log_queue.put(("SECTION_LOG", f"Khởi tạo: {len(setup_nb.cells)} cell, lặp: {len(loop_nb.cells)} cell."))
+                untagged = untagged_loop_cells(loop_nb)
+                if untagged:
+                    log_queue.put(
+                        (
+                            "SECTION_LOG",
+                            f"Cell {', '.join(map(str, untagged))} không gắn tag '{config.LOOP_CELL_TAG}' nhưng nằm sau cell lặp đầu tiên, "
+                            "được chạy lại mỗi lần lặp.",
+                        )
+                    )
+                success, _ = execute_and_report(kernel, setup_nb)
+                if not success:
+                    # Namespace khởi tạo dở dang, bỏ kernel để lần lặp sau khởi tạo lại từ đầu
+                    kernel.shutdown()
+                    return False, setup_nb
+            persistent_state.update(kernel=kernel, loop_nb=loop_nb)
+
+        loop_nb = persistent_state["loop_nb"]
+        success, kernel_healthy = execute_and_report(kernel, loop_nb)
+        if not kernel_healthy:
+            kernel.shutdown()
+            persistent_state["kernel"] = None
+        return success, loop_nb
+
+    # Sweep: mỗi luồng fan-out giữ một kernel đã chạy phần khởi tạo và chụp namespace
+    sweep_local = threading.local()
+    sweep_kernels = []
+    sweep_lock = threading.Lock()
+
+    def discard_sweep_kernel(kernel):
+        with sweep_lock:
+            if kernel in sweep_kernels:
+                sweep_kernels.remove(kernel)
+        kernel.shutdown()
+        sweep_local.kernel = None
+
+    def run_sweep_notebook(sweep_parts, run_parameters, output_path):
+        """
+        Chạy một bộ tham số trên kernel riêng của luồng hiện tại. Lần đầu, phần trước cell
+        'parameters' được chạy rồi namespace được chụp lại; các lần sau chỉ khôi phục
+        namespace và chạy phần còn lại. Trả về True nếu thành công.
+        """
+        setup_template, tail_template = sweep_parts
+        kernel = getattr(sweep_local, "kernel", None)
+        try:
+            if kernel is None:
+                setup_nb = prepare_notebook(copy.deepcopy(setup_template))
+                kernel = checkout_kernel(setup_nb)
+                success, kernel_healthy = execute_and_report(kernel, setup_nb, keep_outputs=output_path is not None)
+                if not success:
+                    # Namespace khởi tạo dở dang, bộ tham số sau sẽ khởi tạo lại trên kernel khác
+                    pool.checkin(kernel, healthy=False)
+                    return False
+                shared = take_snapshot(kernel, cell_timeout)
+                if shared:
+                    log_queue.put(("SECTION_LOG", f"Biến không sao chép được, dùng chung giữa các bộ tham số: {', '.join(shared)}"))
+                sweep_local.kernel, sweep_local.setup_nb = kernel, setup_nb
+                with sweep_lock:
+                    sweep_kernels.append(kernel)
+            else:
+                restore_snapshot(kernel, cell_timeout)
+            tail_nb = apply_parameters(copy.deepcopy(tail_template), run_parameters)
+            source_tail = copy.deepcopy(tail_nb) if output_path is not None else None
+            tail_nb = prepare_notebook(tail_nb)
+        except Exception as e:
+            report_unexpected_error(e)
+            if kernel is not None:
+                discard_sweep_kernel(kernel)
+            return False
+
+        success, kernel_healthy = execute_and_report(kernel, tail_nb, keep_outputs=source_tail is not None)
+        if source_tail is not None:
+            source_nb = nbformat.v4.new_notebook(metadata=setup_template.metadata, cells=setup_template.cells + source_tail.cells)
+            executed_nb = nbformat.v4.new_notebook(cells=sweep_local.setup_nb.cells + tail_nb.cells)
+            try:
+                save_executed_notebook(source_nb, executed_nb, output_path)
+            except (OSError, ValueError) as e:
+                log_queue.put(("SECTION_LOG", f"Không lưu được notebook kết quả: {e}"))
+        if not kernel_healthy:
+            discard_sweep_kernel(kernel)
+        return success
+
+    def plan_sweep():
+        """(phần khởi tạo, phần theo tham số) nếu có thể dùng lại kernel giữa các bộ tham số, ngược lại None."""
+        if not config.FANOUT_REUSE_SETUP:
+            return None
+        try:
+            sweep_parts = split_at_parameters(read_notebook())
+        except Exception as e:
+            report_unexpected_error(e)
+            return None
+        if sweep_parts is not None:
+            setup_count = sum(1 for cell in sweep_parts[0].cells if cell.cell_type == "code")
+            tail_count = sum(1 for cell in sweep_parts[1].cells if cell.cell_type == "code")
+            log_queue.put(
+                (
+                    "SECTION_LOG",
+                    f"Sweep: {setup_count} cell khởi tạo chạy một lần trên mỗi kernel, {tail_count} cell chạy cho từng bộ tham số.",
+                )
+            )
+        return sweep_parts
+
+    def run_fanout():
+        """
+        Chạy notebook trên mọi bộ tham số của lưới, fanout_workers kernel song song (không
+        vượt FANOUT_MAX_WORKERS). Mỗi bộ tham số là một lần lặp, notebook kết quả và file
+        summary.json được lưu trong FANOUT_OUTPUT_DIR. Trả về True nếu mọi lần chạy thành công.
+        """
+        try:
+            runs = [{**(parameters or {}), **grid_parameters} for grid_parameters in expand_grid(parameter_grid)]
+        except ValueError as e:
+            log_queue.put(("EXECUTION_ERROR", {"details": f"Lưới tham số không hợp lệ: {e}"}))
+            return False
+
+        started_at = time.strftime("%Y%m%d-%H%M%S")
+        output_dir = run_output_dir(notebook_path, started_at)
+        workers = max(1, min(fanout_workers or config.FANOUT_MAX_WORKERS, config.FANOUT_MAX_WORKERS, len(runs)))
+        # Giữ lại đủ kernel nhàn rỗi cho mọi luồng, bộ tham số sau dùng lại kernel đã reset namespace
+        pool.max_idle = max(pool.max_idle, workers)
+        log_queue.put(("SECTION_LOG", f"Fan-out: {len(runs)} bộ tham số, {workers} kernel song song."))
+        log_queue.put(("RESET_TIMER", None))
+        sweep_parts = plan_sweep()
+
+        def run_one(index):
+            run_parameters = runs[index]
+            if stop_event.is_set():
+                return {"parameters": run_parameters, "status": "cancelled"}
+            output_path = os.path.join(output_dir, run_output_name(index + 1, run_parameters))
+            label = format_parameters(run_parameters)
+            begin_iteration(index + 1, len(runs), reset_timer=False, parameters=label)
+            if sweep_parts is not None:
+                success = run_sweep_notebook(sweep_parts, run_parameters, output_path)
+            else:
+                success, _ = run_single_notebook(run_parameters, use_cache=False, output_path=output_path)
+            error, limit = iteration_local.stats["error"], iteration_local.stats["limit"]
+            duration = end_iteration(index + 1, success, 0 if success else 1, parameters=label)
+            return {
+                "parameters": run_parameters,
+                "status": "success" if success else ("limit" if limit else "error"),
+                "duration": round(duration, 3),
+                "error": error,
+                "output": output_path,
+            }
+
+        try:
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="FanOut") as executor:
+                results = list(executor.map(run_one, range(len(runs))))
+        finally:
+            # Trả kernel về pool, namespace được reset như sau mọi lần chạy khác
+            for kernel in sweep_kernels:
+                pool.checkin(kernel)
+            sweep_kernels.clear()
+
+        succeeded = sum(1 for result in results if result["status"] == "success")
+        summary_path = os.path.join(output_dir, "summary.json")
+        try:
+            write_summary(
+                summary_path,
+                {"notebook": notebook_path, "section": section_name, "started_at": started_at, "runs": results},
+            )
+        except OSError as e:
+            log_queue.put(("SECTION_LOG", f"Không ghi được file tổng hợp: {e}"))
+        log_queue.put(("SECTION_LOG", f"Fan-out: {succeeded}/{len(runs)} thành công. Kết quả: {output_dir}"))
+        return succeeded == len(runs)
+
+    # Kết quả cuối cùng gửi kèm EXECUTION_FINISHED: False nếu dừng vì lỗi hoặc chưa đủ số lần thành công
+    finished_ok = True
+    try:
+        # Chạy theo lưới tham số
+        if execution_mode == "fanout":
+            finished_ok = run_fanout()
+
+        # Chạy lặp vô hạn
+        elif execution_mode in CONTINUOUS_MODES:
+            iteration = 1
+            consecutive_errors = consecutive_limits = 0
+            while not stop_event.is_set():
+                begin_iteration(iteration)
+                if execution_mode == "persistent":
+                    success, final_nb = run_persistent_iteration()
+                else:
+                    # Cache chỉ được kiểm tra ở lần lặp đầu, các lần lặp sau luôn chạy thật
+                    success, final_nb = run_single_notebook(use_cache=iteration == 1)
+
+                # Vượt giới hạn tài nguyên được đếm riêng, không tính là lỗi của notebook
+                limit = iteration_local.stats["limit"]
+                if success:
+                    consecutive_errors = consecutive_limits = 0
+                elif limit:
+                    consecutive_limits += 1
+                else:
+                    consecutive_errors += 1
+
+                end_iteration(iteration, success, consecutive_errors)
+
+                if not success and consecutive_errors >= config.MAX_CONSECUTIVE_ERRORS_CONTINOUS:
+                    log_queue.put(("SECTION_LOG", f"Dừng do lỗi {consecutive_errors} lần liên tiếp."))
+                    finished_ok = False
+                    break
+                if limit and consecutive_limits >= config.MAX_CONSECUTIVE_LIMIT_BREACHES:
+                    log_queue.put(("SECTION_LOG", f"Dừng do vượt giới hạn tài nguyên {consecutive_limits} lần liên tiếp."))
+                    finished_ok = False
+                    break
+
+                if stop_event.is_set():
+                    break
+
+                if execution_delay > 0 and not stop_event.is_set():
+                    log_queue.put(("SECTION_LOG", f"Nghỉ {execution_delay}s..."))
+                    time.sleep(execution_delay)
+                iteration += 1
+
+        # Chạy lặp hữu hạn (chỉ tính lần thành công)
+        else:
+            successful_runs = 0
+            total_runs = 0
+            consecutive_errors = consecutive_limits = 0
+
+            while successful_runs < execution_count:
+                if stop_event.is_set():
+                    log_queue.put(("SECTION_LOG", "Đã hủy các lần chạy còn lại."))
+                    break
+
+                total_runs += 1
+                begin_iteration(total_runs, execution_count, success_count=successful_runs)
+                success, final_nb = run_single_notebook(use_cache=total_runs == 1)
+
+                limit = iteration_local.stats["limit"]
+                if success:
+                    successful_runs += 1
+                    consecutive_errors = consecutive_limits = 0
+                elif limit:
+                    consecutive_limits += 1
+                else:
+                    consecutive_errors += 1
+
+                end_iteration(total_runs, success, consecutive_errors)
+
+                if not success and consecutive_errors >= config.MAX_CONSECUTIVE_ERRORS_FINITE:
+                    log_queue.put(("SECTION_LOG", f"Dừng do lỗi {consecutive_errors} lần liên tiếp."))
+                    break
+                if limit and consecutive_limits >= config.MAX_CONSECUTIVE_LIMIT_BREACHES:
+                    log_queue.put(("SECTION_LOG", f"Dừng do vượt giới hạn tài nguyên {consecutive_limits} lần liên tiếp."))
+                    break
+
+            finished_ok = successful_runs >= execution_count
+    finally:
+        output_batcher.close()
+        if persistent_state["kernel"] is not None:
+            persistent_state["kernel"].shutdown()
+        pool.shutdown()
+        if history is not None:
+            history.close()
+
+    log_queue.put(("EXECUTION_FINISHED", finished_ok))
+
+
+def start_notebook_process(
+    notebook_path,
+    log_queue,
+    execution_mode,
+    execution_count,
+    execution_delay,
+    modules_path,
+    import_path,
+    force_run=False,
+    section_name="",
+    parameters=None,
+    parameter_grid=None,
+    limits=None,
+    fanout_workers=None,
+):
+    """
+    Khởi động tiến trình chạy notebook, trả về (process, stop_event). force_run=True bỏ qua
+    cache kết quả. parameters được chèn vào notebook theo kiểu papermill; ở chế độ "fanout",
+    notebook chạy trên mọi bộ tham số của parameter_grid với fanout_workers kernel song song
+    (mặc định FANOUT_MAX_WORKERS).
+    limits (ResourceLimits) giới hạn RAM/CPU/thời gian của tiến trình và kernel.
+    """
+    stop_event = Event()
+    process_args = (
+        notebook_path,
+        log_queue,
+        stop_event,
+        execution_mode,
+        execution_count,
+        execution_delay,
+        modules_path,
+        import_path,
+        force_run,
+        section_name,
+        parameters,
+        parameter_grid,
+        limits,
+        fanout_workers,
+    )
+    process = Process(target=_execute_notebook_process, args=process_args, daemon=True)
+    process.start()
+    return process, stop_event
+
+
+def force_stop_process(process):
+    """
+    Buộc dừng tiến trình chạy notebook cùng các tiến trình con (kernel): terminate,
+    chờ STOP_KILL_TIMEOUT rồi kill. Hàm chặn, không gọi trên luồng giao diện.
+    """
+    children = []
+    if psutil is not None and process.pid:
+        try:
+            children = psutil.Process(process.pid).children(recursive=True)
+        except psutil.Error:
+            children = []
+
+    process.terminate()
+    process.join(timeout=config.STOP_KILL_TIMEOUT)
+    if process.is_alive():
+        process.kill()
+        process.join(timeout=config.STOP_KILL_TIMEOUT)
+
+    # Kernel do tiến trình con khởi động không tự thoát khi tiến trình cha bị kill
+    for child in children:
+        try:
+            child.kill()
+        except psutil.Error:
+            pass
+
+
+def stop_notebook_process(process, stop_event, grace_period=None):
+    """
+    Dừng tiến trình chạy notebook theo từng bước: báo dừng (tiến trình con tự ngắt
+    kernel và thoát), chờ grace_period, sau đó mới buộc dừng. Hàm chặn, dùng trong
+    luồng nền. Trả về True nếu phải buộc dừng.
+    """
+    stop_event.set()
+    process.join(timeout=config.STOP_GRACE_PERIOD if grace_period is None else grace_period)
+    if not process.is_alive():
+        return False
+    force_stop_process(process)
+    return True
@@ -5,19 +5,24 @@ Module chứa các hàm xử lý chức năng cho ứng dụng NotebookRunner
 
 import os
 import sys
-import traceback
-import time
-import nbformat
-from multiprocessing import Process, Queue, Event
 
 from PyQt6.QtWidgets import QMessageBox, QApplication
 from PyQt6.QtCore import Qt
 from PyQt6.QtGui import QIcon
 
-from nbconvert.preprocessors import ExecutePreprocessor
-from nbclient.exceptions import CellExecutionError
-
 import config
+from notebook_index import shared_index
+
+# Lõi thực thi không phụ thuộc Qt, được dùng chung với chế độ headless
+from engine import (
+    EXECUTION_MODE_LABELS,
+    CONTINUOUS_MODES,
+    log_message,
+    log_notebook_output,
+    log_iteration_end,
+    start_notebook_process,
+)
+from run_channels import RunChannels
 
 
 # --- CÁC HÀM TIỆN ÍCH (KHÔNG THAY ĐỔI) ---
@@ -42,31 +47,29 @@ def setup_application_icon(app):
         app.setWindowIcon(QIcon(config.ICON_PATH))
 
 
-def handle_card_click(path, available_notebook_cards, highlighted_available):
-    if path not in available_notebook_cards:
+def handle_card_click(path, notebook_model, highlighted_available):
+    if path not in notebook_model:
         return
 
-    card = available_notebook_cards[path]
     is_ctrl_pressed = bool(QApplication.keyboardModifiers() & Qt.KeyboardModifier.ControlModifier)
 
     if is_ctrl_pressed:
-        if card.is_highlighted:
-            card.set_highlighted(False)
+        if notebook_model.is_highlighted(path):
+            notebook_model.set_highlighted(path, False)
             if path in highlighted_available:
                 highlighted_available.remove(path)
         else:
-            card.set_highlighted(True)
+            notebook_model.set_highlighted(path, True)
             if path not in highlighted_available:
                 highlighted_available.append(path)
     else:
-        if not card.is_highlighted:
+        if not notebook_model.is_highlighted(path):
             for p in list(highlighted_available):
-                if p in available_notebook_cards:
-                    available_notebook_cards[p].set_highlighted(False)
+                notebook_model.set_highlighted(p, False)
 
             highlighted_available.clear()
             highlighted_available.append(path)
-            card.set_highlighted(True)
+            notebook_model.set_highlighted(path, True)
         else:
             pass
 
@@ -83,7 +86,7 @@ def refresh_notebook_list(runner_instance):
     log_message("Bắt đầu làm mới danh sách notebooks...")
 
     # 1. Lấy tất cả các notebook hiện đang được biết đến bởi ứng dụng (cả trong danh sách chờ và trong các section)
-    known_paths = set(runner_instance.available_notebook_cards.keys())
+    known_paths = set(runner_instance.notebook_model.paths())
     for section in runner_instance.sections.values():
         known_paths.update(section.notebook_cards.keys())
 
@@ -100,60 +103,49 @@ def refresh_notebook_list(runner_instance):
     # 3. Tìm các notebook mới và các notebook đã bị xóa
     new_paths = disk_paths - known_paths
     deleted_paths = known_paths - disk_paths
-
-    # 4. Thêm các notebook mới vào danh sách chờ
-    if new_paths:
-        sorted_new_paths = sorted(list(new_paths), key=lambda p: os.path.basename(p))
-        for path in sorted_new_paths:
-            runner_instance._create_card_in_list(path, runner_instance.available_cards_layout, runner_instance.available_notebook_cards)
-        log_message(f"Đã thêm {len(new_paths)} notebook mới vào danh sách.")
-
-    # 5. Xóa các notebook không còn tồn tại khỏi giao diện
-    if deleted_paths:
-        for path in deleted_paths:
-            # Kiểm tra và xóa khỏi danh sách chờ
-            if path in runner_instance.available_notebook_cards:
-                card = runner_instance.available_notebook_cards.pop(path)
-                if card:
-                    card.deleteLater()
-                if path in runner_instance.highlighted_available:
-                    runner_instance.highlighted_available.remove(path)
-            # Kiểm tra và xóa khỏi các section
-            else:
-                for section in runner_instance.sections.values():
-                    if path in section.notebook_cards:
-                        section.remove_notebook_card(path)
-                        break  # Giả sử notebook chỉ ở một nơi
-        log_message(f"Đã xóa {len(deleted_paths)} notebook không còn tồn tại.")
+    apply_notebook_changes(runner_instance, new_paths, deleted_paths, [])
+    shared_index().prune(disk_paths)
+    shared_index().save()
 
     log_message("Làm mới hoàn tất. Code và module mới nhất sẽ được sử dụng trong lần chạy tiếp theo.")
 
 
-def log_message(message):
-    timestamp = time.strftime("%H:%M:%S")
-    print(f"[{timestamp}] {message}")
-
-
-def format_output_for_cmd(log_type, section_name, nb_name, content, width=100):
+def apply_notebook_changes(runner_instance, added_paths, removed_paths, modified_paths):
     """
-    Tạo định dạng log mới theo yêu cầu.
-    Ví dụ: [09:42:45] [Output] [Section 2] [finext04_realtime_data.ipynb]
+    Cập nhật giao diện theo thay đổi trong thư mục notebook (từ nút Làm mới hoặc watcher):
+    thêm notebook mới vào danh sách chờ, xóa notebook đã bị xóa, cập nhật mô tả notebook bị sửa.
+    Mô tả được nạp trong nền, notebook hiện ngay với mô tả tạm.
     """
-    timestamp = time.strftime("%H:%M:%S")
-
-    # Xác định tag là [Output] hay [ERROR]
-    tag = f"[{log_type.upper()}]"
+    known_paths = set(runner_instance.notebook_model.paths())
+    for section in runner_instance.sections.values():
+        known_paths.update(section.notebook_cards.keys())
 
-    # Tạo dòng tiêu đề
-    header = f"[{timestamp}] {tag} [{section_name}] [{nb_name}]"
+    # 1. Thêm các notebook mới vào danh sách chờ (một lần cho cả đợt)
+    new_paths = set(added_paths) - known_paths
+    if new_paths:
+        runner_instance._add_notebooks_to_list(new_paths)
+        log_message(f"Đã thêm {len(new_paths)} notebook mới vào danh sách.")
 
-    separator = "=" * width
+    # 2. Xóa các notebook không còn tồn tại khỏi giao diện
+    deleted_paths = set(removed_paths) & known_paths
+    for path in deleted_paths:
+        # Kiểm tra và xóa khỏi danh sách chờ
+        if path in runner_instance.notebook_model:
+            runner_instance._remove_notebook_from_list(path)
+        # Kiểm tra và xóa khỏi các section
+        else:
+            for section in runner_instance.sections.values():
+                if path in section.notebook_cards:
+                    section.remove_notebook_card(path)
+                    break  # Giả sử notebook chỉ ở một nơi
+    if deleted_paths:
+        log_message(f"Đã xóa {len(deleted_paths)} notebook không còn tồn tại.")
 
-    # Ghép lại thành chuỗi hoàn chỉnh
-    return f"""{header}
-{separator}
-{content.strip()}
-{separator}"""
+    # 3. Nạp lại mô tả của các notebook bị sửa
+    modified_paths = [
+        path for path in modified_paths if path in runner_instance.notebook_model or runner_instance.find_section_card(path) is not None
+    ]
+    runner_instance.description_loader.request(modified_paths)
 
 
 def handle_close_event(running_count, parent_widget=None):
@@ -174,189 +166,49 @@ def handle_close_event(running_count, parent_widget=None):
     return True
 
 
-def get_notebook_description(path):
-    try:
-        with open(path, "r", encoding="utf-8") as f:
-            notebook = nbformat.read(f, as_version=4)
-        for cell in notebook.cells:
-            if cell.cell_type == "markdown":
-                for line in cell.source.split("\n"):
-                    if line.strip().startswith("# "):
-                        return line.strip()[2:].strip()
-        return "Không có mô tả"
-    except Exception:
-        return "Không thể đọc mô tả."
-
-
-def _execute_notebook_process(
-    notebook_path, log_queue, stop_event, execution_mode, execution_count, execution_delay, modules_path, import_path
-):
-    notebook_dir = os.path.dirname(notebook_path)
-
-    code_to_inject = f"""
-        import sys
-        import os
-
-        # Khối mã này cực kỳ quan trọng để file .exe hoạt động.
-        # Nó đảm bảo tiến trình kernel có thể tìm thấy tất cả các thư viện đã được đóng gói (như pandas).
-        if getattr(sys, 'frozen', False):
-            # Trong ứng dụng đã build, thư mục gốc là thư mục chứa file .exe
-            # Tất cả thư viện được PyInstaller đóng gói vào thư mục '_internal'.
-            root_dir = os.path.dirname(sys.executable)
-            internal_libs_path = os.path.join(root_dir, '_internal')
-            
-            # Thêm đường dẫn thư viện đã đóng gói vào sys.path
-            if os.path.exists(internal_libs_path) and internal_libs_path not in sys.path:
-                sys.path.insert(0, internal_libs_path)
-                print(f"NBRunner (Frozen): Added bundled libs path: {{internal_libs_path}}")
-
-        # Khối mã này đảm bảo các module tùy chỉnh của người dùng được tìm thấy.
-        # Nó nhận các đường dẫn tuyệt đối từ ứng dụng chính.
-        modules_path = {repr(modules_path)}
-        import_path = {repr(import_path)}
-
-        # Thêm thư mục 'module' vào sys.path
-        if os.path.exists(modules_path) and modules_path not in sys.path:
-            sys.path.insert(0, modules_path)
-
-        # Thêm thư mục 'import' vào sys.path
-        if os.path.exists(import_path) and import_path not in sys.path:
-            sys.path.insert(0, import_path)
-        """
-
-    def run_single_notebook():
-        nb = None
-        # Tạo một list để gom tất cả output từ các lệnh print
-        all_prints = []
-        try:
-            with open(notebook_path, "r", encoding="utf-8") as f:
-                nb = nbformat.read(f, as_version=4)
-            injected_cell = nbformat.v4.new_code_cell(code_to_inject)
-            nb.cells.insert(0, injected_cell)
-
-            ep = ExecutePreprocessor(timeout=3600)
-            ep.preprocess(nb, {"metadata": {"path": notebook_dir}})
-
-            # Sau khi chạy xong, lặp qua các cell để gom output
-            for cell in nb.cells:
-                if "outputs" in cell:
-                    for output in cell.outputs:
-                        if output.output_type == "stream" and output.text.strip():
-                            # Thêm output vào list thay vì gửi đi ngay
-                            all_prints.append(output.text)
-
-            # Nếu có output trong list, nối chúng lại và gửi đi một lần duy nhất
-            if all_prints:
-                combined_output = "\n".join(all_prints)
-                log_queue.put(("NOTEBOOK_PRINT", combined_output))
-
-            return True, nb
-
-        except CellExecutionError as e:
-            # Lấy traceback đầy đủ dưới dạng một chuỗi
-            full_traceback = traceback.format_exc()
-            # Dấu hiệu để tìm phần traceback cuối cùng và quan trọng nhất
-            separator = "---------------------------------------------------------------------------"
-            if separator in full_traceback:
-                # Tách chuỗi và chỉ lấy phần cuối cùng sau dấu phân cách
-                short_traceback = full_traceback.split(separator)[-1].strip()
-            else:
-                # Nếu không tìm thấy dấu phân cách, hiển thị lỗi gốc để không mất thông tin
-                short_traceback = str(e)
-            # Chỉ gửi phần lỗi đã được rút gọn về giao diện
-            log_queue.put(("EXECUTION_ERROR", {"details": short_traceback}))
-            return False, nb
-
-        except Exception as e:
-            # Rút gọn thông báo cho các lỗi chung khác để log luôn sạch sẽ
-            error_details = f"Lỗi không mong muốn: {type(e).__name__}: {e}"
-            log_queue.put(("EXECUTION_ERROR", {"details": error_details}))
-            return False, nb
-
-    # Chạy lặp vô hạn
-    if execution_mode == "continuous":
-        iteration = 1
-        consecutive_errors = 0
-        while not stop_event.is_set():
-            log_queue.put(("RESET_TIMER", None))
-            log_queue.put(("ITERATION_START", {"iteration": iteration, "total": None}))
-            start_time = time.time()
-            success, final_nb = run_single_notebook()
-            duration = time.time() - start_time
-
-            if success:
-                consecutive_errors = 0
-            else:
-                consecutive_errors += 1
-
-            log_queue.put(
-                (
-                    "ITERATION_END",
-                    {"iteration": iteration, "success": success, "duration": duration, "consecutive_errors": consecutive_errors},
-                )
-            )
-
-            if not success and consecutive_errors >= config.MAX_CONSECUTIVE_ERRORS_CONTINOUS:
-                log_queue.put(("SECTION_LOG", f"Dừng do lỗi {consecutive_errors} lần liên tiếp."))
-                break
-
-            if stop_event.is_set():
-                break
-
-            if execution_delay > 0 and not stop_event.is_set():
-                log_queue.put(("SECTION_LOG", f"Nghỉ {execution_delay}s..."))
-                time.sleep(execution_delay)
-            iteration += 1
-
-    # Chạy lặp hữu hạn (chỉ tính lần thành công)
-    else:
-        successful_runs = 0
-        total_runs = 0
-        consecutive_errors = 0
-
-        while successful_runs < execution_count:
-            if stop_event.is_set():
-                log_queue.put(("SECTION_LOG", "Đã hủy các lần chạy còn lại."))
-                break
-
-            total_runs += 1
-            log_queue.put(("RESET_TIMER", None))
-            log_queue.put(("ITERATION_START", {"iteration": total_runs, "total": execution_count, "success_count": successful_runs}))
-
-            start_time = time.time()
-            success, final_nb = run_single_notebook()
-            duration = time.time() - start_time
-
-            if success:
-                successful_runs += 1
-                consecutive_errors = 0
-            else:
-                consecutive_errors += 1
-
-            log_queue.put(
-                (
-                    "ITERATION_END",
-                    {"iteration": total_runs, "success": success, "duration": duration, "consecutive_errors": consecutive_errors},
-                )
-            )
-
-            if not success and consecutive_errors >= config.MAX_CONSECUTIVE_ERRORS_FINITE:
-                log_queue.put(("SECTION_LOG", f"Dừng do lỗi {consecutive_errors} lần liên tiếp."))
-                break
-
-    log_queue.put(("EXECUTION_FINISHED", True))
-
-
 def run_notebook_with_individual_logging(
-    notebook_path, running_processes, card, execution_mode, execution_count, execution_delay, modules_path, import_path
+    notebook_path,
+    running_processes,
+    card,
+    execution_mode,
+    execution_count,
+    execution_delay,
+    modules_path,
+    import_path,
+    log_dispatcher,
+    message_handler,
+    force_run=False,
+    section_name="",
+    parameters=None,
+    parameter_grid=None,
+    limits=None,
+    fanout_workers=None,
 ):
     if notebook_path in running_processes:
         return
 
-    log_queue = Queue()
-    stop_event = Event()
-    process_args = (notebook_path, log_queue, stop_event, execution_mode, execution_count, execution_delay, modules_path, import_path)
-    process = Process(target=_execute_notebook_process, args=process_args, daemon=True)
-    running_processes[notebook_path] = {"process": process, "stop_event": stop_event, "queue": log_queue, "card": card}
-
-    process.start()
+    # Mỗi tiến trình có kênh Pipe riêng, log_dispatcher định tuyến message theo run_id
+    run_id, log_channel = log_dispatcher.register(message_handler)
+    try:
+        process, stop_event = start_notebook_process(
+            notebook_path,
+            log_channel,
+            execution_mode,
+            execution_count,
+            execution_delay,
+            modules_path,
+            import_path,
+            force_run,
+            section_name,
+            parameters,
+            parameter_grid,
+            limits,
+            fanout_workers,
+        )
+    except Exception:
+        log_dispatcher.unregister(run_id)
+        raise
+    finally:
+        # Tiến trình con đã giữ bản sao đầu ghi; phía cha đóng để nhận EOF khi con kết thúc
+        RunChannels.release_writer(log_channel)
+    running_processes[notebook_path] = {"process": process, "stop_event": stop_event, "run_id": run_id, "card": card}
@@ -0,0 +1,584 @@
+# development/src/headless.py
+"""
+Module chạy các section notebook ở chế độ headless (không giao diện, không import Qt).
+
+Dùng chung lõi thực thi (engine) và giao thức message với giao diện PyQt6, phù hợp
+để chạy trên server Linux dưới systemd hoặc trong container:
+
+    python main.py --headless --config sections.yaml
+
+Nếu cấu hình có lịch hẹn giờ, tiến trình chạy như một daemon cho đến khi nhận
+SIGINT/SIGTERM. Nếu không, tiến trình thoát khi tất cả notebook đã chạy xong.
+"""
+
+import argparse
+import heapq
+import itertools
+import json
+import os
+import signal
+import sys
+import time
+from functools import partial
+
+try:
+    import yaml
+except ImportError:
+    # PyYAML là tùy chọn, thiếu thì chỉ đọc được file cấu hình .json
+    yaml = None
+
+import config
+import dag
+from admission import AdmissionController
+from engine import (
+    CONTINUOUS_MODES,
+    EXECUTION_MODE_LABELS,
+    force_stop_process,
+    log_iteration_end,
+    log_message,
+    log_notebook_output,
+    start_notebook_process,
+)
+from metrics import MetricsRegistry, process_tree_rss_bytes, start_metrics_exporter
+from parameters import expand_grid
+from resource_limits import LIMIT_KIND_LABELS, ResourceLimits
+from run_channels import RunChannels
+from scheduler import ScheduledTask, Scheduler
+
+
+# Tên rút gọn trong file cấu hình -> tên hành động giống các tác vụ hẹn giờ trên giao diện
+ACTION_ALIASES = {
+    "simultaneous": "run_all_simultaneously",
+    "sequential": "run_all_sequential_wrapper",
+    "dag": "run_all_dag",
+    "stop": "stop_all_notebooks",
+}
+PROCESS_WATCHDOG_INTERVAL = 5
+
+
+def load_sections_config(path):
+    """Đọc file cấu hình section (.yaml/.yml hoặc .json)."""
+    with open(path, "r", encoding="utf-8") as f:
+        if path.lower().endswith((".yaml", ".yml")):
+            if yaml is None:
+                raise RuntimeError("Cần cài đặt PyYAML để đọc file cấu hình .yaml")
+            data = yaml.safe_load(f) or {}
+        else:
+            data = json.load(f)
+
+    sections = data.get("sections")
+    if not isinstance(sections, list) or not sections:
+        raise ValueError("File cấu hình không có section nào.")
+    return data
+
+
+def resolve_action(action):
+    action_key = ACTION_ALIASES.get(action, action)
+    if action_key not in ACTION_ALIASES.values():
+        raise ValueError(f"Hành động không hợp lệ: '{action}'")
+    return action_key
+
+
+class HeadlessNotebook:
+    def __init__(self, section, entry):
+        if isinstance(entry, str):
+            entry = {"path": entry}
+        path = entry["path"]
+        self.path = path if os.path.isabs(path) else os.path.join(config.NOTEBOOKS_DIR, path)
+        self.name = os.path.basename(self.path)
+        self.section = section
+        # Tham số chèn vào cell 'parameters'; có "grid" thì mặc định chạy theo lưới tham số
+        self.parameters = dict(entry.get("parameters") or {})
+        self.parameter_grid = entry.get("grid")
+        self.execution_mode = entry.get("mode", "fanout" if self.parameter_grid else "continuous")
+        self.execution_count = int(entry.get("count", 1))
+        # Số kernel chạy song song trên lưới tham số, tách biệt với số lần lặp
+        self.fanout_workers = int(entry.get("workers", config.FANOUT_MAX_WORKERS))
+        self.execution_delay = int(entry.get("delay", 0))
+        self.force_run = bool(entry.get("force", False))
+        # Giới hạn riêng của notebook, trường bỏ trống lấy theo giới hạn của section
+        self.limits = section.limits.merged(ResourceLimits.from_dict(entry.get("limits")))
+        depends_on = entry.get("depends_on") or []
+        self.depends_on = [depends_on] if isinstance(depends_on, str) else list(depends_on)
+        if self.execution_mode not in EXECUTION_MODE_LABELS:
+            raise ValueError(f"Chế độ chạy không hợp lệ cho '{self.name}': '{self.execution_mode}'")
+        if self.execution_mode == "fanout":
+            if not self.parameter_grid:
+                raise ValueError(f"Chế độ 'fanout' của '{self.name}' cần khai báo 'grid'.")
+            self.grid_size = len(expand_grid(self.parameter_grid))
+        if not os.path.exists(self.path):
+            raise FileNotFoundError(f"Không tìm thấy notebook: {self.path}")
+
+        self.process = None
+        self.stop_event = None
+        self.run_id = None
+        self.last_success = False
+        self.stopping = False
+        self.queued = False
+        self.current_iteration = None
+        self.limit_breach = None
+
+    @property
+    def is_running(self):
+        return self.process is not None
+
+    @property
+    def is_active(self):
+        return self.is_running or self.queued
+
+    @property
+    def admission_key(self):
+        return (self.section.section_name, self.path)
+
+
+class HeadlessSection:
+    def __init__(self, runner, data, index):
+        self.runner = runner
+        self.section_name = data.get("name") or f"Section {index + 1}"
+        self.start_action = data.get("start", "simultaneous")
+        self.max_parallel = int(data.get("max_parallel", 0))
+        self.limits = ResourceLimits.defaults().merged(ResourceLimits.from_dict(data.get("limits")))
+        self.notebooks = [HeadlessNotebook(self, entry) for entry in data.get("notebooks") or []]
+        # Biểu thức lịch được kiểm tra ngay khi đọc cấu hình
+        self.schedules = [
+            ScheduledTask(
+                self.section_name,
+                resolve_action(schedule["action"]),
+                schedule.get("schedule") or schedule.get("time"),
+                jitter=schedule.get("jitter", 0),
+                catch_up=schedule.get("catch_up"),
+            )
+            for schedule in data.get("schedules") or []
+        ]
+        if self.start_action not in (None, "none"):
+            self.start_action = resolve_action(self.start_action)
+        else:
+            self.start_action = None
+
+        self.is_sequence_running = False
+        self.sequential_queue = []
+        self.dag_run = None
+
+    def log(self, message, **fields):
+        log_message(message, section=self.section_name, **fields)
+
+    def start(self):
+        for task in self.schedules:
+            self.runner.scheduler.add(task)
+        if self.start_action:
+            getattr(self, self.start_action)()
+
+    # --- Hành động (cùng tên với các hành động của SectionWidget trên giao diện) ---
+    def run_all_simultaneously(self):
+        if not self.notebooks:
+            return
+        self.log("Bắt đầu chạy đồng thời...")
+        for notebook in self.notebooks:
+            if not notebook.is_active:
+                self.run_notebook(notebook)
+
+    def run_all_sequential_wrapper(self):
+        if self.is_sequence_running:
+            self.log("Một chuỗi chạy lần lượt đã đang chạy.")
+            return
+        if not self.notebooks:
+            self.log("Không có notebook nào để chạy.")
+            return
+        self.is_sequence_running = True
+        self.sequential_queue = list(self.notebooks)
+        self.log("Bắt đầu chạy lần lượt...")
+        self._run_next_in_sequence()
+
+    def run_all_dag(self):
+        if self.is_sequence_running or self.dag_run is not None:
+            self.log("Một chuỗi chạy khác đã đang chạy.")
+            return
+        if not self.notebooks:
+            self.log("Không có notebook nào để chạy.")
+            return
+        if any(notebook.is_active for notebook in self.notebooks):
+            self.log("Hãy dừng các notebook đang chạy trước khi chạy theo phụ thuộc.")
+            return
+
+        paths = [notebook.path for notebook in self.notebooks]
+        extra_dependencies = {notebook.path: notebook.depends_on for notebook in self.notebooks}
+        dependencies, warnings = dag.build_dependencies(paths, extra_dependencies)
+        for warning in warnings:
+            self.log(f"Cảnh báo: {warning}")
+        try:
+            self.dag_run = dag.DagRun(dependencies)
+        except ValueError as e:
+            self.log(f"Không thể chạy theo phụ thuộc: {e}")
+            return
+        self.log("Bắt đầu chạy theo phụ thuộc...")
+        self._start_ready_dag_nodes()
+
+    def stop_all_notebooks(self):
+        if self.is_sequence_running:
+            self.log("Đã dừng chuỗi chạy lần lượt.")
+            self._stop_sequential_run()
+        if self.dag_run is not None:
+            self.log("Đã dừng chuỗi chạy theo phụ thuộc.")
+            self.dag_run = None
+        for notebook in self.notebooks:
+            if notebook.is_active:
+                self.runner.stop_notebook(notebook)
+
+    # --- Chạy từng notebook ---
+    def run_notebook(self, notebook):
+        mode_text = EXECUTION_MODE_LABELS[notebook.execution_mode]
+        count_text = f" (Số lần: {notebook.execution_count})" if notebook.execution_mode == "count" else ""
+        if notebook.execution_mode == "fanout":
+            count_text = f" ({notebook.grid_size} bộ tham số, {notebook.fanout_workers} luồng)"
+        self.log(f"Bắt đầu thực thi '{notebook.name}' ở chế độ '{mode_text}'{count_text}.")
+        self.runner.request_start(notebook)
+
+    def _run_next_in_sequence(self):
+        if not self.is_sequence_running:
+            return
+        if not self.sequential_queue:
+            self.log("Đã hoàn thành chạy lần lượt.")
+            self._stop_sequential_run()
+            return
+
+        notebook = self.sequential_queue.pop(0)
+        if notebook.is_active:
+            self._run_next_in_sequence()
+            return
+        self.run_notebook(notebook)
+        if notebook.execution_mode in CONTINUOUS_MODES:
+            delay = config.SEQUENTIAL_CONTINUOUS_DELAY
+            self.log(f"Tuần tự: Đã bắt đầu '{notebook.name}' (liên tục). Sẽ chạy notebook tiếp theo sau {delay} giây.")
+            self.runner.call_later(delay, self._run_next_in_sequence)
+
+    def _stop_sequential_run(self):
+        self.is_sequence_running = False
+        self.sequential_queue.clear()
+
+    def _notebook_by_path(self, path):
+        return next((notebook for notebook in self.notebooks if notebook.path == path), None)
+
+    def _start_ready_dag_nodes(self):
+        if self.dag_run is None:
+            return
+        # Node được đánh dấu đang chạy ngay khi lấy ra, lần gọi lồng nhau không khởi động lại chúng
+        for path in self.dag_run.claim_ready_nodes():
+            if self.dag_run is None or self.dag_run.state.get(path) != "running":
+                continue
+            notebook = self._notebook_by_path(path)
+            self.run_notebook(notebook)
+            if notebook.execution_mode in CONTINUOUS_MODES:
+                # Notebook chạy liên tục không bao giờ kết thúc, coi là xong sau một khoảng chờ như khi chạy lần lượt
+                delay = config.SEQUENTIAL_CONTINUOUS_DELAY
+                self.log(
+                    f"Phụ thuộc: Đã bắt đầu '{notebook.name}' (liên tục). Notebook phụ thuộc vào nó sẽ chạy sau {delay} giây."
+                )
+                self.runner.call_later(delay, partial(self._on_dag_node_done, path, True))
+
+    def _on_dag_node_done(self, path, success):
+        if self.dag_run is None or self.dag_run.state.get(path) != "running":
+            return
+        skipped = self.dag_run.mark_finished(path, success)
+        status_text = "thành công" if success else "thất bại"
+        skipped_text = f", bỏ qua: {', '.join(os.path.basename(p) for p in skipped)}" if skipped else ""
+        self.log(f"Phụ thuộc: '{os.path.basename(path)}' hoàn thành {status_text}{skipped_text}.")
+        if self.dag_run.is_finished:
+            self.log(f"Đã hoàn thành chạy theo phụ thuộc. {self.dag_run.report()}")
+            self.dag_run = None
+        else:
+            self._start_ready_dag_nodes()
+
+    def on_notebook_finished(self, notebook, success):
+        status_text = "thành công" if success else "thất bại"
+        if self.dag_run is not None and notebook.execution_mode not in CONTINUOUS_MODES:
+            self._on_dag_node_done(notebook.path, success)
+            return
+        if not self.is_sequence_running or notebook.execution_mode in CONTINUOUS_MODES:
+            self.log(f"'{notebook.name}': " + ("Đã dừng." if notebook.stopping else f"Hoàn thành {status_text}."))
+            return
+        self.log(f"Tuần tự: '{notebook.name}' hoàn thành {status_text}.")
+        if success:
+            self._run_next_in_sequence()
+        elif notebook.limit_breach and not notebook.stopping:
+            # Vượt giới hạn tài nguyên không phải lỗi của notebook, các notebook sau vẫn được chạy
+            self.log(f"Tuần tự: '{notebook.name}' vượt giới hạn tài nguyên, tiếp tục notebook tiếp theo.")
+            self._run_next_in_sequence()
+        else:
+            self.log("Dừng chạy lần lượt do có lỗi.")
+            self._stop_sequential_run()
+
+    def handle_message(self, notebook, msg_type, content):
+        if msg_type in ["NOTEBOOK_PRINT", "EXECUTION_ERROR"]:
+            log_notebook_output(msg_type, self.section_name, notebook.path, content, notebook.current_iteration)
+        elif msg_type == "SECTION_LOG":
+            self.log(f"'{notebook.name}': {content}", notebook=notebook.name, iteration=notebook.current_iteration)
+        elif msg_type == "LIMIT_EXCEEDED":
+            notebook.limit_breach = content
+            self.log(f"'{notebook.name}': Vượt giới hạn: {content['details']}", notebook=notebook.name, iteration=notebook.current_iteration)
+        elif msg_type == "ITERATION_START":
+            notebook.current_iteration = content["iteration"]
+        elif msg_type == "ITERATION_END":
+            if content["success"]:
+                status = "OK"
+                notebook.limit_breach = None
+            elif content.get("limit"):
+                status = f"GIỚI HẠN {LIMIT_KIND_LABELS.get(content['limit'], content['limit'])}"
+            elif notebook.execution_mode == "fanout":
+                status = "LỖI"
+            else:
+                max_errors = (
+                    config.MAX_CONSECUTIVE_ERRORS_CONTINOUS
+                    if notebook.execution_mode in CONTINUOUS_MODES
+                    else config.MAX_CONSECUTIVE_ERRORS_FINITE
+                )
+                status = f"LỖI {content['consecutive_errors']}/{max_errors}"
+            slowest = max(
+                (cell for cell in content.get("cells") or [] if cell["wall"] is not None),
+                key=lambda cell: cell["wall"],
+                default=None,
+            )
+            slowest_info = f", cell chậm nhất {slowest['label']} {slowest['wall']:.2f}s" if slowest else ""
+            parameters_info = f" ({content['parameters']})" if content.get("parameters") else ""
+            log_iteration_end(
+                self.section_name,
+                notebook.path,
+                content,
+                f"'{notebook.name}': Lần {content['iteration']}{parameters_info}: {content['duration']:.2f}s [{status}]{slowest_info}",
+            )
+        elif msg_type == "EXECUTION_FINISHED":
+            # content là False khi tiến trình dừng vì lỗi liên tiếp hoặc không đủ số lần thành công
+            notebook.last_success = content is not False
+            self.runner.finish_notebook(notebook)
+
+
+class HeadlessRunner:
+    """
+    Vòng lặp sự kiện của chế độ headless: chờ (block) đồng thời trên kênh Pipe riêng của
+    mọi tiến trình notebook, chỉ thức dậy khi có message hoặc tới hạn một timer.
+    """
+
+    def __init__(self, config_data, modules_path, import_path):
+        self.modules_path, self.import_path = modules_path, import_path
+        self.channels = RunChannels()
+        self.routes = {}
+        self._timers = []
+        self._timer_seq = itertools.count()
+        self._watchdog_scheduled = False
+        self.admission = AdmissionController(max_global=config_data.get("max_parallel"), schedule_retry=self.call_later)
+        # Lịch nằm trong file cấu hình nên không cần lưu tác vụ ra file
+        self.scheduler = Scheduler(self._on_scheduled_task, self.call_later)
+        self.sections = [HeadlessSection(self, data, i) for i, data in enumerate(config_data["sections"])]
+        self.metrics = MetricsRegistry()
+        self.metrics.add_collector(self._collect_metrics)
+
+    def _collect_metrics(self):
+        """Số liệu tính tại thời điểm scrape, được gọi từ luồng của exporter nên chỉ đọc bản sao."""
+        counts = self.admission.counts_by_section()
+        samples = [("nbrunner_log_channels_open", (), self.channels.open_count)]
+        for section in self.sections:
+            labels = (("section", section.section_name),)
+            running, queued = counts.get(section.section_name, (0, 0))
+            samples.append(("nbrunner_notebooks_running", labels, running))
+            samples.append(("nbrunner_notebooks_queued", labels, queued))
+            for notebook in section.notebooks:
+                process = notebook.process
+                if process is not None:
+                    rss = process_tree_rss_bytes(process.pid)
+                    samples.append(("nbrunner_process_rss_bytes", labels + (("notebook", notebook.name),), rss))
+        return samples
+
+    def _on_scheduled_task(self, task, scheduled_time):
+        section = next((s for s in self.sections if s.section_name == task.section_id), None)
+        if section is None:
+            return
+        section.log(f"Tác vụ định kỳ: Thực thi '{task.action_key}' ({task.expression}) lúc {time.strftime('%H:%M:%S')}")
+        getattr(section, task.action_key)()
+
+    def call_later(self, delay, callback):
+        heapq.heappush(self._timers, (time.monotonic() + max(0, delay), next(self._timer_seq), callback))
+
+    def running_notebooks(self):
+        return [route for route in self.routes.values() if route.is_running]
+
+    def request_start(self, notebook):
+        started = self.admission.request(
+            notebook.admission_key, notebook.section.section_name, notebook.section.max_parallel, partial(self.start_notebook, notebook)
+        )
+        if not started:
+            notebook.queued = True
+            notebook.section.log(f"'{notebook.name}': Đang chờ slot trống...")
+
+    def start_notebook(self, notebook):
+        notebook.queued = False
+        run_id, channel = self.channels.open()
+        try:
+            process, stop_event = start_notebook_process(
+                notebook.path,
+                channel,
+                notebook.execution_mode,
+                notebook.execution_count,
+                notebook.execution_delay,
+                self.modules_path,
+                self.import_path,
+                notebook.force_run,
+                notebook.section.section_name,
+                notebook.parameters or None,
+                notebook.parameter_grid,
+                notebook.limits,
+                notebook.fanout_workers,
+            )
+        except Exception:
+            self.channels.close(run_id)
+            raise
+        finally:
+            RunChannels.release_writer(channel)
+        notebook.process, notebook.stop_event, notebook.run_id = process, stop_event, run_id
+        notebook.last_success, notebook.stopping, notebook.current_iteration = False, False, None
+        notebook.limit_breach = None
+        self.routes[run_id] = notebook
+        self._schedule_watchdog()
+
+    def stop_notebook(self, notebook):
+        if self.admission.cancel(notebook.admission_key):
+            # Notebook còn trong hàng đợi, chưa có tiến trình nào để dừng
+            notebook.queued = False
+            notebook.section.log(f"'{notebook.name}': Đã hủy khỏi hàng đợi.")
+            return
+        if not notebook.is_running or notebook.stopping:
+            return
+        notebook.stopping = True
+        notebook.stop_event.set()
+
+        def escalate():
+            if notebook.is_running and notebook.process.is_alive():
+                force_stop_process(notebook.process)
+                notebook.section.log(f"Buộc dừng: {notebook.name}")
+                self.finish_notebook(notebook)
+
+        self.call_later(config.STOP_GRACE_PERIOD, escalate)
+
+    def finish_notebook(self, notebook):
+        if not notebook.is_running:
+            return
+        self.routes.pop(notebook.run_id, None)
+        self.channels.close(notebook.run_id)
+        notebook.process = None
+        self.admission.release(notebook.admission_key)
+        success = notebook.last_success and not notebook.stopping
+        notebook.section.on_notebook_finished(notebook, success)
+
+    def _schedule_watchdog(self):
+        # Phát hiện tiến trình chết đột ngột (bị kill, OOM...) mà không kịp gửi EXECUTION_FINISHED
+        if self._watchdog_scheduled:
+            return
+        self._watchdog_scheduled = True
+
+        def check():
+            self._watchdog_scheduled = False
+            for notebook in self.running_notebooks():
+                if not notebook.process.is_alive():
+                    # Đọc nốt các message còn trong kênh trước khi kết luận
+                    self._drain_channels()
+                    if notebook.is_running:
+                        notebook.section.log(f"'{notebook.name}': Tiến trình kết thúc bất thường.")
+                        self.finish_notebook(notebook)
+            if self.running_notebooks():
+                self._schedule_watchdog()
+
+        self.call_later(PROCESS_WATCHDOG_INTERVAL, check)
+
+    def _dispatch(self, item):
+        if not (isinstance(item, tuple) and len(item) == 2):
+            return
+        run_id, message = item
+        notebook = self.routes.get(run_id)
+        if notebook is None or not (isinstance(message, tuple) and len(message) == 2):
+            return
+        msg_type, content = message
+        self.metrics.observe_message(notebook.section.section_name, notebook.path, msg_type, content)
+        notebook.section.handle_message(notebook, msg_type, content)
+
+    def _drain_channels(self):
+        while True:
+            items = self.channels.wait(0)
+            if not items:
+                return
+            for item in items:
+                self._dispatch(item)
+
+    def _fire_due_timers(self):
+        now = time.monotonic()
+        while self._timers and self._timers[0][0] <= now:
+            _, _, callback = heapq.heappop(self._timers)
+            callback()
+
+    def has_pending_work(self):
+        return bool(self.routes) or bool(self._timers) or self.admission.waiting_count > 0
+
+    def run(self):
+        for section in self.sections:
+            section.start()
+
+        try:
+            while self.has_pending_work():
+                timeout = None
+                if self._timers:
+                    timeout = max(0.0, self._timers[0][0] - time.monotonic())
+                for item in self.channels.wait(timeout):
+                    self._dispatch(item)
+                self._fire_due_timers()
+        except KeyboardInterrupt:
+            log_message("Nhận tín hiệu dừng, đang dừng tất cả notebook...")
+        finally:
+            self.shutdown()
+
+    def shutdown(self):
+        notebooks = self.running_notebooks()
+        for notebook in notebooks:
+            notebook.stopping = True
+            notebook.stop_event.set()
+        # Chờ song song tất cả tiến trình trong thời gian ân hạn rồi mới buộc dừng
+        deadline = time.monotonic() + config.STOP_GRACE_PERIOD
+        for notebook in notebooks:
+            notebook.process.join(timeout=max(0.0, deadline - time.monotonic()))
+            if notebook.process.is_alive():
+                force_stop_process(notebook.process)
+        self.routes.clear()
+        self.channels.shutdown()
+
+
+def _raise_keyboard_interrupt(signum, frame):
+    raise KeyboardInterrupt
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog=config.EXE_FILE_NAME, description=f"{config.APP_NAME} - chế độ headless")
+    parser.add_argument("--headless", action="store_true", help="Chạy không giao diện")
+    parser.add_argument("--config", required=True, help="File cấu hình section (.yaml/.yml/.json)")
+    parser.add_argument("--metrics-port", type=int, default=None, help="Cổng endpoint /metrics (0 = tắt, mặc định theo config)")
+    args = parser.parse_args(argv)
+
+    try:
+        config_data = load_sections_config(args.config)
+        runner = HeadlessRunner(config_data, config.MODULES_DIR, config.IMPORT_DIR)
+    except Exception as e:
+        log_message(f"Lỗi cấu hình: {e}")
+        return 2
+
+    # systemd/docker dừng tiến trình bằng SIGTERM, xử lý giống Ctrl+C
+    signal.signal(signal.SIGTERM, _raise_keyboard_interrupt)
+    log_message(f"Chạy headless với {len(runner.sections)} section từ '{args.config}'.")
+    metrics_exporter, metrics_info = start_metrics_exporter(runner.metrics, port=args.metrics_port)
+    if metrics_info:
+        log_message(metrics_info)
+    try:
+        runner.run()
+    finally:
+        if metrics_exporter is not None:
+            metrics_exporter.close()
+    log_message("Đã dừng chế độ headless.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,367 @@
+# development/src/kernel_pool.py
+"""
+Module quản lý pool các kernel Jupyter đã được khởi động và làm nóng sẵn.
+
+Thay vì khởi động một ipykernel mới cho mỗi lần lặp, tiến trình chạy notebook
+mượn (checkout) một kernel đã sẵn sàng từ pool, chạy notebook trên kernel đó rồi
+trả lại (checkin). Các chính sách reset/khởi động lại được áp dụng khi trả kernel.
+"""
+
+import inspect
+import os
+import threading
+import time
+
+import nbformat
+from nbclient import NotebookClient
+from nbclient.util import run_sync
+
+try:
+    import psutil
+except ImportError:
+    # psutil là tùy chọn, thiếu thì bỏ qua chính sách giới hạn RSS
+    psutil = None
+
+import config
+from cell_profiling import CELL_STATS_MIME
+
+
+RESET_NAMESPACE_CODE = 'get_ipython().run_line_magic("reset", "-f")'
+
+
+def _resolve(result):
+    """Chạy đồng bộ kết quả từ API async của jupyter_client (nếu là awaitable)."""
+    if inspect.isawaitable(result):
+
+        async def _await():
+            return await result
+
+        return run_sync(_await)()
+    return result
+
+
+def build_preload_code(modules):
+    """Tạo mã import sẵn các thư viện nặng, bỏ qua thư viện không cài đặt."""
+    lines = []
+    for module_name in modules:
+        lines.append(f"try:\n    import {module_name}\nexcept ImportError:\n    pass")
+    return "\n".join(lines)
+
+
+def collect_source_fingerprint(watch_dirs):
+    """
+    Tạo dấu vân tay (tên, mtime, kích thước) của các file Python trong các thư mục
+    module/import. Kernel được làm nóng với fingerprint cũ sẽ bị khởi động lại để
+    code mới nhất luôn được sử dụng.
+    """
+    entries = []
+    for directory in watch_dirs:
+        if not directory or not os.path.isdir(directory):
+            continue
+        try:
+            names = sorted(os.listdir(directory))
+        except OSError:
+            continue
+        for name in names:
+            if not name.endswith((".py", ".pyc")):
+                continue
+            try:
+                stat = os.stat(os.path.join(directory, name))
+            except OSError:
+                continue
+            entries.append((directory, name, stat.st_mtime_ns, stat.st_size))
+    return tuple(entries)
+
+
+class StreamingNotebookClient(NotebookClient):
+    """
+    NotebookClient đẩy từng output ra ngoài (output_sink) ngay khi kernel gửi về.
+    Output dạng stream đã được đẩy đi sẽ không giữ lại trong notebook để bộ nhớ
+    của tiến trình con không tăng theo thời gian chạy, trừ khi keep_outputs=True
+    (cần lưu notebook kết quả).
+    """
+
+    def __init__(self, nb, km=None, output_sink=None, cell_stats_sink=None, keep_outputs=False, **kw):
+        super().__init__(nb, km=km, **kw)
+        self.output_sink = output_sink
+        self.cell_stats_sink = cell_stats_sink
+        self.keep_outputs = keep_outputs
+
+    def output(self, outs, msg, display_id, cell_index):
+        out = super().output(outs, msg, display_id, cell_index)
+        if out is not None and CELL_STATS_MIME in out.get("data", {}):
+            # Số liệu do hook đo cell gửi về, không phải output của notebook
+            if outs and outs[-1] is out:
+                outs.pop()
+            if self.cell_stats_sink is not None:
+                self.cell_stats_sink(cell_index, out["data"][CELL_STATS_MIME])
+            return None
+        if out is not None and self.output_sink is not None:
+            self.output_sink(out)
+            if not self.keep_outputs and out.get("output_type") == "stream" and outs and outs[-1] is out:
+                outs.pop()
+        return out
+
+
+class PooledKernel:
+    """Một kernel đang sống cùng kernel client của nó."""
+
+    def __init__(self, key, kernel_name, cwd, km, kc, fingerprint, start_latency):
+        self.key, self.kernel_name, self.cwd = key, kernel_name, cwd
+        self.km, self.kc = km, kc
+        self.fingerprint = fingerprint
+        self.start_latency = start_latency
+        self.run_count = 0
+
+    @property
+    def pid(self):
+        provisioner = getattr(self.km, "provisioner", None)
+        pid = getattr(provisioner, "pid", None) if provisioner else None
+        if pid is None:
+            kernel = getattr(self.km, "kernel", None)
+            pid = getattr(kernel, "pid", None)
+        return pid
+
+    def rss_mb(self):
+        if psutil is None or not self.pid:
+            return None
+        try:
+            return psutil.Process(self.pid).memory_info().rss / (1024 * 1024)
+        except psutil.Error:
+            return None
+
+    def cpu_seconds(self):
+        """Tổng CPU time (user + system) của tiến trình kernel, None nếu không đo được."""
+        if psutil is None or not self.pid:
+            return None
+        try:
+            times = psutil.Process(self.pid).cpu_times()
+            return times.user + times.system
+        except psutil.Error:
+            return None
+
+    def is_alive(self):
+        try:
+            return bool(_resolve(self.km.is_alive()))
+        except Exception:
+            return False
+
+    def execute_notebook(self, nb, timeout, output_sink=None, cell_stats_sink=None, keep_outputs=False, timeout_func=None):
+        """
+        Chạy toàn bộ notebook trên kernel này, giữ kernel sống sau khi chạy xong.
+        timeout_func(cell) trả về timeout riêng (giây) cho từng cell, thay cho `timeout`.
+        """
+        client = StreamingNotebookClient(
+            nb,
+            km=self.km,
+            output_sink=output_sink,
+            cell_stats_sink=cell_stats_sink,
+            keep_outputs=keep_outputs,
+            timeout=timeout,
+            timeout_func=timeout_func,
+            resources={"metadata": {"path": self.cwd}},
+        )
+        # kc không phải trait của NotebookClient nên phải gán sau khi khởi tạo, nếu không
+        # mỗi lần chạy sẽ mở một kernel client mới (kênh zmq + luồng) và không bao giờ đóng
+        client.kc = self.kc
+        client.execute()
+        return nb
+
+    def interrupt(self):
+        """Gửi tín hiệu ngắt (SIGINT) tới kernel, cell đang chạy sẽ dừng với KeyboardInterrupt."""
+        try:
+            _resolve(self.km.interrupt_kernel())
+        except Exception:
+            pass
+
+    def kill(self):
+        """Buộc dừng ngay tiến trình kernel và tiến trình con của nó (vd: khi vượt giới hạn RAM)."""
+        if psutil is None or not self.pid:
+            return
+        try:
+            process = psutil.Process(self.pid)
+            processes = process.children(recursive=True) + [process]
+        except psutil.Error:
+            return
+        for proc in processes:
+            try:
+                proc.kill()
+            except psutil.Error:
+                pass
+
+    def run_code(self, code, timeout=None):
+        cell_nb = nbformat.v4.new_notebook()
+        cell_nb.cells.append(nbformat.v4.new_code_cell(code))
+        return self.execute_notebook(cell_nb, timeout or config.KERNEL_STARTUP_TIMEOUT)
+
+    def shutdown(self):
+        try:
+            if self.kc is not None:
+                self.kc.stop_channels()
+        except Exception:
+            pass
+        try:
+            _resolve(self.km.shutdown_kernel(now=True))
+        except Exception:
+            pass
+
+
+class KernelPool:
+    """
+    Pool các kernel nhàn rỗi, được phân loại theo khóa (kernel spec, thư mục làm việc,
+    mã làm nóng). Chính sách khi trả kernel:
+    - reset namespace sau mỗi lần lặp (giữ nguyên sys.modules nên import lại rất nhanh)
+    - khởi động lại sau N lần chạy hoặc khi RSS vượt ngưỡng
+    - khởi động lại khi code trong thư mục module/import thay đổi
+    """
+
+    def __init__(
+        self,
+        warmup_code="",
+        watch_dirs=(),
+        max_idle=None,
+        max_runs=None,
+        max_rss_mb=None,
+        reset_namespace=None,
+        on_event=None,
+    ):
+        self.warmup_code = warmup_code
+        self.watch_dirs = [d for d in watch_dirs if d]
+        self.max_idle = config.KERNEL_POOL_MAX_IDLE if max_idle is None else max_idle
+        self.max_runs = config.KERNEL_MAX_RUNS if max_runs is None else max_runs
+        self.max_rss_mb = config.KERNEL_MAX_RSS_MB if max_rss_mb is None else max_rss_mb
+        self.reset_namespace = config.KERNEL_RESET_NAMESPACE if reset_namespace is None else reset_namespace
+        self.on_event = on_event
+        self._idle = {}
+        # Các luồng đang khởi động kernel thay thế, theo khóa
+        self._starting = {}
+        self._closed = False
+        self._lock = threading.Lock()
+
+    def _emit(self, message):
+        if self.on_event:
+            self.on_event(message)
+
+    def make_key(self, kernel_name, cwd):
+        return (kernel_name or "", os.path.normcase(os.path.abspath(cwd)), hash(self.warmup_code))
+
+    def _start_kernel(self, kernel_name, cwd, fingerprint):
+        started = time.time()
+        warm_nb = nbformat.v4.new_notebook()
+        if kernel_name:
+            warm_nb.metadata["kernelspec"] = {"name": kernel_name, "display_name": kernel_name, "language": "python"}
+        warm_nb.cells.append(nbformat.v4.new_code_cell(self.warmup_code))
+        client = NotebookClient(
+            warm_nb,
+            timeout=config.KERNEL_STARTUP_TIMEOUT,
+            startup_timeout=config.KERNEL_STARTUP_TIMEOUT,
+            resources={"metadata": {"path": cwd}},
+        )
+        try:
+            # cleanup_kc=False: giữ kernel và client sống sau khi chạy mã làm nóng
+            client.execute(cleanup_kc=False)
+        except Exception:
+            if client.km is not None:
+                PooledKernel(None, kernel_name, cwd, client.km, client.kc, fingerprint, 0).shutdown()
+            raise
+        return PooledKernel(
+            self.make_key(kernel_name, cwd), kernel_name, cwd, client.km, client.kc, fingerprint, time.time() - started
+        )
+
+    def prestart(self, kernel_name, cwd):
+        """Khởi động sẵn một kernel và đặt vào pool để lần checkout tiếp theo không phải chờ."""
+        kernel = self._start_kernel(kernel_name, cwd, collect_source_fingerprint(self.watch_dirs))
+        self._put_idle(kernel)
+        return kernel
+
+    def prestart_in_background(self, kernel_name, cwd):
+        """Như prestart nhưng chạy trên luồng nền, lỗi chỉ được báo, lần checkout sau tự khởi động kernel."""
+        key = self.make_key(kernel_name, cwd)
+
+        def start():
+            try:
+                self.prestart(kernel_name, cwd)
+            except Exception as e:
+                self._emit(f"Không khởi động sẵn được kernel: {e}")
+            finally:
+                with self._lock:
+                    if self._starting.get(key) is threading.current_thread():
+                        del self._starting[key]
+
+        thread = threading.Thread(target=start, name="KernelPrestart", daemon=True)
+        with self._lock:
+            if self._closed or not self.max_idle or key in self._starting:
+                return
+            self._starting[key] = thread
+        thread.start()
+
+    def checkout(self, kernel_name, cwd):
+        key = self.make_key(kernel_name, cwd)
+        fingerprint = collect_source_fingerprint(self.watch_dirs)
+        while True:
+            with self._lock:
+                idle = self._idle.get(key)
+                kernel = idle.pop() if idle else None
+                starting = self._starting.get(key) if kernel is None else None
+            if kernel is None and starting is not None:
+                # Kernel thay thế đang khởi động, chờ thay vì khởi động thêm một kernel
+                starting.join()
+                continue
+            if kernel is None:
+                break
+            if kernel.fingerprint != fingerprint:
+                self._emit("Module thay đổi, khởi động lại kernel.")
+                kernel.shutdown()
+            elif not kernel.is_alive():
+                kernel.shutdown()
+            else:
+                return kernel
+        return self._start_kernel(kernel_name, cwd, fingerprint)
+
+    def checkin(self, kernel, healthy=True):
+        kernel.run_count += 1
+        try:
+            restart_reason = None
+            if not healthy or not kernel.is_alive():
+                kernel.shutdown()
+                return
+            if self.max_runs and kernel.run_count >= self.max_runs:
+                restart_reason = f"đã chạy {kernel.run_count} lần"
+            else:
+                rss = kernel.rss_mb()
+                if self.max_rss_mb and rss is not None and rss > self.max_rss_mb:
+                    restart_reason = f"RSS {rss:.0f}MB > {self.max_rss_mb}MB"
+
+            if restart_reason:
+                self._emit(f"Khởi động lại kernel ({restart_reason}).")
+                kernel.shutdown()
+                # Không chặn luồng trả kernel trong lúc kernel mới khởi động
+                self.prestart_in_background(kernel.kernel_name, kernel.cwd)
+                return
+
+            if self.reset_namespace:
+                kernel.run_code(RESET_NAMESPACE_CODE)
+            self._put_idle(kernel)
+        except Exception:
+            kernel.shutdown()
+
+    def _put_idle(self, kernel):
+        with self._lock:
+            idle = self._idle.setdefault(kernel.key, [])
+            if not self._closed and len(idle) < self.max_idle:
+                idle.append(kernel)
+                return
+        kernel.shutdown()
+
+    def shutdown(self):
+        with self._lock:
+            self._closed = True
+            starting = list(self._starting.values())
+        # Chờ kernel đang khởi động xong để tắt luôn, tránh để lại tiến trình kernel mồ côi
+        for thread in starting:
+            thread.join()
+        with self._lock:
+            kernels = [k for idle in self._idle.values() for k in idle]
+            self._idle.clear()
+        for kernel in kernels:
+            kernel.shutdown()
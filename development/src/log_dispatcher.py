@@ -0,0 +1,73 @@
+# development/src/log_dispatcher.py
+"""
+Module nhận log từ tất cả các tiến trình chạy notebook cho giao diện.
+
+Mỗi lần chạy có một kênh Pipe riêng (xem run_channels). Một luồng đọc chờ (block)
+đồng thời trên mọi kênh bằng `multiprocessing.connection.wait` và phát tín hiệu Qt để
+chuyển message về luồng giao diện, nơi message được định tuyến tới đúng section theo
+run_id. Tiến trình bị buộc dừng giữa lúc ghi chỉ làm hỏng kênh của chính nó. Không còn
+timer hỏi vòng nên khi không có notebook nào chạy, CPU gần như bằng 0.
+"""
+
+import threading
+
+from PyQt6.QtCore import QObject, Qt, pyqtSignal
+
+from engine import log_message
+from run_channels import RunChannels
+
+
+class LogDispatcher(QObject):
+    message_received = pyqtSignal(int, object)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.channels = RunChannels()
+        self._routes = {}
+        # Số message đã nhận từ kênh nhưng luồng giao diện chưa xử lý
+        self._backlog = 0
+        self._backlog_lock = threading.Lock()
+        self.message_received.connect(self._route_message, Qt.ConnectionType.QueuedConnection)
+        self._reader_thread = threading.Thread(target=self._read_loop, name="LogDispatcherReader", daemon=True)
+        self._reader_thread.start()
+
+    @property
+    def backlog(self):
+        return self._backlog
+
+    def register(self, handler):
+        """
+        Đăng ký handler(msg_type, content) cho một lần chạy mới, trả về (run_id, writer).
+        Truyền writer cho tiến trình con rồi gọi `RunChannels.release_writer(writer)`.
+        """
+        run_id, writer = self.channels.open()
+        self._routes[run_id] = handler
+        return run_id, writer
+
+    def unregister(self, run_id):
+        self._routes.pop(run_id, None)
+        self.channels.close(run_id)
+
+    def _read_loop(self):
+        while not self.channels.is_shut_down:
+            for run_id, message in self.channels.wait():
+                with self._backlog_lock:
+                    self._backlog += 1
+                self.message_received.emit(run_id, message)
+
+    def _route_message(self, run_id, message):
+        with self._backlog_lock:
+            self._backlog -= 1
+        handler = self._routes.get(run_id)
+        if handler is None:
+            # Message đến từ lần chạy đã kết thúc/bị dừng, bỏ qua
+            return
+        if isinstance(message, tuple) and len(message) == 2:
+            msg_type, content = message
+            try:
+                handler(msg_type, content)
+            except Exception as e:
+                log_message(f"Lỗi khi xử lý message '{msg_type}': {e}", level="ERROR")
+
+    def close(self):
+        self.channels.shutdown()
@@ -70,6 +70,21 @@ def _launch_kernel():
     app.launch_new_instance()
 
 
+def _run_headless():
+    # Chế độ headless không import Qt, dùng chung lõi thực thi với giao diện
+    sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__))))
+    import headless
+
+    sys.exit(headless.main(sys.argv[1:]))
+
+
+def _show_run_history():
+    sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__))))
+    import run_history
+
+    sys.exit(run_history.main(sys.argv[1:]))
+
+
 def main():
     from PyQt6.QtWidgets import (
         QApplication,
@@ -77,11 +92,11 @@ def main():
         QWidget,
         QVBoxLayout,
         QPushButton,
-        QScrollArea,
+        QLineEdit,
         QGroupBox,
         QSplitter,
     )
-    from PyQt6.QtCore import Qt, QTimer, QTime
+    from PyQt6.QtCore import Qt, QTimer
     from PyQt6.QtGui import QCloseEvent
     import time
 
@@ -89,7 +104,15 @@ def main():
     import config
     import functions
     import styles
-    from ui_components import NotebookCard, SectionWidget, ScheduleManagerWidget
+    from ui_components import SectionWidget, ScheduleManagerWidget
+    from notebook_list import NotebookListModel, NotebookFilterModel, NotebookListView
+    from log_dispatcher import LogDispatcher
+    from process_stopper import ProcessStopper
+    from admission import AdmissionController
+    from notebook_watcher import NotebookWatcher
+    from description_loader import DescriptionLoader, LOADING_DESCRIPTION
+    from scheduler import Scheduler
+    from metrics import MetricsRegistry, process_tree_rss_bytes, start_metrics_exporter
 
     class NotebookRunner(QMainWindow):
         def __init__(self):
@@ -98,7 +121,8 @@ def main():
             self.notebooks_path = config.NOTEBOOKS_DIR
             self.modules_path = config.MODULES_DIR
             self.import_path = config.IMPORT_DIR
-            self.available_notebook_cards = {}
+            self.notebook_model = NotebookListModel(self)
+            self.description_loader = DescriptionLoader(self._on_description_loaded, self)
             self.highlighted_available = []
             self.sections = {}
             self.section_counter = 0
@@ -106,13 +130,28 @@ def main():
             self.schedule_manager_widget = None
             self.set_window_icon()
             self.running_processes = {}
+            self.log_dispatcher = LogDispatcher(self)
+            self.process_stopper = ProcessStopper(self)
+            self.admission = AdmissionController(
+                schedule_retry=lambda delay, callback: QTimer.singleShot(int(delay * 1000), callback)
+            )
+            self.metrics = MetricsRegistry()
+            self.metrics.add_collector(self._collect_metrics)
+            # Tác vụ hẹn giờ chạy kể cả khi bảng hẹn giờ đang ẩn
+            self.scheduler = Scheduler(
+                self._on_scheduled_task,
+                lambda delay, callback: QTimer.singleShot(int(delay * 1000), Qt.TimerType.PreciseTimer, callback),
+                path=config.SCHEDULE_FILE,
+                is_available=self._schedule_target_ready,
+            )
             self.setup_ui()
             self.apply_stylesheet()
             self._update_window_minimum_size()
-
-            self.central_schedule_timer = QTimer(self)
-            self.central_schedule_timer.timeout.connect(self.check_recurring_tasks)
-            self.central_schedule_timer.start(1000)
+            self.metrics_exporter, metrics_info = start_metrics_exporter(self.metrics)
+            if metrics_info:
+                self.log_message_to_cmd(metrics_info)
+            self.scheduler.load()
+            self.schedule_manager_widget.update_task_display()
 
         def set_window_icon(self):
             functions.setup_window_icon(self)
@@ -164,16 +203,23 @@ def main():
             available_layout = QVBoxLayout(available_group)
             available_layout.setContentsMargins(5, 10, 5, 5)
             available_layout.setSpacing(8)
-            self.available_scroll_area = QScrollArea()
-            self.available_scroll_area.setWidgetResizable(True)
-            self.available_scroll_area.setObjectName("AvailableScrollArea")
-            self.available_cards_widget = QWidget()
-            self.available_cards_widget.setObjectName("CardsContainer")
-            self.available_cards_layout = QVBoxLayout(self.available_cards_widget)
-            self.available_cards_layout.setAlignment(Qt.AlignmentFlag.AlignTop)
-            self.available_cards_layout.setSpacing(6)
-            self.available_scroll_area.setWidget(self.available_cards_widget)
-            available_layout.addWidget(self.available_scroll_area)
+            self.notebook_search_box = QLineEdit()
+            self.notebook_search_box.setObjectName("NotebookSearchBox")
+            self.notebook_search_box.setPlaceholderText("🔍 Tìm notebook (tên, mô tả, tag:, import:, param:)")
+            self.notebook_search_box.setClearButtonEnabled(True)
+            self.search_timer = QTimer(self)
+            self.search_timer.setSingleShot(True)
+            self.search_timer.setInterval(config.NOTEBOOK_SEARCH_DEBOUNCE_MS)
+            self.search_timer.timeout.connect(self._apply_notebook_filter)
+            self.notebook_search_box.textChanged.connect(self.search_timer.start)
+            self.notebook_filter = NotebookFilterModel(self)
+            self.notebook_filter.setSourceModel(self.notebook_model)
+            self.notebook_list_view = NotebookListView(self)
+            self.notebook_list_view.setObjectName("AvailableList")
+            self.notebook_list_view.setModel(self.notebook_filter)
+            self.notebook_list_view.notebook_clicked.connect(self._on_card_click)
+            available_layout.addWidget(self.notebook_search_box)
+            available_layout.addWidget(self.notebook_list_view)
             controls_group = QGroupBox("⚙️ Điều Khiển Chung")
             controls_group.setObjectName("ControlsGroup")
             controls_layout = QVBoxLayout(controls_group)
@@ -208,7 +254,9 @@ def main():
             self.main_splitter.setStretchFactor(1, 1)
 
             main_layout.addWidget(self.main_splitter)
-            self.refresh_notebook_list()
+            self.notebook_watcher = None
+            # Dựng danh sách notebook sau khi cửa sổ đã hiện để không chặn lúc khởi động
+            QTimer.singleShot(0, self._load_notebook_list)
             self._update_window_minimum_size()
             self.update()
             QApplication.processEvents()
@@ -217,41 +265,101 @@ def main():
         def apply_stylesheet(self):
             self.setStyleSheet(styles.get_stylesheet())
 
-        def _create_card_in_list(self, path, parent_layout, card_dict):
-            description = functions.get_notebook_description(path)
-            card = NotebookCard(path, description, self)
-            card.clicked.connect(self._on_card_click)
-
-            new_name = os.path.basename(path)
-            insert_pos = 0
-            for i in range(parent_layout.count()):
-                item = parent_layout.itemAt(i)
-                widget = item.widget()
-                if widget and isinstance(widget, NotebookCard):
-                    if os.path.basename(widget.path) > new_name:
-                        break
-                insert_pos += 1
-
-            parent_layout.insertWidget(insert_pos, card)
-            card_dict[path] = card
+        def _load_notebook_list(self):
+            self.refresh_notebook_list()
+            if config.WATCH_ENABLED:
+                self.notebook_watcher = NotebookWatcher(self.notebooks_path, [self.modules_path, self.import_path], self)
+                self.notebook_watcher.notebooks_changed.connect(self._on_notebooks_changed)
+                self.notebook_watcher.modules_changed.connect(self._on_modules_changed)
+                self.notebook_watcher.start()
+                if self.notebook_watcher.is_polling:
+                    self.log_message_to_cmd("Không theo dõi được thư mục notebook/module, chuyển sang quét định kỳ.")
+
+        def _add_notebooks_to_list(self, paths, description=None):
+            """Thêm notebook vào danh sách chờ (model tự giữ thứ tự theo tên file); không có mô tả thì nạp trong nền."""
+            paths = sorted(paths, key=lambda p: (os.path.basename(p), p))
+            self.notebook_model.add_notebooks(paths, description or LOADING_DESCRIPTION)
+            if description is None:
+                self.description_loader.request(paths)
+
+        def _remove_notebook_from_list(self, path):
+            self.notebook_model.remove_notebook(path)
+            if path in self.highlighted_available:
+                self.highlighted_available.remove(path)
+
+        def find_section_card(self, path):
+            """Card của notebook trong một section, None nếu notebook không nằm trong section nào."""
+            return next((s.notebook_cards[path] for s in self.sections.values() if path in s.notebook_cards), None)
+
+        def _on_description_loaded(self, path, description, entry):
+            if path in self.notebook_model:
+                self.notebook_model.set_metadata(path, description, entry)
+                return
+            card = self.find_section_card(path)
+            if card is not None:
+                card.desc_label.setText(description)
+
+        def _apply_notebook_filter(self):
+            self.notebook_filter.set_query(self.notebook_search_box.text())
+            # Notebook bị ẩn bởi bộ lọc không còn được chọn để không bị kéo theo ngoài ý muốn
+            for path in list(self.highlighted_available):
+                if not self.notebook_filter.accepts_path(path):
+                    self.notebook_model.set_highlighted(path, False)
+                    self.highlighted_available.remove(path)
 
         def _on_card_click(self, path):
-            functions.handle_card_click(path, self.available_notebook_cards, self.highlighted_available)
+            functions.handle_card_click(path, self.notebook_model, self.highlighted_available)
 
         def refresh_notebook_list(self):
             functions.refresh_notebook_list(self)
 
-        def log_message_to_cmd(self, message, is_block=False):
-            if is_block:
-                # Chỉ in message đã được định dạng, không thêm timestamp mới
-                print(message)
-            else:
-                functions.log_message(message)
+        def _on_notebooks_changed(self, added, removed, modified):
+            functions.apply_notebook_changes(self, added, removed, modified)
+
+        def _on_modules_changed(self, module_names):
+            cards = {}
+            for section in self.sections.values():
+                cards.update(section.notebook_cards)
+            affected = self.notebook_watcher.notebooks_importing(self.notebook_model.paths() + list(cards), module_names)
+            for path in affected:
+                if path in cards:
+                    cards[path].mark_modules_changed(module_names)
+                else:
+                    self.notebook_model.mark_modules_changed(path, module_names)
+            self.log_message_to_cmd(
+                f"Module thay đổi: {', '.join(module_names)} (ảnh hưởng {len(affected)} notebook)."
+            )
+
+        def log_message_to_cmd(self, message):
+            functions.log_message(message)
+
+        def _collect_metrics(self):
+            """Số liệu tính tại thời điểm scrape, được gọi từ luồng của exporter nên chỉ đọc bản sao."""
+            sections = list(self.sections.items())
+            counts = self.admission.counts_by_section()
+            samples = [
+                ("nbrunner_log_channels_open", (), self.log_dispatcher.channels.open_count),
+                ("nbrunner_log_backlog", (), self.log_dispatcher.backlog),
+            ]
+            for section_id, section in sections:
+                labels = (("section", section.section_name),)
+                running, queued = counts.get(section_id, (0, 0))
+                samples.append(("nbrunner_notebooks_running", labels, running))
+                samples.append(("nbrunner_notebooks_queued", labels, queued))
+                for path, proc_info in list(section.running_processes.items()):
+                    rss = process_tree_rss_bytes(proc_info["process"].pid)
+                    samples.append(("nbrunner_process_rss_bytes", labels + (("notebook", os.path.basename(path)),), rss))
+            return samples
 
         def closeEvent(self, a0: QCloseEvent | None) -> None:
             total_running = sum(len(s.running_processes) for s in self.sections.values())
             reply = functions.handle_close_event(total_running, self)
             if reply:
+                if self.metrics_exporter is not None:
+                    self.metrics_exporter.close()
+                self.description_loader.close()
+                self.scheduler.close()
+                self.log_dispatcher.close()
                 if a0:
                     a0.accept()
             else:
@@ -272,27 +380,28 @@ def main():
             self.log_message_to_cmd(f"Đã tạo section mới: {section_name}")
             if self.schedule_manager_widget:
                 self.schedule_manager_widget.update_section_list(self.sections)
+            self.scheduler.retry_deferred()
 
         def move_notebooks_to_section(self, section_widget, paths_to_move):
             for path in paths_to_move:
-                if path in self.available_notebook_cards:
-                    old_card = self.available_notebook_cards[path]
-                    description = old_card.desc_label.text()
-                    self.available_cards_layout.removeWidget(old_card)
-                    old_card.deleteLater()
-                    del self.available_notebook_cards[path]
+                if path in self.notebook_model:
+                    description = self.notebook_model.description(path)
+                    self._remove_notebook_from_list(path)
                     section_widget.add_notebook_card(path, description)
 
                     nb_name = os.path.basename(path)
                     self.log_message_to_cmd(f"Đã thêm notebook '{nb_name}' vào section '{section_widget.section_name}'.")
 
             self.highlighted_available.clear()
+            # Tác vụ hẹn giờ đang chờ section này có notebook thì được chạy bù
+            self.scheduler.retry_deferred()
 
         def remove_notebooks_from_section(self, section_widget, paths):
             for path in paths:
                 if path in section_widget.notebook_cards:
+                    description = section_widget.notebook_cards[path].desc_label.text()
                     section_widget.remove_notebook_card(path)
-                    self._create_card_in_list(path, self.available_cards_layout, self.available_notebook_cards)
+                    self._add_notebooks_to_list([path], description)
 
                     nb_name = os.path.basename(path)
                     self.log_message_to_cmd(f"Đã loại bỏ notebook '{nb_name}' khỏi section '{section_widget.section_name}'.")
@@ -308,8 +417,13 @@ def main():
                 del self.sections[section_id]
             self._update_window_minimum_size()
             self.log_message_to_cmd(f"Đã đóng section: {section_widget.section_name}")
+            # Section bị đóng hẳn thì tác vụ hẹn giờ của nó không còn đích để chạy
+            removed = self.scheduler.remove_section(section_id)
+            if removed:
+                self.log_message_to_cmd(f"Đã xóa {len(removed)} tác vụ hẹn giờ của section '{section_widget.section_name}'.")
             if self.schedule_manager_widget:
                 self.schedule_manager_widget.update_section_list(self.sections)
+                self.schedule_manager_widget.update_task_display()
 
         # MODIFIED: Logic now also updates the window's minimum size
         def toggle_schedule_manager(self):
@@ -318,38 +432,27 @@ def main():
                 self.schedule_manager_widget.setVisible(not is_visible)
                 if not is_visible:
                     self.schedule_manager_widget.update_section_list(self.sections)
+                    self.schedule_manager_widget.update_task_display()
                 # Recalculate and set the new minimum window size
                 self._update_window_minimum_size()
 
-        def check_recurring_tasks(self):
-            if not self.schedule_manager_widget or not self.schedule_manager_widget.isVisible():
-                return
-
-            tasks = self.schedule_manager_widget.get_tasks()
-            now = QTime.currentTime()
-
-            for task_id, task_info in list(tasks.items()):
-                if task_info["time"].hour() == now.hour() and task_info["time"].minute() == now.minute():
-                    if task_info.get("last_run_time") == now.toString("HH:mm"):
-                        continue
-
-                    target_section_id = task_info["section_id"]
-                    target_section = self.sections.get(target_section_id)
-
-                    if target_section:
-                        action_key = task_info["action_key"]
-                        if hasattr(target_section, action_key):
-                            getattr(target_section, action_key)()
-                            log_message = (
-                                f"Tác vụ định kỳ: Thực thi '{task_info['action_text']}' "
-                                f"cho '{target_section.section_name}' lúc {now.toString('HH:mm')}"
-                            )
-                            self.log_message_to_cmd(log_message)
-
-                            self.schedule_manager_widget.mark_task_as_run(task_id, now.toString("HH:mm"))
-                else:
-                    if task_info.get("last_run_time"):
-                        self.schedule_manager_widget.reset_task_run_marker(task_id)
+        def _schedule_target_ready(self, task):
+            """Section đích đã được tạo lại và có notebook; nếu chưa, scheduler hoãn tác vụ."""
+            section = self.sections.get(task.section_id)
+            return section is not None and bool(section.notebook_cards)
+
+        def _on_scheduled_task(self, task, scheduled_time):
+            target_section = self.sections.get(task.section_id)
+            if target_section is None:
+                self.log_message_to_cmd(f"Tác vụ định kỳ #{task.task_id}: Không tìm thấy '{task.section_name}', bỏ qua.")
+            elif hasattr(target_section, task.action_key):
+                getattr(target_section, task.action_key)()
+                self.log_message_to_cmd(
+                    f"Tác vụ định kỳ: Thực thi '{task.action_text}' "
+                    f"cho '{target_section.section_name}' lúc {time.strftime('%H:%M:%S')}"
+                )
+            if self.schedule_manager_widget and self.schedule_manager_widget.isVisible():
+                self.schedule_manager_widget.update_task_display()
 
     app = QApplication(sys.argv)
     functions.setup_application_icon(app)
@@ -375,6 +478,10 @@ if __name__ == "__main__":
 
     if "-f" in sys.argv:
         _launch_kernel()
+    elif "--headless" in sys.argv:
+        _run_headless()
+    elif "--history" in sys.argv:
+        _show_run_history()
     else:
         _hide_console_window_on_windows()
         main()
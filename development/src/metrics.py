@@ -0,0 +1,249 @@
+# development/src/metrics.py
+"""
+Module thu thập số liệu vận hành và xuất theo định dạng text của Prometheus.
+
+Giao diện và chế độ headless cùng đưa message của tiến trình notebook vào
+`MetricsRegistry.observe_message`, từ đó cập nhật counter/gauge/histogram. Các số
+liệu chỉ có ý nghĩa tại thời điểm scrape (số notebook đang chạy/đang chờ, số kênh log
+đang mở, backlog log của giao diện, RSS của tiến trình con) được tính bằng collector
+đăng ký qua `add_collector`. Số liệu được phục vụ tại http://METRICS_HOST:METRICS_PORT/metrics
+và/hoặc ghi định kỳ ra file .prom cho textfile collector của node_exporter.
+Không phụ thuộc Qt.
+"""
+
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+try:
+    import psutil
+except ImportError:
+    # psutil là tùy chọn, thiếu thì không có số liệu RSS
+    psutil = None
+
+import config
+from structured_log import log_message
+
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+DURATION_BUCKETS = (0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800, 3600)
+KERNEL_START_BUCKETS = (0.5, 1, 2, 3, 5, 10, 20, 30, 60)
+
+# Tên -> (kiểu, mô tả, bucket nếu là histogram)
+METRICS = {
+    "nbrunner_notebooks_running": ("gauge", "Số notebook đang chạy theo section", None),
+    "nbrunner_notebooks_queued": ("gauge", "Số notebook đang chờ slot trống theo section", None),
+    "nbrunner_runs_failed_total": ("counter", "Số lần chạy notebook kết thúc do lỗi theo section", None),
+    "nbrunner_iterations_total": ("counter", "Số lần lặp đã chạy theo notebook và kết quả", None),
+    "nbrunner_iteration_duration_seconds": ("histogram", "Thời gian chạy mỗi lần lặp", DURATION_BUCKETS),
+    "nbrunner_consecutive_errors": ("gauge", "Số lần lỗi liên tiếp hiện tại của notebook", None),
+    "nbrunner_kernel_start_seconds": ("histogram", "Thời gian khởi động và làm nóng kernel", KERNEL_START_BUCKETS),
+    "nbrunner_log_channels_open": ("gauge", "Số kênh log (Pipe) đang mở tới tiến trình notebook", None),
+    "nbrunner_log_backlog": ("gauge", "Số message log đã nhận nhưng giao diện chưa xử lý", None),
+    "nbrunner_process_rss_bytes": ("gauge", "RSS của tiến trình chạy notebook cùng kernel và tiến trình con", None),
+}
+
+
+def _escape_label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape_label(value)}"' for name, value in labels) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+def process_tree_rss_bytes(pid):
+    """Tổng RSS của tiến trình `pid` và mọi tiến trình con (kernel), None nếu không đo được."""
+    if psutil is None or not pid:
+        return None
+    try:
+        process = psutil.Process(pid)
+        processes = [process] + process.children(recursive=True)
+    except psutil.Error:
+        return None
+    total = 0
+    for proc in processes:
+        try:
+            total += proc.memory_info().rss
+        except psutil.Error:
+            # Tiến trình con vừa kết thúc giữa chừng
+            pass
+    return total
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._values = {}
+        self._histograms = {}
+        self._collectors = []
+
+    def inc(self, name, labels=(), amount=1):
+        key = (name, tuple(labels))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def set(self, name, labels, value):
+        with self._lock:
+            self._values[(name, tuple(labels))] = value
+
+    def observe(self, name, labels, value):
+        buckets = METRICS[name][2]
+        with self._lock:
+            histogram = self._histograms.setdefault((name, tuple(labels)), {"buckets": [0] * len(buckets), "sum": 0.0, "count": 0})
+            for i, bound in enumerate(buckets):
+                if value <= bound:
+                    histogram["buckets"][i] += 1
+            histogram["sum"] += value
+            histogram["count"] += 1
+
+    def add_collector(self, collector):
+        """collector() trả về danh sách (tên, labels, giá trị) được tính lại mỗi lần scrape."""
+        self._collectors.append(collector)
+
+    def observe_message(self, section, notebook_path, msg_type, content):
+        """Cập nhật số liệu từ message của tiến trình notebook (cùng giao thức với giao diện/headless)."""
+        notebook = os.path.basename(notebook_path)
+        if msg_type == "ITERATION_END":
+            labels = (("section", section), ("notebook", notebook))
+            result = "success" if content["success"] else ("limit" if content.get("limit") else "error")
+            self.inc("nbrunner_iterations_total", labels + (("result", result),))
+            self.observe("nbrunner_iteration_duration_seconds", labels, content["duration"])
+            self.set("nbrunner_consecutive_errors", labels, content["consecutive_errors"])
+        elif msg_type == "KERNEL_STARTED":
+            self.observe("nbrunner_kernel_start_seconds", (("section", section),), content["start_latency"])
+        elif msg_type == "EXECUTION_FINISHED" and content is False:
+            self.inc("nbrunner_runs_failed_total", (("section", section),))
+
+    def _collect(self):
+        samples = []
+        for collector in list(self._collectors):
+            try:
+                samples.extend(collector())
+            except Exception as e:
+                # Một collector lỗi không được làm hỏng cả lần scrape
+                log_message(f"Lỗi khi thu thập metrics: {e}", level="ERROR")
+        return samples
+
+    def render(self):
+        """Toàn bộ số liệu theo định dạng text của Prometheus (version 0.0.4)."""
+        collected = self._collect()
+        with self._lock:
+            values = dict(self._values)
+            histograms = {key: {**h, "buckets": list(h["buckets"])} for key, h in self._histograms.items()}
+        for name, labels, value in collected:
+            if value is not None:
+                values[(name, tuple(labels))] = value
+
+        lines = []
+        for name, (metric_type, help_text, buckets) in METRICS.items():
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {metric_type}")
+            if metric_type == "histogram":
+                for (metric, labels), histogram in sorted(histograms.items()):
+                    if metric != name:
+                        continue
+                    for bound, count in zip(buckets + (float("inf"),), histogram["buckets"] + [histogram["count"]]):
+                        bucket_labels = labels + (("le", _format_value(float(bound))),)
+                        lines.append(f"{name}_bucket{_format_labels(bucket_labels)} {count}")
+                    lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(histogram['sum'])}")
+                    lines.append(f"{name}_count{_format_labels(labels)} {histogram['count']}")
+            else:
+                for (metric, labels), value in sorted(values.items()):
+                    if metric == name:
+                        lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+class _MetricsRequestHandler(BaseHTTPRequestHandler):
+    registry = None
+
+    def do_GET(self):
+        if self.path.split("?", 1)[0] not in ("/", "/metrics"):
+            self.send_error(404)
+            return
+        body = self.registry.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Không in mỗi lần Prometheus scrape ra console
+        pass
+
+
+class MetricsExporter:
+    """Phục vụ /metrics qua HTTP và/hoặc ghi định kỳ file .prom, đều chạy trong luồng nền."""
+
+    def __init__(self, registry, host=None, port=None, textfile_path=None, textfile_interval=None):
+        self.registry = registry
+        self.host = config.METRICS_HOST if host is None else host
+        self.port = config.METRICS_PORT if port is None else port
+        self.textfile_path = config.METRICS_TEXTFILE_PATH if textfile_path is None else textfile_path
+        self.textfile_interval = config.METRICS_TEXTFILE_INTERVAL if textfile_interval is None else textfile_interval
+        self._server = None
+        self._stop_event = threading.Event()
+
+    def start(self):
+        """Bắt đầu xuất số liệu. Trả về thông báo mô tả nơi xuất, None nếu không có gì được bật."""
+        targets = []
+        if self.port:
+            handler = type("MetricsRequestHandler", (_MetricsRequestHandler,), {"registry": self.registry})
+            try:
+                self._server = ThreadingHTTPServer((self.host, self.port), handler)
+            except OSError as e:
+                targets.append(f"không mở được cổng {self.port} ({e})")
+            else:
+                self._server.daemon_threads = True
+                threading.Thread(target=self._server.serve_forever, name="MetricsServer", daemon=True).start()
+                targets.append(f"http://{self.host}:{self.port}/metrics")
+        if self.textfile_path:
+            threading.Thread(target=self._write_textfile_loop, name="MetricsTextfile", daemon=True).start()
+            targets.append(self.textfile_path)
+        return "Metrics: " + ", ".join(targets) if targets else None
+
+    def write_textfile(self):
+        directory = os.path.dirname(self.textfile_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # Ghi ra file tạm rồi đổi tên để node_exporter không bao giờ đọc phải file ghi dở
+        tmp_path = f"{self.textfile_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(self.registry.render())
+        os.replace(tmp_path, self.textfile_path)
+
+    def _write_textfile_loop(self):
+        while not self._stop_event.is_set():
+            try:
+                self.write_textfile()
+            except OSError as e:
+                log_message(f"Không ghi được file metrics: {e}", level="ERROR")
+            self._stop_event.wait(self.textfile_interval)
+
+    def close(self):
+        self._stop_event.set()
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+
+def start_metrics_exporter(registry, port=None):
+    """Khởi động exporter theo config. Trả về (exporter hoặc None, thông báo hoặc None)."""
+    if not config.METRICS_ENABLED:
+        return None, None
+    exporter = MetricsExporter(registry, port=port)
+    return exporter, exporter.start()
@@ -0,0 +1,73 @@
+# development/src/namespace_snapshot.py
+"""
+Module chụp và khôi phục namespace của kernel, dùng khi chạy một notebook trên nhiều
+bộ tham số.
+
+Các cell phía trước cell `parameters` (import, đọc dữ liệu...) chỉ chạy một lần trên
+mỗi kernel. Sau đó namespace được chụp lại trong bộ nhớ của kernel: giá trị được pickle
+để mỗi bộ tham số nhận một bản sao mới, không bị lần chạy trước sửa tại chỗ; module,
+hàm và class được giữ theo tham chiếu. Giá trị không pickle được cũng được giữ theo tham
+chiếu và được báo lại, vì thay đổi tại chỗ trên chúng sẽ lan sang các lần chạy sau.
+Không phụ thuộc Qt.
+"""
+
+HELPER_NAME = "__nbrunner_snapshot"
+
+# Mã chạy trong kernel, định nghĩa helper chụp/khôi phục namespace người dùng
+HELPER_CODE = '''
+class _NBRunnerSnapshot:
+    PROTECTED = {"In", "Out", "get_ipython", "exit", "quit", "open"}
+
+    def __init__(self):
+        self.values = {}
+
+    def _user_names(self, ns):
+        return [name for name in ns if not name.startswith("_") and name not in self.PROTECTED]
+
+    def take(self, ns):
+        import pickle, types
+        by_reference = (types.ModuleType, types.FunctionType, types.BuiltinFunctionType, type)
+        self.values.clear()
+        shared = []
+        for name in self._user_names(ns):
+            value = ns[name]
+            if isinstance(value, by_reference):
+                self.values[name] = (False, value)
+                continue
+            try:
+                self.values[name] = (True, pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+            except Exception:
+                self.values[name] = (False, value)
+                shared.append(name)
+        return shared
+
+    def restore(self, ns):
+        import pickle
+        for name in self._user_names(ns):
+            if name not in self.values:
+                del ns[name]
+        for name, (pickled, value) in self.values.items():
+            ns[name] = pickle.loads(value) if pickled else value
+'''
+
+TAKE_CODE = f"""
+{HELPER_CODE}
+{HELPER_NAME} = _NBRunnerSnapshot()
+del _NBRunnerSnapshot
+for __nbrunner_name in {HELPER_NAME}.take(globals()):
+    print(__nbrunner_name)
+"""
+
+RESTORE_CODE = f"{HELPER_NAME}.restore(globals())"
+
+
+def take_snapshot(kernel, timeout):
+    """Chụp namespace hiện tại của kernel. Trả về tên các biến không pickle được (dùng chung giữa các lần chạy)."""
+    nb = kernel.run_code(TAKE_CODE, timeout)
+    output = "".join(out.get("text", "") for out in nb.cells[0].get("outputs", []) if out.get("output_type") == "stream")
+    return output.split()
+
+
+def restore_snapshot(kernel, timeout):
+    """Đưa namespace của kernel về trạng thái lúc chụp."""
+    kernel.run_code(RESTORE_CODE, timeout)
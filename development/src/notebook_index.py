@@ -0,0 +1,274 @@
+# development/src/notebook_index.py
+"""
+Module chỉ mục metadata của notebook, lưu trên đĩa và cập nhật tăng dần.
+
+Mỗi notebook được đọc một lần cho mỗi phiên bản (đường dẫn + mtime + kích thước):
+mô tả (tiêu đề `# ` đầu tiên trong cell markdown), tag, kernel spec, số cell, các
+tham số khai báo trong cell gắn tag `parameters`, các module được import và các
+notebook phụ thuộc (`depends_on`). Việc
+đọc dùng bộ parse JSON riêng bỏ qua phần `outputs`/`attachments` mà không giải mã
+(nhảy qua chuỗi base64 của ảnh bằng str.find), không validate schema như nbformat, nên
+notebook có output lớn vẫn được đọc rất nhanh. Lần khởi động sau chỉ cần `os.stat`.
+Không phụ thuộc Qt.
+"""
+
+import ast
+import json
+import os
+import re
+import threading
+
+import config
+
+
+INDEX_VERSION = 1
+SKIPPED_KEYS = frozenset(("outputs", "attachments"))
+PARAMETERS_TAG = "parameters"
+NO_DESCRIPTION = "Không có mô tả"
+UNREADABLE_DESCRIPTION = "Không thể đọc mô tả."
+
+_DECODER = json.JSONDecoder()
+_WHITESPACE_RE = re.compile(r"[ \t\n\r]*")
+# Dùng khi cell không parse được bằng ast (vd: có magic %)
+_IMPORT_LINE_RE = re.compile(r"^\s*(?:from\s+([\w.]+)\s+import|import\s+([\w., ]+))", re.MULTILINE)
+
+
+def _skip_ws(text, pos):
+    return _WHITESPACE_RE.match(text, pos).end()
+
+
+def _string_end(text, start):
+    """Vị trí ngay sau chuỗi JSON bắt đầu tại `start` (dùng str.find nên rất nhanh với chuỗi dài)."""
+    end = text.find('"', start + 1)
+    while end != -1:
+        backslashes, k = 0, end - 1
+        while text[k] == "\\":
+            backslashes, k = backslashes + 1, k - 1
+        if backslashes % 2 == 0:
+            return end + 1
+        end = text.find('"', end + 1)
+    raise ValueError("JSON không hợp lệ: chuỗi không được đóng")
+
+
+def _skip_value(text, pos):
+    """Nhảy qua một giá trị JSON mà không giải mã, trả về vị trí ngay sau nó."""
+    if text[pos] not in "[{":
+        return _DECODER.raw_decode(text, pos)[1]
+    depth = 0
+    while True:
+        quote = text.find('"', pos)
+        if quote == -1:
+            quote = len(text)
+        # Đoạn giữa hai chuỗi chỉ gồm dấu ngoặc, dấu phẩy, số... nên rất ngắn
+        for offset, char in enumerate(text[pos:quote]):
+            if char in "[{":
+                depth += 1
+            elif char in "]}":
+                depth -= 1
+                if depth == 0:
+                    return pos + offset + 1
+        if quote == len(text):
+            raise ValueError("JSON không hợp lệ: thiếu dấu đóng")
+        pos = _string_end(text, quote)
+
+
+def _parse_value(text, pos):
+    """Giải mã giá trị JSON tại `pos`, bỏ qua (gán None) các khóa trong SKIPPED_KEYS."""
+    char = text[pos]
+    if char == "{":
+        result = {}
+        pos = _skip_ws(text, pos + 1)
+        if text[pos] == "}":
+            return result, pos + 1
+        while True:
+            key, pos = _DECODER.raw_decode(text, pos)
+            pos = _skip_ws(text, pos)
+            if text[pos] != ":":
+                raise ValueError(f"JSON không hợp lệ tại vị trí {pos}")
+            pos = _skip_ws(text, pos + 1)
+            if key in SKIPPED_KEYS:
+                result[key], pos = None, _skip_value(text, pos)
+            else:
+                result[key], pos = _parse_value(text, pos)
+            pos = _skip_ws(text, pos)
+            if text[pos] == "}":
+                return result, pos + 1
+            pos = _skip_ws(text, pos + 1)
+    if char == "[":
+        result = []
+        pos = _skip_ws(text, pos + 1)
+        if text[pos] == "]":
+            return result, pos + 1
+        while True:
+            value, pos = _parse_value(text, pos)
+            result.append(value)
+            pos = _skip_ws(text, pos)
+            if text[pos] == "]":
+                return result, pos + 1
+            pos = _skip_ws(text, pos + 1)
+    return _DECODER.raw_decode(text, pos)
+
+
+def read_notebook_light(path):
+    """Đọc notebook dưới dạng dict thuần, không giải mã outputs và không validate."""
+    with open(path, "r", encoding="utf-8") as f:
+        text = f.read()
+    return _parse_value(text, _skip_ws(text, 0))[0]
+
+
+def _cell_source(cell):
+    source = cell.get("source", "")
+    return "".join(source) if isinstance(source, list) else source
+
+
+def _description(cells):
+    for cell in cells:
+        if cell.get("cell_type") == "markdown":
+            for line in _cell_source(cell).split("\n"):
+                if line.strip().startswith("# "):
+                    return line.strip()[2:].strip()
+    return NO_DESCRIPTION
+
+
+def declared_parameters(source):
+    """{tên: biểu thức mặc định} của các phép gán ở cấp cao nhất trong cell tham số."""
+    try:
+        tree = ast.parse(source)
+    except SyntaxError:
+        return {}
+    parameters = {}
+    for node in tree.body:
+        if isinstance(node, ast.Assign):
+            targets, value = node.targets, node.value
+        elif isinstance(node, ast.AnnAssign) and node.value is not None:
+            targets, value = [node.target], node.value
+        else:
+            continue
+        for target in targets:
+            if isinstance(target, ast.Name):
+                parameters[target.id] = ast.get_source_segment(source, value)
+    return parameters
+
+
+def _imports(source):
+    names = set()
+    try:
+        tree = ast.parse(source)
+    except SyntaxError:
+        for from_name, import_names in _IMPORT_LINE_RE.findall(source):
+            candidates = [from_name] if from_name else import_names.split(",")
+            names.update(c.strip().split(" ")[0].split(".")[0] for c in candidates if c.strip())
+        return names
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            names.update(alias.name.split(".")[0] for alias in node.names)
+        elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+            names.add(node.module.split(".")[0])
+    return names
+
+
+def extract_metadata(notebook):
+    """Thông tin cần cho danh sách notebook từ dict notebook (đã bỏ outputs)."""
+    cells = notebook.get("cells", [])
+    tags, parameters, imports = [], {}, set()
+    for cell in cells:
+        cell_tags = cell.get("metadata", {}).get("tags", [])
+        tags.extend(tag for tag in cell_tags if tag not in tags)
+        if cell.get("cell_type") != "code":
+            continue
+        source = _cell_source(cell)
+        if PARAMETERS_TAG in cell_tags:
+            parameters.update(declared_parameters(source))
+        imports.update(_imports(source))
+    metadata = notebook.get("metadata", {})
+    kernelspec = metadata.get("kernelspec", {})
+    depends_on = metadata.get(config.NOTEBOOK_METADATA_KEY, {}).get("depends_on", [])
+    return {
+        "description": _description(cells),
+        "tags": tags,
+        "kernel": kernelspec.get("name", ""),
+        "cell_count": len(cells),
+        "parameters": parameters,
+        "imports": sorted(imports),
+        "depends_on": [depends_on] if isinstance(depends_on, str) else list(depends_on),
+    }
+
+
+class NotebookIndex:
+    """Chỉ mục {đường dẫn: metadata} lưu trong một file JSON, an toàn khi dùng từ nhiều luồng."""
+
+    def __init__(self, index_path=None):
+        self.index_path = index_path or os.path.join(config.CACHE_DIR, "notebook_index.json")
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._dirty = False
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("version") == INDEX_VERSION:
+                self._entries = data.get("entries", {})
+        except (OSError, ValueError, AttributeError):
+            pass
+
+    def get(self, path):
+        """Metadata của notebook, chỉ đọc lại file khi mtime/kích thước thay đổi. None nếu không đọc được."""
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        with self._lock:
+            entry = self._entries.get(path)
+        if entry and entry["mtime_ns"] == stat.st_mtime_ns and entry["size"] == stat.st_size:
+            return entry
+        try:
+            entry = extract_metadata(read_notebook_light(path))
+        except (OSError, ValueError, IndexError, AttributeError):
+            return None
+        entry.update(mtime_ns=stat.st_mtime_ns, size=stat.st_size)
+        with self._lock:
+            self._entries[path] = entry
+            self._dirty = True
+        return entry
+
+    def description(self, path):
+        entry = self.get(path)
+        return entry["description"] if entry else UNREADABLE_DESCRIPTION
+
+    def prune(self, existing_paths):
+        """Bỏ các notebook không còn tồn tại khỏi chỉ mục."""
+        existing_paths = set(existing_paths)
+        with self._lock:
+            stale = [path for path in self._entries if path not in existing_paths]
+            for path in stale:
+                del self._entries[path]
+            self._dirty = self._dirty or bool(stale)
+
+    def save(self):
+        with self._lock:
+            if not self._dirty:
+                return
+            data = {"version": INDEX_VERSION, "entries": dict(self._entries)}
+            self._dirty = False
+        try:
+            os.makedirs(os.path.dirname(self.index_path), exist_ok=True)
+            # Ghi ra file tạm rồi đổi tên để không bao giờ để lại file chỉ mục ghi dở
+            tmp_path = f"{self.index_path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(tmp_path, self.index_path)
+        except OSError:
+            with self._lock:
+                self._dirty = True
+
+
+_shared_index = None
+_shared_index_lock = threading.Lock()
+
+
+def shared_index():
+    """Chỉ mục dùng chung trong tiến trình giao diện, được nạp ở lần gọi đầu tiên."""
+    global _shared_index
+    with _shared_index_lock:
+        if _shared_index is None:
+            _shared_index = NotebookIndex()
+        return _shared_index
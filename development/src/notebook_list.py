@@ -0,0 +1,408 @@
+# development/src/notebook_list.py
+"""
+Module danh sách notebook chờ theo kiểu model/view (QListView + delegate).
+
+Thay vì mỗi notebook một QFrame, danh sách chỉ giữ dữ liệu trong model và delegate
+vẽ card cho các dòng đang hiển thị, nên số widget không tăng theo số notebook.
+Model luôn được sắp xếp theo tên file; proxy lọc theo ô tìm kiếm dựa trên metadata
+trong chỉ mục (tên, mô tả, tag, module import, tham số). Việc tô sáng, ctrl-click
+(`functions.handle_card_click`) và kéo thả sang section giữ nguyên như card cũ.
+
+Cú pháp tìm kiếm: các từ cách nhau bởi khoảng trắng, notebook phải khớp tất cả;
+`tag:x`, `import:x`, `param:x` chỉ tìm trong tag, module import, tên tham số.
+"""
+
+import bisect
+import os
+
+from PyQt6.QtWidgets import QApplication, QListView, QStyle, QStyledItemDelegate, QStyleOptionViewItem
+from PyQt6.QtCore import QAbstractListModel, QModelIndex, QPoint, QRect, QRectF, QSize, QSortFilterProxyModel, Qt, QMimeData, pyqtSignal
+from PyQt6.QtGui import QBrush, QColor, QDrag, QFont, QFontMetrics, QLinearGradient, QMouseEvent, QPainter, QPen, QPixmap
+
+
+PATH_ROLE = Qt.ItemDataRole.UserRole
+DESCRIPTION_ROLE = Qt.ItemDataRole.UserRole + 1
+MODULES_ROLE = Qt.ItemDataRole.UserRole + 2
+HIGHLIGHTED_ROLE = Qt.ItemDataRole.UserRole + 3
+
+SEARCH_FIELDS = {"tag": "tags", "import": "imports", "param": "parameters"}
+
+
+def modules_changed_text(module_names):
+    return f"⟳ Module đã thay đổi: {', '.join(sorted(module_names))}"
+
+
+class NotebookListModel(QAbstractListModel):
+    """Các notebook trong danh sách chờ, sắp xếp theo (tên file, đường dẫn)."""
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._keys = []
+        self._items = {}
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._keys)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        item = self._items[self._keys[index.row()][1]]
+        if role == Qt.ItemDataRole.DisplayRole:
+            return item["name"]
+        if role == PATH_ROLE:
+            return item["path"]
+        if role == DESCRIPTION_ROLE:
+            return item["description"]
+        if role == MODULES_ROLE:
+            return item["changed_modules"]
+        if role == HIGHLIGHTED_ROLE:
+            return item["highlighted"]
+        if role == Qt.ItemDataRole.ToolTipRole:
+            return item["path"]
+        return None
+
+    def __contains__(self, path):
+        return path in self._items
+
+    def __len__(self):
+        return len(self._keys)
+
+    def paths(self):
+        return [path for _, path in self._keys]
+
+    def item_at(self, row):
+        return self._items[self._keys[row][1]]
+
+    def row_of(self, path):
+        key = (os.path.basename(path), path)
+        row = bisect.bisect_left(self._keys, key)
+        return row if row < len(self._keys) and self._keys[row] == key else -1
+
+    def _new_item(self, path, description):
+        name = os.path.basename(path)
+        return {
+            "path": path,
+            "name": name,
+            "description": description,
+            "tags": [],
+            "imports": [],
+            "parameters": [],
+            "search_text": name.lower(),
+            "changed_modules": set(),
+            "highlighted": False,
+        }
+
+    def add_notebooks(self, paths, description):
+        """Thêm notebook vào đúng vị trí; thêm nhiều notebook thì dựng lại model một lần."""
+        new_paths = [path for path in dict.fromkeys(paths) if path not in self._items]
+        if not new_paths:
+            return
+        if len(new_paths) == 1:
+            path = new_paths[0]
+            key = (os.path.basename(path), path)
+            row = bisect.bisect_left(self._keys, key)
+            self.beginInsertRows(QModelIndex(), row, row)
+            self._keys.insert(row, key)
+            self._items[path] = self._new_item(path, description)
+            self.endInsertRows()
+            return
+        self.beginResetModel()
+        for path in new_paths:
+            self._items[path] = self._new_item(path, description)
+        self._keys = sorted(self._keys + [(os.path.basename(path), path) for path in new_paths])
+        self.endResetModel()
+
+    def remove_notebook(self, path):
+        row = self.row_of(path)
+        if row < 0:
+            return None
+        self.beginRemoveRows(QModelIndex(), row, row)
+        del self._keys[row]
+        item = self._items.pop(path)
+        self.endRemoveRows()
+        return item
+
+    def _emit_changed(self, path):
+        row = self.row_of(path)
+        if row >= 0:
+            index = self.index(row)
+            self.dataChanged.emit(index, index)
+
+    def description(self, path):
+        return self._items[path]["description"]
+
+    def set_metadata(self, path, description, entry):
+        """Cập nhật mô tả và dữ liệu tìm kiếm từ entry của chỉ mục metadata (None nếu không đọc được)."""
+        item = self._items.get(path)
+        if item is None:
+            return
+        item["description"] = description
+        if entry:
+            item["tags"] = [tag.lower() for tag in entry["tags"]]
+            item["imports"] = [name.lower() for name in entry["imports"]]
+            item["parameters"] = [name.lower() for name in entry["parameters"]]
+        item["search_text"] = "\n".join([item["name"], description] + item["tags"] + item["imports"] + item["parameters"]).lower()
+        self._emit_changed(path)
+
+    def is_highlighted(self, path):
+        item = self._items.get(path)
+        return bool(item and item["highlighted"])
+
+    def set_highlighted(self, path, highlighted):
+        item = self._items.get(path)
+        if item is not None and item["highlighted"] != highlighted:
+            item["highlighted"] = highlighted
+            self._emit_changed(path)
+
+    def mark_modules_changed(self, path, module_names):
+        item = self._items.get(path)
+        if item is not None:
+            item["changed_modules"].update(module_names)
+            self._emit_changed(path)
+
+
+class NotebookFilterModel(QSortFilterProxyModel):
+    """Lọc danh sách theo ô tìm kiếm; thứ tự giữ nguyên theo model nguồn."""
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._terms = []
+
+    def set_query(self, text):
+        terms = []
+        for word in text.lower().split():
+            field, _, value = word.partition(":")
+            if value and field in SEARCH_FIELDS:
+                terms.append((SEARCH_FIELDS[field], value))
+            else:
+                terms.append((None, word))
+        self._terms = terms
+        self.invalidateFilter()
+
+    def _matches(self, item):
+        for field, value in self._terms:
+            if field is None:
+                if value not in item["search_text"]:
+                    return False
+            elif not any(value in candidate for candidate in item[field]):
+                return False
+        return True
+
+    def filterAcceptsRow(self, source_row, source_parent):
+        return not self._terms or self._matches(self.sourceModel().item_at(source_row))
+
+    def accepts_path(self, path):
+        row = self.sourceModel().row_of(path)
+        return row >= 0 and self.filterAcceptsRow(row, QModelIndex())
+
+
+class NotebookCardDelegate(QStyledItemDelegate):
+    """Vẽ mỗi dòng thành card giống card cũ (tên file, mô tả, cảnh báo module thay đổi)."""
+
+    MARGIN = 2
+    PADDING = 9
+    SPACING = 5
+    RADIUS = 10
+    # (nền trên, nền dưới, viền) theo trạng thái: thường, di chuột, được chọn
+    COLORS = {
+        "normal": ("#ffffff", "#f8f9fa", "#e9ecef"),
+        "hover": ("#e3f2fd", "#bbdefb", "#007bff"),
+        "selected": ("#cce5ff", "#99d6ff", "#007bff"),
+    }
+
+    def __init__(self, view):
+        super().__init__(view)
+        self.view = view
+        self.name_font = QFont("Segoe UI", 10, QFont.Weight.Bold)
+        self.desc_font = QFont("Segoe UI", 9)
+        self.modules_font = QFont("Segoe UI", 8)
+        self._size_cache = {}
+        self._cache_width = None
+
+    def _text_blocks(self, index):
+        """[(font, màu, cờ ngắt dòng, nội dung)] của card theo thứ tự từ trên xuống."""
+        blocks = [
+            (self.name_font, "#2c3e50", Qt.TextFlag.TextWrapAnywhere, index.data(Qt.ItemDataRole.DisplayRole)),
+            (self.desc_font, "#666666", Qt.TextFlag.TextWordWrap, index.data(DESCRIPTION_ROLE)),
+        ]
+        modules = index.data(MODULES_ROLE)
+        if modules:
+            blocks.append((self.modules_font, "#fd7e14", Qt.TextFlag.TextWordWrap, modules_changed_text(modules)))
+        return blocks
+
+    def _text_width(self, width):
+        return max(1, width - 2 * (self.MARGIN + self.PADDING))
+
+    def sizeHint(self, option, index):
+        width = self.view.viewport().width() - 2 * self.view.spacing()
+        if width != self._cache_width:
+            self._size_cache.clear()
+            self._cache_width = width
+        blocks = self._text_blocks(index)
+        cache_key = tuple(text for _, _, _, text in blocks)
+        size = self._size_cache.get(cache_key)
+        if size is None:
+            text_width = self._text_width(width)
+            height = 2 * (self.MARGIN + self.PADDING) + self.SPACING * (len(blocks) - 1)
+            for font, _, flags, text in blocks:
+                height += QFontMetrics(font).boundingRect(QRect(0, 0, text_width, 0), flags, text).height()
+            size = self._size_cache[cache_key] = QSize(width, height)
+        return size
+
+    def paint(self, painter, option, index):
+        painter.save()
+        painter.setRenderHint(QPainter.RenderHint.Antialiasing)
+        if index.data(HIGHLIGHTED_ROLE):
+            state = "selected"
+        elif option.state & QStyle.StateFlag.State_MouseOver:
+            state = "hover"
+        else:
+            state = "normal"
+        top, bottom, border = self.COLORS[state]
+
+        card_rect = QRectF(option.rect).adjusted(self.MARGIN + 1, self.MARGIN + 1, -self.MARGIN - 1, -self.MARGIN - 1)
+        gradient = QLinearGradient(card_rect.topLeft(), card_rect.bottomLeft())
+        gradient.setColorAt(0, QColor(top))
+        gradient.setColorAt(1, QColor(bottom))
+        painter.setBrush(QBrush(gradient))
+        painter.setPen(QPen(QColor(border), 2))
+        painter.drawRoundedRect(card_rect, self.RADIUS, self.RADIUS)
+
+        text_width = self._text_width(option.rect.width())
+        x = option.rect.left() + self.MARGIN + self.PADDING
+        y = option.rect.top() + self.MARGIN + self.PADDING
+        for font, color, flags, text in self._text_blocks(index):
+            height = QFontMetrics(font).boundingRect(QRect(0, 0, text_width, 0), flags, text).height()
+            painter.setFont(font)
+            painter.setPen(QColor(color))
+            painter.drawText(QRect(x, y, text_width, height), flags, text)
+            y += height + self.SPACING
+        painter.restore()
+
+
+class NotebookListView(QListView):
+    """Danh sách notebook chờ: click/ctrl-click để chọn, kéo các notebook đã chọn thả vào section."""
+
+    notebook_clicked = pyqtSignal(str)
+
+    MAX_CARDS_IN_DRAG = 4
+
+    def __init__(self, parent_runner, parent=None):
+        super().__init__(parent)
+        self.parent_runner = parent_runner
+        self.press_pos: QPoint | None = None
+        self.press_path = None
+        self.setItemDelegate(NotebookCardDelegate(self))
+        self.setSelectionMode(QListView.SelectionMode.NoSelection)
+        self.setEditTriggers(QListView.EditTrigger.NoEditTriggers)
+        self.setVerticalScrollMode(QListView.ScrollMode.ScrollPerPixel)
+        self.setHorizontalScrollBarPolicy(Qt.ScrollBarPolicy.ScrollBarAlwaysOff)
+        self.setResizeMode(QListView.ResizeMode.Adjust)
+        # Bố trí theo từng lô để danh sách hàng nghìn notebook không chặn giao diện
+        self.setLayoutMode(QListView.LayoutMode.Batched)
+        self.setBatchSize(200)
+        self.setSpacing(1)
+        self.setMouseTracking(True)
+        self.viewport().setAttribute(Qt.WidgetAttribute.WA_Hover)
+        self.viewport().setCursor(Qt.CursorShape.PointingHandCursor)
+
+    @property
+    def notebook_model(self):
+        return self.parent_runner.notebook_model
+
+    def mousePressEvent(self, e: QMouseEvent | None) -> None:
+        if not e:
+            return
+        index = self.indexAt(e.pos())
+        self.press_pos = e.pos()
+        self.press_path = index.data(PATH_ROLE) if index.isValid() else None
+        if self.press_path:
+            self.notebook_clicked.emit(self.press_path)
+
+    def mouseMoveEvent(self, e: QMouseEvent | None) -> None:
+        if not e:
+            return
+        if e.buttons() != Qt.MouseButton.LeftButton or not self.press_path or self.press_pos is None:
+            super().mouseMoveEvent(e)
+            return
+        if (e.pos() - self.press_pos).manhattanLength() < QApplication.startDragDistance():
+            return
+        if not self.notebook_model.is_highlighted(self.press_path):
+            return
+        selected_paths = self.parent_runner.highlighted_available
+        if not selected_paths:
+            return
+        drag = QDrag(self)
+        mime_data = QMimeData()
+        mime_data.setText("\n".join(selected_paths))
+        drag.setMimeData(mime_data)
+        drag.setPixmap(self.create_stacked_pixmap(selected_paths))
+        press_rect = self.visualRect(self.indexAt(self.press_pos))
+        drag.setHotSpot(self.press_pos - press_rect.topLeft())
+        self.press_pos, self.press_path = None, None
+        drag.exec(Qt.DropAction.MoveAction)
+
+    def mouseReleaseEvent(self, e: QMouseEvent | None) -> None:
+        if not e or self.press_pos is None or not self.press_path:
+            return
+        moved_distance = (e.pos() - self.press_pos).manhattanLength()
+        path, self.press_pos, self.press_path = self.press_path, None, None
+        if moved_distance >= QApplication.startDragDistance():
+            return
+        highlighted_available = self.parent_runner.highlighted_available
+        is_ctrl_pressed = bool(QApplication.keyboardModifiers() & Qt.KeyboardModifier.ControlModifier)
+        if not is_ctrl_pressed and self.notebook_model.is_highlighted(path) and len(highlighted_available) > 1:
+            for p in list(highlighted_available):
+                if p != path:
+                    self.notebook_model.set_highlighted(p, False)
+            highlighted_available.clear()
+            highlighted_available.append(path)
+
+    def _proxy_index(self, path):
+        row = self.notebook_model.row_of(path)
+        if row < 0:
+            return QModelIndex()
+        return self.model().mapFromSource(self.notebook_model.index(row))
+
+    def create_card_pixmap(self, index):
+        rect = self.visualRect(index)
+        pixmap = QPixmap(rect.size())
+        pixmap.fill(Qt.GlobalColor.transparent)
+        option = QStyleOptionViewItem()
+        self.initViewItemOption(option)
+        option.rect = QRect(QPoint(0, 0), rect.size())
+        painter = QPainter(pixmap)
+        self.itemDelegate().paint(painter, option, index)
+        painter.end()
+        return pixmap
+
+    def create_stacked_pixmap(self, selected_paths):
+        indexes = [index for index in map(self._proxy_index, selected_paths) if index.isValid()]
+        if not indexes:
+            return QPixmap()
+        if len(indexes) == 1:
+            return self.create_card_pixmap(indexes[0])
+        offset_x, offset_y = 8, 8
+        num_cards_in_stack = min(len(indexes), self.MAX_CARDS_IN_DRAG)
+        card_pixmaps = [self.create_card_pixmap(index) for index in indexes[:num_cards_in_stack]]
+        card_width = max(p.width() for p in card_pixmaps)
+        card_height = max(p.height() for p in card_pixmaps)
+        total_width = card_width + (offset_x * (num_cards_in_stack - 1))
+        total_height = card_height + (offset_y * (num_cards_in_stack - 1))
+        final_pixmap = QPixmap(total_width, total_height)
+        final_pixmap.fill(Qt.GlobalColor.transparent)
+        painter = QPainter(final_pixmap)
+        for i in reversed(range(num_cards_in_stack)):
+            painter.drawPixmap(offset_x * i, offset_y * i, card_pixmaps[i])
+        if len(indexes) > self.MAX_CARDS_IN_DRAG:
+            badge_size = 22
+            badge_rect = QRect(total_width - badge_size - 2, 2, badge_size, badge_size)
+            painter.setRenderHint(QPainter.RenderHint.Antialiasing)
+            painter.setBrush(QBrush(QColor("#0d6efd")))
+            painter.setPen(Qt.PenStyle.NoPen)
+            painter.drawEllipse(badge_rect)
+            painter.setPen(QPen(Qt.GlobalColor.white))
+            painter.setFont(QFont("Segoe UI", 8, QFont.Weight.Bold))
+            painter.drawText(badge_rect, Qt.AlignmentFlag.AlignCenter, f"+{len(indexes) - self.MAX_CARDS_IN_DRAG + 1}")
+        painter.end()
+        return final_pixmap
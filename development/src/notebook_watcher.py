@@ -0,0 +1,135 @@
+# development/src/notebook_watcher.py
+"""
+Module theo dõi thư mục notebook và thư mục module/import.
+
+Dùng QFileSystemWatcher (inotify trên Linux, ReadDirectoryChangesW trên Windows)
+nên khi không có gì thay đổi thì không tốn CPU. Nếu hệ điều hành không theo dõi
+được thư mục (vd: ổ mạng), watcher chuyển sang quét định kỳ. Các sự kiện liên tiếp
+được gom lại (debounce) rồi quét lại thư mục một lần, so với ảnh chụp trước để biết
+notebook nào được thêm/xóa/sửa và module nào thay đổi.
+"""
+
+import os
+
+from PyQt6.QtCore import QFileSystemWatcher, QObject, QTimer, pyqtSignal
+
+import config
+from notebook_index import shared_index
+
+
+NOTEBOOK_EXTENSIONS = (".ipynb",)
+MODULE_EXTENSIONS = (".py",)
+
+
+def scan_directory(directory, extensions):
+    """Ảnh chụp {đường dẫn: (mtime_ns, kích thước)} của các file trong thư mục (không đệ quy)."""
+    snapshot = {}
+    try:
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if entry.name.endswith(extensions) and entry.is_file():
+                    stat = entry.stat()
+                    snapshot[entry.path] = (stat.st_mtime_ns, stat.st_size)
+    except OSError:
+        pass
+    return snapshot
+
+
+def diff_snapshots(old, new):
+    """Trả về (thêm, xóa, sửa), mỗi phần là danh sách đường dẫn đã sắp xếp."""
+    added = sorted(new.keys() - old.keys())
+    removed = sorted(old.keys() - new.keys())
+    modified = sorted(path for path in new.keys() & old.keys() if new[path] != old[path])
+    return added, removed, modified
+
+
+class NotebookWatcher(QObject):
+    # Danh sách notebook được thêm, bị xóa, bị sửa
+    notebooks_changed = pyqtSignal(list, list, list)
+    # Tên các module (.py) vừa thay đổi trong thư mục module/import
+    modules_changed = pyqtSignal(list)
+
+    def __init__(self, notebooks_dir, module_dirs, parent=None):
+        super().__init__(parent)
+        self.notebooks_dir = notebooks_dir
+        self.module_dirs = [d for d in module_dirs if d]
+        self._notebooks = {}
+        self._modules = {}
+
+        self._watcher = QFileSystemWatcher(self)
+        self._watcher.directoryChanged.connect(self._on_fs_event)
+        self._watcher.fileChanged.connect(self._on_fs_event)
+
+        self._debounce_timer = QTimer(self)
+        self._debounce_timer.setSingleShot(True)
+        self._debounce_timer.setInterval(config.WATCH_DEBOUNCE_MS)
+        self._debounce_timer.timeout.connect(self.rescan)
+
+        self._poll_timer = QTimer(self)
+        self._poll_timer.setInterval(int(config.WATCH_POLL_INTERVAL * 1000))
+        self._poll_timer.timeout.connect(self.rescan)
+
+    @property
+    def is_polling(self):
+        return self._poll_timer.isActive()
+
+    def start(self):
+        """Chụp trạng thái ban đầu và bắt đầu theo dõi."""
+        self._notebooks = scan_directory(self.notebooks_dir, NOTEBOOK_EXTENSIONS)
+        self._modules = self._scan_modules()
+        directories = [d for d in [self.notebooks_dir] + self.module_dirs if os.path.isdir(d)]
+        failed = self._watcher.addPaths(directories) if directories else []
+        if failed:
+            # Không theo dõi được bằng cơ chế của hệ điều hành, quét định kỳ thay thế
+            self._poll_timer.start()
+        self._watch_files()
+
+    def stop(self):
+        self._debounce_timer.stop()
+        self._poll_timer.stop()
+        watched = self._watcher.files() + self._watcher.directories()
+        if watched:
+            self._watcher.removePaths(watched)
+
+    def _scan_modules(self):
+        snapshot = {}
+        for directory in self.module_dirs:
+            snapshot.update(scan_directory(directory, MODULE_EXTENSIONS))
+        return snapshot
+
+    def _watch_files(self):
+        # Thư mục chỉ báo khi có file được thêm/xóa/đổi tên, sửa tại chỗ cần theo dõi từng file.
+        # File bị thay bằng file mới (lưu kiểu ghi file tạm rồi đổi tên) sẽ rơi khỏi danh sách, thêm lại ở đây.
+        if self.is_polling:
+            return
+        missing = sorted((self._notebooks.keys() | self._modules.keys()) - set(self._watcher.files()))
+        if missing:
+            self._watcher.addPaths(missing)
+
+    def _on_fs_event(self, path):
+        self._debounce_timer.start()
+
+    def rescan(self):
+        notebooks = scan_directory(self.notebooks_dir, NOTEBOOK_EXTENSIONS)
+        modules = self._scan_modules()
+        added, removed, modified = diff_snapshots(self._notebooks, notebooks)
+        module_changes = diff_snapshots(self._modules, modules)
+        self._notebooks, self._modules = notebooks, modules
+        self._watch_files()
+
+        if added or removed or modified:
+            self.notebooks_changed.emit(added, removed, modified)
+        changed_modules = sorted({os.path.splitext(os.path.basename(p))[0] for paths in module_changes for p in paths})
+        if changed_modules:
+            self.modules_changed.emit(changed_modules)
+
+    def notebooks_importing(self, paths, module_names):
+        """Các notebook trong `paths` có import ít nhất một module trong `module_names`."""
+        module_names = set(module_names)
+        index = shared_index()
+        affected = []
+        for path in paths:
+            entry = index.get(path)
+            if entry and module_names.intersection(entry["imports"]):
+                affected.append(path)
+        return affected
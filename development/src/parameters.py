@@ -0,0 +1,182 @@
+# development/src/parameters.py
+"""
+Module truyền tham số vào notebook theo kiểu papermill và mở rộng lưới tham số.
+
+Notebook khai báo giá trị mặc định trong cell gắn tag `parameters`. Trước khi chạy,
+một cell mới gắn tag `injected-parameters` được chèn ngay sau cell đó, gán lại các
+tham số được truyền vào nên ghi đè giá trị mặc định. Chế độ fan-out chạy cùng một
+notebook trên mọi tổ hợp của lưới tham số (vd: theo tháng x phòng ban), mỗi lần chạy
+lưu notebook kết quả riêng. Không phụ thuộc Qt.
+"""
+
+import ast
+import copy
+import itertools
+import json
+import os
+import re
+
+import nbformat
+
+import config
+from notebook_index import PARAMETERS_TAG, declared_parameters
+
+
+INJECTED_PARAMETERS_TAG = "injected-parameters"
+
+_SLUG_RE = re.compile(r"[^\w.=-]+")
+
+
+def parse_parameters(text):
+    """
+    Đọc tham số nhập trên giao diện: object JSON (`{"thang": 1}`) hoặc các phép gán
+    `ten = gia_tri` cách nhau bởi dấu `;` hoặc xuống dòng, giá trị là literal Python.
+    """
+    text = (text or "").strip()
+    if not text:
+        return {}
+    if text.startswith("{"):
+        try:
+            parameters = json.loads(text)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"JSON không hợp lệ: {e.msg}") from None
+        if not isinstance(parameters, dict):
+            raise ValueError("Tham số JSON phải là một object.")
+        return parameters
+
+    parameters = {}
+    for part in re.split(r"[;\n]", text):
+        if not part.strip():
+            continue
+        name, sep, value = part.partition("=")
+        name = name.strip()
+        if not sep or not name.isidentifier():
+            raise ValueError(f"Phép gán không hợp lệ: '{part.strip()}'")
+        try:
+            parameters[name] = ast.literal_eval(value.strip())
+        except (ValueError, SyntaxError):
+            raise ValueError(f"Giá trị của '{name}' không phải literal Python: {value.strip()}") from None
+    return parameters
+
+
+def split_grid(parameters):
+    """Tách tham số nhập trên giao diện thành (tham số cố định, lưới): giá trị dạng list là một trục của lưới."""
+    fixed = {name: value for name, value in parameters.items() if not isinstance(value, list)}
+    grid = {name: value for name, value in parameters.items() if isinstance(value, list)}
+    return fixed, grid
+
+
+def expand_grid(grid):
+    """
+    Danh sách các bộ tham số của lưới. `grid` là dict {tên: danh sách giá trị} (tích
+    Descartes theo thứ tự khóa, giá trị đơn được coi là danh sách một phần tử) hoặc
+    danh sách các dict tham số liệt kê sẵn.
+    """
+    if isinstance(grid, list):
+        if not all(isinstance(item, dict) for item in grid):
+            raise ValueError("Lưới tham số dạng danh sách phải gồm các dict.")
+        return [dict(item) for item in grid]
+    if not isinstance(grid, dict) or not grid:
+        raise ValueError("Lưới tham số trống.")
+    names = list(grid)
+    axes = [value if isinstance(value, list) else [value] for value in grid.values()]
+    if any(not axis for axis in axes):
+        raise ValueError("Mỗi trục của lưới tham số phải có ít nhất một giá trị.")
+    return [dict(zip(names, values)) for values in itertools.product(*axes)]
+
+
+def format_parameters(parameters):
+    """Nhãn ngắn của một bộ tham số, vd: `thang=1, phong='HR'`."""
+    return ", ".join(f"{name}={value!r}" for name, value in parameters.items())
+
+
+def build_parameters_code(parameters):
+    lines = ["# Tham số được truyền vào bởi NBRunner"]
+    lines.extend(f"{name} = {value!r}" for name, value in parameters.items())
+    return "\n".join(lines)
+
+
+def inject_parameters(nb, parameters):
+    """
+    Chèn cell gán tham số ngay sau cell gắn tag `parameters` (hoặc đầu notebook nếu không
+    có), thay thế cell tham số đã chèn từ trước. Trả về (notebook, tên tham số không được
+    notebook khai báo, có cell `parameters` hay không).
+    """
+    if not parameters:
+        return nb, [], True
+    cells = [cell for cell in nb.cells if INJECTED_PARAMETERS_TAG not in cell.get("metadata", {}).get("tags", [])]
+    position, declared = 0, {}
+    for index, cell in enumerate(cells):
+        if cell.cell_type == "code" and PARAMETERS_TAG in cell.get("metadata", {}).get("tags", []):
+            position, declared = index + 1, declared_parameters(cell.source)
+            break
+    has_parameters_cell = position > 0
+
+    injected = nbformat.v4.new_code_cell(build_parameters_code(parameters))
+    injected.metadata["tags"] = [INJECTED_PARAMETERS_TAG]
+    cells.insert(position, injected)
+    nb.cells = cells
+    unknown = [name for name in parameters if has_parameters_cell and name not in declared]
+    return nb, unknown, has_parameters_cell
+
+
+def split_at_parameters(nb):
+    """
+    Tách notebook tại cell gắn tag `parameters`: (phần khởi tạo, phần còn lại tính từ cell
+    tham số). Phần khởi tạo không thấy được tham số nên chỉ cần chạy một lần cho mọi bộ
+    tham số. Trả về None nếu không có cell tham số hoặc không có cell code nào phía trước.
+    """
+    for index, cell in enumerate(nb.cells):
+        if cell.cell_type == "code" and PARAMETERS_TAG in cell.get("metadata", {}).get("tags", []):
+            break
+    else:
+        return None
+    if not any(cell.cell_type == "code" for cell in nb.cells[:index]):
+        return None
+    setup_nb = nbformat.v4.new_notebook(metadata=nb.metadata, cells=nb.cells[:index])
+    tail_nb = nbformat.v4.new_notebook(metadata=nb.metadata, cells=nb.cells[index:])
+    return setup_nb, tail_nb
+
+
+def run_output_dir(notebook_path, started_at):
+    """Thư mục chứa kết quả của một lần chạy fan-out."""
+    name = os.path.splitext(os.path.basename(notebook_path))[0]
+    return os.path.join(config.FANOUT_OUTPUT_DIR, name, started_at)
+
+
+def run_output_name(index, parameters):
+    label = "_".join(f"{name}={value}" for name, value in parameters.items())
+    slug = _SLUG_RE.sub("-", label).strip("-")[:80]
+    return f"{index:03d}_{slug}.ipynb" if slug else f"{index:03d}.ipynb"
+
+
+def save_executed_notebook(source_nb, executed_nb, path):
+    """
+    Ghi notebook kết quả: mã gốc (trước khi gắn cache/profile cell) kèm output của lần chạy.
+    Hai notebook phải có cùng danh sách cell, không tính cell nội bộ do NBRunner chèn vào
+    notebook chạy (vd: cell khởi tạo cache).
+    """
+    result = copy.deepcopy(source_nb)
+    executed_cells = [
+        cell for cell in executed_nb.cells if not cell.get("metadata", {}).get(config.NOTEBOOK_METADATA_KEY, {}).get("internal")
+    ]
+    for cell, executed in zip(result.cells, executed_cells):
+        if cell.cell_type != "code":
+            continue
+        cell.outputs = executed.get("outputs", [])
+        cell.execution_count = executed.get("execution_count")
+        if "execution" in executed.get("metadata", {}):
+            cell.metadata["execution"] = executed.metadata["execution"]
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        nbformat.write(result, f)
+    os.replace(tmp_path, path)
+
+
+def write_summary(path, summary):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(summary, f, ensure_ascii=False, indent=2, default=repr)
+    os.replace(tmp_path, path)
@@ -0,0 +1,44 @@
+# development/src/process_stopper.py
+"""
+Module dừng các tiến trình chạy notebook mà không chặn luồng giao diện.
+
+Mỗi yêu cầu dừng được xử lý trong một luồng nền riêng (báo dừng -> chờ -> terminate
+-> kill), kết quả được báo về luồng giao diện qua tín hiệu Qt. Dừng N notebook cùng
+lúc chỉ mất khoảng thời gian của notebook chậm nhất thay vì tổng thời gian.
+"""
+
+import threading
+
+from PyQt6.QtCore import QObject, Qt, pyqtSignal
+
+from engine import log_message, stop_notebook_process
+
+
+class ProcessStopper(QObject):
+    process_stopped = pyqtSignal(object, bool)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.process_stopped.connect(self._on_process_stopped, Qt.ConnectionType.QueuedConnection)
+
+    def stop(self, process, stop_event, on_stopped):
+        """Dừng tiến trình trong nền, on_stopped(forced) được gọi trên luồng giao diện khi xong."""
+        thread = threading.Thread(
+            target=self._stop_in_background, args=(process, stop_event, on_stopped), name="ProcessStopper", daemon=True
+        )
+        thread.start()
+
+    def _stop_in_background(self, process, stop_event, on_stopped):
+        try:
+            forced = stop_notebook_process(process, stop_event)
+        except Exception as e:
+            log_message(f"Lỗi khi dừng tiến trình: {e}", level="ERROR")
+            forced = True
+        self.process_stopped.emit(on_stopped, forced)
+
+    def _on_process_stopped(self, on_stopped, forced):
+        try:
+            on_stopped(forced)
+        except RuntimeError:
+            # Widget nhận kết quả đã bị xóa (vd: section đã đóng)
+            pass
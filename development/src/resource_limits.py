@@ -0,0 +1,227 @@
+# development/src/resource_limits.py
+"""
+Module giới hạn tài nguyên (RAM, CPU, thời gian) cho tiến trình chạy notebook.
+
+Giới hạn được áp dụng ngay khi tiến trình chạy notebook khởi động, trước khi tạo
+kernel, nên kernel (tiến trình con) kế thừa:
+- RAM: cgroup v2 (`memory.max`) khi RESOURCE_CGROUP_PARENT trỏ tới một thư mục cgroup
+  được ủy quyền, RLIMIT_AS khi bật LIMIT_ADDRESS_SPACE. Ngoài ra RSS của kernel luôn
+  được giám sát (cần psutil) và kernel vượt ngưỡng bị dừng, dùng được cả trên Windows.
+- CPU: mức ưu tiên (nice) và CPU affinity.
+- Thời gian: thời gian tối đa của mỗi lần lặp, áp dụng như timeout của cell đang chạy;
+  timeout mặc định của từng cell và hệ số timeout thích ứng (xem cell_timeouts).
+
+Lần lặp vượt giới hạn được báo bằng trạng thái riêng ("limit") thay vì lỗi của
+notebook. Không phụ thuộc Qt.
+"""
+
+import glob
+import os
+import sys
+
+try:
+    import resource
+except ImportError:
+    # Không có trên Windows, chỉ dùng giám sát RSS
+    resource = None
+
+try:
+    import psutil
+except ImportError:
+    # psutil là tùy chọn, thiếu thì không giám sát được RSS và không đặt được affinity trên Windows
+    psutil = None
+
+import config
+
+
+LIMIT_KIND_LABELS = {
+    "memory": "RAM",
+    "timeout": "thời gian",
+}
+
+
+def parse_cpu_list(value):
+    """CPU affinity từ danh sách số hoặc chuỗi dạng "0,1,4-7". Trả về None nếu không giới hạn."""
+    if value is None or value == "" or value == []:
+        return None
+    if isinstance(value, str):
+        cpus = []
+        for part in value.replace(" ", "").split(","):
+            if not part:
+                continue
+            start, sep, end = part.partition("-")
+            try:
+                cpus.extend(range(int(start), int(end) + 1) if sep else [int(start)])
+            except ValueError:
+                raise ValueError(f"Danh sách CPU không hợp lệ: '{value}'") from None
+        value = cpus
+    cpus = sorted({int(cpu) for cpu in value})
+    if any(cpu < 0 for cpu in cpus):
+        raise ValueError(f"Danh sách CPU không hợp lệ: '{value}'")
+    return cpus or None
+
+
+def format_cpu_list(cpus):
+    return ",".join(str(cpu) for cpu in cpus or [])
+
+
+class ResourceLimits:
+    """Giới hạn tài nguyên của một lần chạy notebook, giá trị 0/None là không giới hạn."""
+
+    FIELDS = ("memory_mb", "timeout", "nice", "cpu_affinity", "cell_timeout", "adaptive_timeout")
+
+    def __init__(self, memory_mb=0, timeout=0, nice=0, cpu_affinity=None, cell_timeout=0, adaptive_timeout=0):
+        self.memory_mb = int(memory_mb or 0)
+        self.timeout = float(timeout or 0)
+        self.nice = int(nice or 0)
+        self.cpu_affinity = parse_cpu_list(cpu_affinity)
+        # Timeout mặc định của mỗi cell (0 = CELL_TIMEOUT) và hệ số timeout thích ứng (0 = tắt)
+        self.cell_timeout = float(cell_timeout or 0)
+        self.adaptive_timeout = float(adaptive_timeout or 0)
+        if min(self.memory_mb, self.timeout, self.cell_timeout, self.adaptive_timeout) < 0:
+            raise ValueError("Giới hạn RAM và thời gian không được âm.")
+
+    @classmethod
+    def from_dict(cls, data):
+        data = data or {}
+        unknown = set(data) - set(cls.FIELDS)
+        if unknown:
+            raise ValueError(f"Giới hạn không hợp lệ: {', '.join(sorted(unknown))}")
+        return cls(**data)
+
+    @classmethod
+    def defaults(cls):
+        """Giới hạn mặc định của ứng dụng, được section và card ghi đè."""
+        return cls(
+            config.NOTEBOOK_MAX_MEMORY_MB,
+            config.NOTEBOOK_MAX_SECONDS,
+            config.NOTEBOOK_NICE,
+            config.NOTEBOOK_CPU_AFFINITY,
+            adaptive_timeout=config.ADAPTIVE_TIMEOUT_FACTOR,
+        )
+
+    def to_dict(self):
+        return {field: getattr(self, field) for field in self.FIELDS}
+
+    def merged(self, override):
+        """Giới hạn của `override` (vd: của card) được ưu tiên, trường bỏ trống lấy từ giới hạn này."""
+        return ResourceLimits(
+            override.memory_mb or self.memory_mb,
+            override.timeout or self.timeout,
+            override.nice or self.nice,
+            override.cpu_affinity or self.cpu_affinity,
+            override.cell_timeout or self.cell_timeout,
+            override.adaptive_timeout or self.adaptive_timeout,
+        )
+
+    def is_empty(self):
+        return not any(getattr(self, field) for field in self.FIELDS)
+
+    def describe(self):
+        parts = []
+        if self.memory_mb:
+            parts.append(f"RAM {self.memory_mb}MB")
+        if self.timeout:
+            parts.append(f"{self.timeout:g}s/lần lặp")
+        if self.nice:
+            parts.append(f"nice {self.nice}")
+        if self.cpu_affinity:
+            parts.append(f"CPU {format_cpu_list(self.cpu_affinity)}")
+        if self.cell_timeout:
+            parts.append(f"{self.cell_timeout:g}s/cell")
+        if self.adaptive_timeout:
+            parts.append(f"timeout thích ứng p99 x {self.adaptive_timeout:g}")
+        return ", ".join(parts) if parts else "Không giới hạn"
+
+
+def _set_nice(nice):
+    if hasattr(os, "nice"):
+        os.nice(nice)
+    elif psutil is not None:
+        # Windows không có nice, dùng mức ưu tiên thấp hơn bình thường
+        psutil.Process().nice(psutil.BELOW_NORMAL_PRIORITY_CLASS if nice > 0 else psutil.NORMAL_PRIORITY_CLASS)
+    else:
+        raise OSError("cần psutil để đổi mức ưu tiên")
+
+
+def _set_affinity(cpus):
+    if hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, cpus)
+    elif psutil is not None and hasattr(psutil.Process, "cpu_affinity"):
+        psutil.Process().cpu_affinity(cpus)
+    else:
+        raise OSError("hệ điều hành không hỗ trợ CPU affinity")
+
+
+def _join_cgroup(memory_mb):
+    """Tạo cgroup v2 con với memory.max rồi chuyển tiến trình hiện tại vào. Trả về đường dẫn cgroup."""
+    parent = config.RESOURCE_CGROUP_PARENT
+    if not parent or not sys.platform.startswith("linux") or not os.path.isdir(parent):
+        return None
+    # Dọn cgroup của các tiến trình đã kết thúc (rmdir chỉ thành công khi cgroup trống)
+    for stale in glob.glob(os.path.join(parent, "nbrunner-*")):
+        try:
+            os.rmdir(stale)
+        except OSError:
+            pass
+    path = os.path.join(parent, f"nbrunner-{os.getpid()}")
+    os.makedirs(path, exist_ok=True)
+    with open(os.path.join(path, "memory.max"), "w") as f:
+        f.write(str(memory_mb * 1024 * 1024))
+    try:
+        with open(os.path.join(path, "memory.swap.max"), "w") as f:
+            f.write("0")
+    except OSError:
+        pass
+    with open(os.path.join(path, "cgroup.procs"), "w") as f:
+        f.write(str(os.getpid()))
+    return path
+
+
+def cgroup_oom_kills(cgroup_path):
+    """Số lần tiến trình trong cgroup bị kill vì hết RAM, None nếu không đọc được."""
+    if not cgroup_path:
+        return None
+    try:
+        with open(os.path.join(cgroup_path, "memory.events"), "r") as f:
+            for line in f:
+                key, _, value = line.partition(" ")
+                if key == "oom_kill":
+                    return int(value)
+    except (OSError, ValueError):
+        pass
+    return None
+
+
+def apply_process_limits(limits):
+    """
+    Áp dụng giới hạn cho tiến trình hiện tại (kernel khởi động sau đó kế thừa).
+    Trả về (đường dẫn cgroup hoặc None, danh sách thông báo để ghi log).
+    """
+    messages, cgroup_path = [], None
+    if not limits.is_empty():
+        messages.append(f"Giới hạn tài nguyên: {limits.describe()}.")
+    if limits.nice:
+        try:
+            _set_nice(limits.nice)
+        except OSError as e:
+            messages.append(f"Không đặt được mức ưu tiên: {e}")
+    if limits.cpu_affinity:
+        try:
+            _set_affinity(limits.cpu_affinity)
+        except (OSError, ValueError) as e:
+            messages.append(f"Không đặt được CPU affinity: {e}")
+    if limits.memory_mb:
+        try:
+            cgroup_path = _join_cgroup(limits.memory_mb)
+        except OSError as e:
+            messages.append(f"Không dùng được cgroup: {e}")
+        if config.LIMIT_ADDRESS_SPACE and resource is not None:
+            try:
+                limit_bytes = limits.memory_mb * 1024 * 1024
+                resource.setrlimit(resource.RLIMIT_AS, (limit_bytes, limit_bytes))
+            except (OSError, ValueError) as e:
+                messages.append(f"Không đặt được RLIMIT_AS: {e}")
+        if cgroup_path is None and psutil is None:
+            messages.append("Không giới hạn được RAM: cần psutil hoặc cgroup v2.")
+    return cgroup_path, messages
@@ -0,0 +1,117 @@
+# development/src/run_cache.py
+"""
+Module cache kết quả chạy notebook theo nội dung đầu vào (chạy tăng dần).
+
+Notebook bật cache bằng cách khai báo các file đầu vào trong metadata:
+
+    "metadata": {"nbrunner": {"inputs": ["../data/sales.xlsx", "../data/*.csv"]}}
+
+Đường dẫn tương đối được tính từ thư mục chứa notebook (giống thư mục làm việc
+của kernel). Khóa cache gồm mã nguồn các cell, các file .py/.pyc trong thư mục
+module/import và các file đầu vào đã khai báo. Nếu khóa không đổi so với lần chạy
+thành công gần nhất, notebook không cần chạy lại và output cũ được phát lại.
+Hash của từng file được tái sử dụng khi mtime và kích thước không đổi.
+Không phụ thuộc Qt.
+"""
+
+import glob
+import hashlib
+import json
+import os
+import time
+
+import config
+
+
+def declared_inputs(nb):
+    """Danh sách mẫu file đầu vào khai báo trong metadata, None nếu notebook không bật cache."""
+    inputs = nb.metadata.get(config.NOTEBOOK_METADATA_KEY, {}).get("inputs")
+    if inputs is None:
+        return None
+    return [inputs] if isinstance(inputs, str) else list(inputs)
+
+
+def collect_input_files(notebook_path, patterns, watch_dirs):
+    """Danh sách file đầu vào đã khai báo cùng các file .py/.pyc trong thư mục module/import."""
+    files = []
+    notebook_dir = os.path.dirname(notebook_path)
+    for pattern in patterns:
+        full_pattern = pattern if os.path.isabs(pattern) else os.path.join(notebook_dir, pattern)
+        matches = sorted(p for p in glob.glob(full_pattern, recursive=True) if os.path.isfile(p))
+        # Mẫu không khớp file nào vẫn được đưa vào khóa để file xuất hiện sau này làm mất hiệu lực cache
+        files.extend(matches or [f"missing:{full_pattern}"])
+    for directory in watch_dirs:
+        if not directory or not os.path.isdir(directory):
+            continue
+        for name in sorted(os.listdir(directory)):
+            if name.endswith((".py", ".pyc")):
+                files.append(os.path.join(directory, name))
+    return files
+
+
+def _hash_file(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class RunCache:
+    """Mỗi notebook có một file cache JSON chứa khóa, bảng hash file và output của lần chạy thành công gần nhất."""
+
+    def __init__(self, cache_dir=None):
+        self.cache_dir = cache_dir or os.path.join(config.CACHE_DIR, "runs")
+
+    def _entry_path(self, notebook_path):
+        name = hashlib.sha1(os.path.abspath(notebook_path).encode("utf-8")).hexdigest()
+        return os.path.join(self.cache_dir, f"{name}.json")
+
+    def load(self, notebook_path):
+        try:
+            with open(self._entry_path(notebook_path), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def fingerprint(self, notebook_path, nb, watch_dirs, previous=None):
+        """
+        Tính (khóa cache, bảng hash file) cho notebook. Trả về None nếu notebook
+        không khai báo `inputs` trong metadata.
+        """
+        patterns = declared_inputs(nb)
+        if patterns is None:
+            return None
+
+        previous_files = (previous or {}).get("files", {})
+        files = {}
+        for path in collect_input_files(notebook_path, patterns, watch_dirs):
+            if path.startswith("missing:"):
+                files[path] = None
+                continue
+            stat = os.stat(path)
+            cached = previous_files.get(path)
+            if cached and cached[0] == stat.st_mtime_ns and cached[1] == stat.st_size:
+                files[path] = cached
+            else:
+                files[path] = [stat.st_mtime_ns, stat.st_size, _hash_file(path)]
+
+        digest = hashlib.sha256()
+        digest.update(nb.metadata.get("kernelspec", {}).get("name", "").encode("utf-8"))
+        for cell in nb.cells:
+            if cell.cell_type == "code":
+                digest.update(b"\0cell\0" + cell.source.encode("utf-8"))
+        for path in sorted(files):
+            file_hash = files[path][2] if files[path] else ""
+            digest.update(f"\0{path}\0{file_hash}".encode("utf-8"))
+        return digest.hexdigest(), files
+
+    def store(self, notebook_path, key, files, output):
+        entry = {"key": key, "files": files, "output": output, "finished_at": time.time()}
+        os.makedirs(self.cache_dir, exist_ok=True)
+        entry_path = self._entry_path(notebook_path)
+        # Ghi ra file tạm rồi đổi tên để tiến trình khác không bao giờ đọc phải file ghi dở
+        tmp_path = f"{entry_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(entry, f, ensure_ascii=False)
+        os.replace(tmp_path, entry_path)
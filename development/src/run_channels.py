@@ -0,0 +1,138 @@
+# development/src/run_channels.py
+"""
+Module kênh IPC riêng cho từng lần chạy notebook.
+
+Mỗi tiến trình chạy notebook nhận đầu ghi của một Pipe riêng (`ChannelWriter`), phía
+cha giữ đầu đọc và chờ đồng thời trên tất cả các kênh bằng
+`multiprocessing.connection.wait`. Khi một tiến trình bị buộc dừng (terminate/kill)
+giữa lúc đang ghi, chỉ kênh của chính nó bị hỏng (EOF hoặc message cắt dở) và bị đóng,
+log của các notebook khác không bị ảnh hưởng, khác với một queue dùng chung có khóa ghi
+chung. Dùng chung cho giao diện (LogDispatcher) và chế độ headless. Không phụ thuộc Qt.
+"""
+
+import itertools
+import threading
+from multiprocessing import Pipe
+from multiprocessing.connection import wait
+
+
+class ChannelWriter:
+    """Đầu ghi của kênh, được truyền vào tiến trình con. An toàn khi ghi từ nhiều luồng."""
+
+    def __init__(self, connection):
+        self.connection = connection
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        return {"connection": self.connection}
+
+    def __setstate__(self, state):
+        self.connection = state["connection"]
+        self._lock = threading.Lock()
+
+    def put(self, message):
+        with self._lock:
+            try:
+                self.connection.send(message)
+            except (OSError, ValueError):
+                # Phía cha đã đóng kênh (lần chạy bị hủy đăng ký), không còn ai nhận message
+                pass
+
+    def close(self):
+        self.connection.close()
+
+
+class RunChannels:
+    """
+    Các kênh đang mở theo run_id. `wait()` chặn tới khi có message trên bất kỳ kênh nào,
+    trả về danh sách (run_id, message). Kênh bị EOF hoặc nhận message hỏng được đóng và
+    bỏ qua. `close()`/`open()` có thể gọi từ luồng khác với luồng đang chờ trong `wait()`.
+    """
+
+    def __init__(self):
+        self._readers = {}
+        self._pending_close = set()
+        self._lock = threading.Lock()
+        self._run_ids = itertools.count(1)
+        self._wakeup_reader, self._wakeup_writer = Pipe(duplex=False)
+        self._closed = False
+
+    @property
+    def open_count(self):
+        with self._lock:
+            return len(self._readers)
+
+    def open(self):
+        """Tạo kênh cho một lần chạy mới, trả về (run_id, đầu ghi truyền cho tiến trình con)."""
+        reader, writer = Pipe(duplex=False)
+        run_id = next(self._run_ids)
+        with self._lock:
+            self._readers[run_id] = reader
+        self._wake()
+        return run_id, ChannelWriter(writer)
+
+    @staticmethod
+    def release_writer(writer):
+        """Đóng bản sao đầu ghi ở tiến trình cha sau khi tiến trình con đã khởi động, để nhận được EOF khi con kết thúc."""
+        writer.close()
+
+    def close(self, run_id):
+        """Đóng kênh của một lần chạy; việc đóng thực hiện trong `wait()` để không đóng kênh đang được chờ."""
+        with self._lock:
+            if run_id in self._readers:
+                self._pending_close.add(run_id)
+        self._wake()
+
+    def _wake(self):
+        try:
+            self._wakeup_writer.send_bytes(b"\0")
+        except OSError:
+            pass
+
+    def _close_pending(self):
+        with self._lock:
+            readers = [self._readers.pop(run_id) for run_id in self._pending_close if run_id in self._readers]
+            self._pending_close.clear()
+        for reader in readers:
+            reader.close()
+
+    def wait(self, timeout=None):
+        """Chờ message tối đa `timeout` giây (None = chờ mãi). Trả về [] khi hết giờ, bị đánh thức hoặc đã shutdown."""
+        self._close_pending()
+        if self._closed:
+            return []
+        with self._lock:
+            by_reader = {reader: run_id for run_id, reader in self._readers.items()}
+        ready = wait(list(by_reader) + [self._wakeup_reader], timeout)
+        messages, broken = [], []
+        for reader in ready:
+            if reader is self._wakeup_reader:
+                while self._wakeup_reader.poll():
+                    self._wakeup_reader.recv_bytes()
+                continue
+            run_id = by_reader[reader]
+            # Đọc hết các message đã có sẵn trên kênh trước khi chờ tiếp
+            try:
+                while True:
+                    messages.append((run_id, reader.recv()))
+                    if not reader.poll():
+                        break
+            except Exception:
+                # EOF (tiến trình con đã kết thúc hoặc bị kill) hoặc message bị cắt dở
+                broken.append(run_id)
+        if broken:
+            with self._lock:
+                self._pending_close.update(broken)
+            self._close_pending()
+        return messages
+
+    def shutdown(self):
+        """Đóng mọi kênh và đánh thức luồng đang chờ."""
+        self._closed = True
+        with self._lock:
+            self._pending_close.update(self._readers)
+        self._wake()
+
+    @property
+    def is_shut_down(self):
+        return self._closed
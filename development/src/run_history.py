@@ -0,0 +1,205 @@
+# development/src/run_history.py
+"""
+Module lưu lịch sử từng lần lặp của các notebook vào SQLite (chế độ WAL, chỉ ghi thêm).
+
+Mỗi tiến trình chạy notebook tự ghi kết quả của mình (thời gian, thành công/lỗi,
+tóm tắt lỗi, RSS đỉnh và CPU time của kernel, thời gian từng cell), nên giao diện
+không phải làm gì và lịch sử vẫn còn sau khi khởi động lại. Dùng `latency_stats` để xem p50/p95 theo
+notebook, hoặc từ dòng lệnh:
+
+    python main.py --history --days 7
+
+Không phụ thuộc Qt.
+"""
+
+import argparse
+import math
+import os
+import sqlite3
+import threading
+import time
+
+import config
+from cell_timeouts import cell_history_key
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS iterations (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    notebook_path TEXT NOT NULL,
+    section TEXT,
+    execution_mode TEXT,
+    iteration INTEGER,
+    started_at REAL NOT NULL,
+    finished_at REAL NOT NULL,
+    duration REAL NOT NULL,
+    success INTEGER NOT NULL,
+    error_summary TEXT,
+    peak_rss_mb REAL,
+    cpu_time REAL
+);
+CREATE INDEX IF NOT EXISTS idx_iterations_notebook_started ON iterations (notebook_path, started_at);
+CREATE INDEX IF NOT EXISTS idx_iterations_started ON iterations (started_at);
+CREATE TABLE IF NOT EXISTS cell_timings (
+    iteration_id INTEGER NOT NULL REFERENCES iterations (id),
+    cell_id TEXT,
+    label TEXT,
+    wall REAL,
+    cpu REAL,
+    rss_delta_mb REAL
+);
+CREATE INDEX IF NOT EXISTS idx_cell_timings_iteration ON cell_timings (iteration_id);
+"""
+
+ERROR_SUMMARY_MAX_CHARS = 500
+
+
+def percentile(sorted_values, fraction):
+    """Phân vị theo phương pháp nearest-rank trên danh sách đã sắp xếp."""
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(fraction * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+class RunHistory:
+    def __init__(self, db_path=None):
+        self.db_path = db_path or config.HISTORY_DB_PATH
+        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        # Nhiều tiến trình cùng ghi: chờ khóa thay vì báo lỗi ngay. Các luồng fan-out
+        # dùng chung kết nối, việc ghi được tuần tự hóa bằng _lock.
+        self.conn = sqlite3.connect(self.db_path, timeout=config.HISTORY_BUSY_TIMEOUT, check_same_thread=False)
+        self._lock = threading.Lock()
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+
+    def record_iteration(
+        self,
+        notebook_path,
+        section,
+        execution_mode,
+        iteration,
+        started_at,
+        finished_at,
+        success,
+        error_summary=None,
+        peak_rss_mb=None,
+        cpu_time=None,
+        cells=None,
+    ):
+        if error_summary and len(error_summary) > ERROR_SUMMARY_MAX_CHARS:
+            error_summary = error_summary[-ERROR_SUMMARY_MAX_CHARS:]
+        with self._lock, self.conn:
+            cursor = self.conn.execute(
+                "INSERT INTO iterations (notebook_path, section, execution_mode, iteration, started_at, finished_at,"
+                " duration, success, error_summary, peak_rss_mb, cpu_time) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    notebook_path,
+                    section,
+                    execution_mode,
+                    iteration,
+                    started_at,
+                    finished_at,
+                    finished_at - started_at,
+                    int(bool(success)),
+                    error_summary,
+                    peak_rss_mb,
+                    cpu_time,
+                ),
+            )
+            if cells:
+                self.conn.executemany(
+                    "INSERT INTO cell_timings (iteration_id, cell_id, label, wall, cpu, rss_delta_mb)"
+                    " VALUES (?, ?, ?, ?, ?, ?)",
+                    [
+                        (cursor.lastrowid, cell["cell_id"], cell["label"], cell["wall"], cell["cpu"], cell["rss_delta_mb"])
+                        for cell in cells
+                    ],
+                )
+
+    def latency_stats(self, since=None, notebook_path=None):
+        """Thống kê theo notebook: số lần chạy, số lần lỗi, p50/p95/max thời gian chạy và RSS đỉnh lớn nhất."""
+        query = "SELECT notebook_path, duration, success, peak_rss_mb FROM iterations WHERE started_at >= ?"
+        params = [since or 0]
+        if notebook_path:
+            query += " AND notebook_path = ?"
+            params.append(notebook_path)
+        query += " ORDER BY notebook_path, started_at"
+
+        grouped = {}
+        for path, duration, success, peak_rss_mb in self.conn.execute(query, params):
+            stats = grouped.setdefault(path, {"durations": [], "failures": 0, "peak_rss_mb": None})
+            stats["durations"].append(duration)
+            if not success:
+                stats["failures"] += 1
+            if peak_rss_mb is not None:
+                stats["peak_rss_mb"] = max(stats["peak_rss_mb"] or 0, peak_rss_mb)
+
+        results = []
+        for path, stats in grouped.items():
+            durations = sorted(stats["durations"])
+            results.append(
+                {
+                    "notebook_path": path,
+                    "runs": len(durations),
+                    "failures": stats["failures"],
+                    "p50": percentile(durations, 0.50),
+                    "p95": percentile(durations, 0.95),
+                    "max": durations[-1],
+                    "peak_rss_mb": stats["peak_rss_mb"],
+                }
+            )
+        return results
+
+    def cell_duration_percentiles(self, notebook_path, fraction=0.99, last_iterations=None, min_samples=None):
+        """
+        Phân vị thời gian chạy của từng cell trong các lần chạy thành công gần nhất của notebook.
+        Trả về {khóa cell: giây}, chỉ gồm các cell có ít nhất min_samples mẫu.
+        """
+        last_iterations = last_iterations or config.ADAPTIVE_TIMEOUT_HISTORY
+        min_samples = config.ADAPTIVE_TIMEOUT_MIN_SAMPLES if min_samples is None else min_samples
+        query = (
+            "SELECT c.cell_id, c.label, c.wall FROM cell_timings c JOIN ("
+            " SELECT id FROM iterations WHERE notebook_path = ? AND success = 1 ORDER BY started_at DESC LIMIT ?"
+            ") i ON c.iteration_id = i.id WHERE c.wall IS NOT NULL"
+        )
+        grouped = {}
+        with self._lock:
+            rows = self.conn.execute(query, (notebook_path, last_iterations)).fetchall()
+        for cell_id, label, wall in rows:
+            grouped.setdefault(cell_history_key(cell_id, label), []).append(wall)
+        return {
+            key: percentile(sorted(walls), fraction) for key, walls in grouped.items() if len(walls) >= max(1, min_samples)
+        }
+
+    def close(self):
+        self.conn.close()
+
+
+def print_latency_report(days=7, db_path=None):
+    """In bảng thống kê p50/p95 theo notebook trong `days` ngày gần nhất."""
+    history = RunHistory(db_path)
+    try:
+        rows = history.latency_stats(since=time.time() - days * 86400)
+    finally:
+        history.close()
+    if not rows:
+        print(f"Không có lần chạy nào trong {days} ngày gần nhất.")
+        return
+    print(f"{'Notebook':<40} {'Lần':>6} {'Lỗi':>5} {'p50 (s)':>9} {'p95 (s)':>9} {'Max (s)':>9} {'RSS (MB)':>9}")
+    for row in sorted(rows, key=lambda r: r["p95"], reverse=True):
+        rss = f"{row['peak_rss_mb']:.0f}" if row["peak_rss_mb"] is not None else "-"
+        print(
+            f"{os.path.basename(row['notebook_path']):<40} {row['runs']:>6} {row['failures']:>5} "
+            f"{row['p50']:>9.2f} {row['p95']:>9.2f} {row['max']:>9.2f} {rss:>9}"
+        )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog=config.EXE_FILE_NAME, description=f"{config.APP_NAME} - thống kê lịch sử chạy")
+    parser.add_argument("--history", action="store_true", help="In thống kê p50/p95 theo notebook")
+    parser.add_argument("--days", type=float, default=7, help="Số ngày gần nhất cần thống kê (mặc định 7)")
+    args = parser.parse_args(argv)
+    print_latency_report(args.days)
+    return 0
@@ -0,0 +1,444 @@
+# development/src/scheduler.py
+"""
+Module lập lịch tác vụ hẹn giờ dùng chung cho giao diện và chế độ headless.
+
+Biểu thức lịch hỗ trợ:
+- `HH:MM` hoặc `HH:MM:SS`: mỗi ngày vào giờ đó (dạng cũ của bảng hẹn giờ)
+- cron 5 trường `phút giờ ngày tháng thứ` hoặc 6 trường có thêm giây ở đầu,
+  hỗ trợ `*`, danh sách `1,5`, khoảng `1-5`, bước `*/15`, tên tháng/thứ (jan, mon...)
+  và các macro @hourly, @daily, @weekly, @monthly, @yearly
+- khoảng cách cố định `every 30s`, `every 5m`, `every 1h30m`, `@every 2h`
+
+Scheduler giữ một heap theo thời điểm chạy kế tiếp và chỉ hẹn một lần thức dậy
+(qua `schedule_wakeup`, giống AdmissionController) cho tác vụ sớm nhất, nên chi phí
+không tăng theo số tác vụ. Tác vụ có thể cộng thêm độ trễ ngẫu nhiên (jitter) và
+chọn cách xử lý lần chạy bị lỡ (máy ngủ, ứng dụng tắt): chạy bù một lần, bỏ qua nếu
+trễ quá SCHEDULER_MISFIRE_GRACE giây, hoặc chạy bù tất cả. Tác vụ gắn với section qua
+section_id; tác vụ tới hạn khi section đích chưa sẵn sàng (vd: vừa khởi động lại ứng
+dụng) được hoãn nguyên trạng, việc chạy bù diễn ra khi section được tạo lại. Danh sách
+tác vụ cùng thời điểm chạy kế tiếp được lưu ra file JSON. Không phụ thuộc Qt.
+"""
+
+import bisect
+import heapq
+import itertools
+import json
+import os
+import random
+import re
+import time
+from datetime import datetime, timedelta
+
+import config
+from structured_log import log_message
+
+
+CATCH_UP_POLICIES = {
+    "once": "Chạy bù 1 lần",
+    "skip": "Bỏ qua nếu lỡ",
+    "all": "Chạy bù tất cả",
+}
+
+CRON_MACROS = {
+    "@yearly": "0 0 1 1 *",
+    "@annually": "0 0 1 1 *",
+    "@monthly": "0 0 1 * *",
+    "@weekly": "0 0 * * 0",
+    "@daily": "0 0 * * *",
+    "@midnight": "0 0 * * *",
+    "@hourly": "0 * * * *",
+}
+MONTH_NAMES = {name: i + 1 for i, name in enumerate("jan feb mar apr may jun jul aug sep oct nov dec".split())}
+WEEKDAY_NAMES = {name: i for i, name in enumerate("sun mon tue wed thu fri sat".split())}
+INTERVAL_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+
+_DAILY_RE = re.compile(r"^(\d{1,2}):(\d{2})(?::(\d{2}))?$")
+_INTERVAL_RE = re.compile(r"^(?:every|@every)\s+((?:\d+(?:\.\d+)?\s*[smhd]\s*)+)$", re.IGNORECASE)
+_INTERVAL_PART_RE = re.compile(r"(\d+(?:\.\d+)?)\s*([smhd])", re.IGNORECASE)
+
+# Giới hạn tìm thời điểm kế tiếp của cron, biểu thức không khớp ngày nào (vd: 30/2) bị từ chối
+_CRON_SEARCH_DAYS = 366 * 5
+
+
+def _parse_cron_field(text, low, high, names=None):
+    values = set()
+    for part in text.lower().split(","):
+        range_text, _, step_text = part.partition("/")
+        step = int(step_text) if step_text else 1
+        if step <= 0:
+            raise ValueError(f"Bước không hợp lệ: '{part}'")
+        if range_text in ("*", "?"):
+            start, end = low, high
+        else:
+            start_text, _, end_text = range_text.partition("-")
+            start = int(names[start_text]) if names and start_text in names else int(start_text)
+            if end_text:
+                end = int(names[end_text]) if names and end_text in names else int(end_text)
+            else:
+                # `5/15` nghĩa là từ 5 tới hết với bước 15
+                end = high if step_text else start
+        if not low <= start <= end <= high:
+            raise ValueError(f"Giá trị ngoài khoảng {low}-{high}: '{part}'")
+        values.update(range(start, end + 1, step))
+    return sorted(values)
+
+
+class CronSchedule:
+    def __init__(self, expression):
+        text = CRON_MACROS.get(expression.strip().lower(), expression)
+        fields = text.split()
+        if len(fields) == 5:
+            fields = ["0"] + fields
+        if len(fields) != 6:
+            raise ValueError(f"Biểu thức cron cần 5 hoặc 6 trường: '{expression}'")
+        second, minute, hour, day, month, weekday = fields
+        self.seconds = _parse_cron_field(second, 0, 59)
+        self.minutes = _parse_cron_field(minute, 0, 59)
+        self.hours = _parse_cron_field(hour, 0, 23)
+        self.days = set(_parse_cron_field(day, 1, 31))
+        self.months = set(_parse_cron_field(month, 1, 12, MONTH_NAMES))
+        # Chủ nhật là 0 hoặc 7
+        self.weekdays = {d % 7 for d in _parse_cron_field(weekday, 0, 7, WEEKDAY_NAMES)}
+        self.day_restricted = day not in ("*", "?")
+        self.weekday_restricted = weekday not in ("*", "?")
+        # Kiểm tra ngay để biểu thức không bao giờ khớp bị báo lỗi khi thêm tác vụ
+        self.next_after(time.time())
+
+    def _day_matches(self, date):
+        day_match = date.day in self.days
+        weekday_match = date.isoweekday() % 7 in self.weekdays
+        if self.day_restricted and self.weekday_restricted:
+            # Giống cron: khi giới hạn cả ngày và thứ, khớp một trong hai là đủ
+            return day_match or weekday_match
+        if self.day_restricted:
+            return day_match
+        if self.weekday_restricted:
+            return weekday_match
+        return True
+
+    def _first_time_at_or_after(self, hour, minute, second):
+        """(giờ, phút, giây) khớp đầu tiên không sớm hơn thời điểm cho trước trong cùng ngày, None nếu hết ngày."""
+        for h in self.hours[bisect.bisect_left(self.hours, hour):]:
+            min_start = minute if h == hour else 0
+            for m in self.minutes[bisect.bisect_left(self.minutes, min_start):]:
+                sec_start = second if (h, m) == (hour, minute) else 0
+                index = bisect.bisect_left(self.seconds, sec_start)
+                if index < len(self.seconds):
+                    return h, m, self.seconds[index]
+        return None
+
+    def next_after(self, timestamp):
+        """Thời điểm (epoch) khớp đầu tiên sau `timestamp`, theo giờ địa phương."""
+        start = datetime.fromtimestamp(int(timestamp)) + timedelta(seconds=1)
+        date, clock = start.date(), (start.hour, start.minute, start.second)
+        for _ in range(_CRON_SEARCH_DAYS):
+            if date.month in self.months and self._day_matches(date):
+                found = self._first_time_at_or_after(*clock)
+                if found is not None:
+                    return datetime(date.year, date.month, date.day, *found).timestamp()
+            date, clock = date + timedelta(days=1), (0, 0, 0)
+        raise ValueError("Biểu thức cron không khớp thời điểm nào")
+
+
+class IntervalSchedule:
+    """Chạy cách đều `interval` giây, tính từ mốc `anchor` để không bị trôi dần."""
+
+    def __init__(self, interval, anchor):
+        if interval < 1:
+            raise ValueError("Khoảng cách tối thiểu là 1 giây")
+        self.interval = interval
+        self.anchor = anchor
+
+    def next_after(self, timestamp):
+        if timestamp < self.anchor:
+            return self.anchor
+        return self.anchor + (int((timestamp - self.anchor) // self.interval) + 1) * self.interval
+
+
+def parse_schedule(expression, anchor=None):
+    """Tạo đối tượng lịch (có `next_after(epoch)`) từ biểu thức, ValueError nếu không hợp lệ."""
+    text = str(expression).strip()
+    daily = _DAILY_RE.match(text)
+    if daily:
+        hour, minute, second = int(daily.group(1)), int(daily.group(2)), int(daily.group(3) or 0)
+        if hour > 23 or minute > 59 or second > 59:
+            raise ValueError(f"Giờ không hợp lệ: '{text}'")
+        return CronSchedule(f"{second} {minute} {hour} * * *")
+    interval = _INTERVAL_RE.match(text)
+    if interval:
+        seconds = sum(float(value) * INTERVAL_UNITS[unit.lower()] for value, unit in _INTERVAL_PART_RE.findall(interval.group(1)))
+        return IntervalSchedule(seconds, time.time() if anchor is None else anchor)
+    if not text:
+        raise ValueError("Chưa nhập biểu thức lịch")
+    return CronSchedule(text)
+
+
+def describe_expression(expression):
+    """Mô tả ngắn của biểu thức lịch để hiển thị/ghi log."""
+    text = str(expression).strip()
+    if _DAILY_RE.match(text):
+        return f"lúc {text}"
+    if _INTERVAL_RE.match(text):
+        return f"({text})"
+    return f"(cron {text})"
+
+
+def format_timestamp(timestamp):
+    return datetime.fromtimestamp(timestamp).strftime("%Y-%m-%d %H:%M:%S") if timestamp else "-"
+
+
+class ScheduledTask:
+    def __init__(
+        self,
+        section_name,
+        action_key,
+        expression,
+        action_text=None,
+        jitter=0.0,
+        catch_up=None,
+        task_id=None,
+        created_at=None,
+        section_id=None,
+    ):
+        self.task_id = task_id
+        # section_name chỉ để hiển thị, tác vụ được gắn với section qua section_id
+        self.section_name = section_name
+        self.section_id = section_id or section_name
+        self.action_key = action_key
+        self.action_text = action_text or action_key
+        self.expression = str(expression).strip()
+        self.jitter = max(0.0, float(jitter or 0))
+        self.catch_up = catch_up or config.SCHEDULER_DEFAULT_CATCH_UP
+        if self.catch_up not in CATCH_UP_POLICIES:
+            raise ValueError(f"Cách xử lý lần chạy bị lỡ không hợp lệ: '{self.catch_up}'")
+        self.created_at = time.time() if created_at is None else created_at
+        self.schedule = parse_schedule(self.expression, anchor=self.created_at)
+        self.last_run = None
+        # Thời điểm chạy theo lịch và thời điểm chạy thật (đã cộng jitter)
+        self.next_run = None
+        self.fire_at = None
+
+    def to_dict(self):
+        return {
+            "task_id": self.task_id,
+            "section_name": self.section_name,
+            "section_id": self.section_id,
+            "action_key": self.action_key,
+            "action_text": self.action_text,
+            "expression": self.expression,
+            "jitter": self.jitter,
+            "catch_up": self.catch_up,
+            "created_at": self.created_at,
+            "last_run": self.last_run,
+            "next_run": self.next_run,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        task = cls(
+            data["section_name"],
+            data["action_key"],
+            data["expression"],
+            action_text=data.get("action_text"),
+            jitter=data.get("jitter", 0.0),
+            catch_up=data.get("catch_up"),
+            task_id=data.get("task_id"),
+            created_at=data.get("created_at"),
+            # File cũ chưa có section_id, khi đó section_id là tên section
+            section_id=data.get("section_id"),
+        )
+        task.last_run = data.get("last_run")
+        task.next_run = data.get("next_run")
+        return task
+
+
+class Scheduler:
+    """
+    Heap các tác vụ theo thời điểm chạy kế tiếp. `on_fire(task, scheduled_time)` được gọi
+    cho mỗi lần chạy; `schedule_wakeup(delay, callback)` hẹn giờ thức dậy (QTimer, call_later...).
+    `is_available(task)` cho biết section đích đã sẵn sàng chưa; tác vụ tới hạn khi section
+    chưa sẵn sàng được hoãn (giữ nguyên next_run) cho tới lần gọi `retry_deferred()`.
+    """
+
+    def __init__(self, on_fire, schedule_wakeup, path=None, clock=time.time, is_available=None):
+        self.on_fire = on_fire
+        self.schedule_wakeup = schedule_wakeup
+        self.path = path
+        self.clock = clock
+        self.is_available = is_available
+        self._tasks = {}
+        self._deferred = set()
+        self._heap = []
+        self._heap_seq = itertools.count()
+        self._wakeup_token = 0
+
+    def load(self):
+        """Nạp tác vụ từ file; lần chạy bị lỡ khi ứng dụng tắt được xử lý ở lần thức dậy đầu tiên."""
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            log_message(f"Không đọc được file tác vụ hẹn giờ {self.path}: {e}", level="ERROR")
+            return
+        for item in data.get("tasks", []):
+            try:
+                task = ScheduledTask.from_dict(item)
+            except (KeyError, TypeError, ValueError) as e:
+                log_message(f"Bỏ qua tác vụ hẹn giờ không hợp lệ {item}: {e}", level="ERROR")
+                continue
+            self._tasks[task.task_id] = task
+            self._push(task, task.next_run)
+        self._arm()
+
+    def save(self):
+        if not self.path:
+            return
+        data = {"tasks": [task.to_dict() for task in self._tasks.values()]}
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            # Ghi ra file tạm rồi đổi tên để không bao giờ để lại file ghi dở
+            tmp_path = f"{self.path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            log_message(f"Không lưu được file tác vụ hẹn giờ {self.path}: {e}", level="ERROR")
+
+    def tasks(self):
+        """Các tác vụ theo thứ tự lần chạy kế tiếp."""
+        return sorted(self._tasks.values(), key=lambda task: (task.next_run or 0, task.task_id))
+
+    def add(self, task):
+        if task.task_id is None or task.task_id in self._tasks:
+            task.task_id = max(self._tasks, default=0) + 1
+        self._tasks[task.task_id] = task
+        self._push(task)
+        self.save()
+        self._arm()
+        return task
+
+    def remove(self, task_id):
+        # Phần tử trong heap được bỏ qua khi lấy ra vì tác vụ không còn tồn tại
+        task = self._tasks.pop(task_id, None)
+        self._deferred.discard(task_id)
+        if task is not None:
+            self.save()
+        return task
+
+    def remove_section(self, section_id):
+        """Xóa mọi tác vụ của một section (section bị đóng), trả về danh sách tác vụ đã xóa."""
+        removed = [task for task in self._tasks.values() if task.section_id == section_id]
+        for task in removed:
+            del self._tasks[task.task_id]
+            self._deferred.discard(task.task_id)
+        if removed:
+            self.save()
+        return removed
+
+    def clear(self):
+        self._tasks.clear()
+        self._deferred.clear()
+        self._heap.clear()
+        self.save()
+
+    def is_deferred(self, task_id):
+        return task_id in self._deferred
+
+    def retry_deferred(self):
+        """Đưa các tác vụ đang hoãn trở lại heap với next_run cũ, lần chạy bị lỡ được xử lý theo catch_up."""
+        if not self._deferred:
+            return
+        for task_id in list(self._deferred):
+            task = self._tasks.get(task_id)
+            if task is not None and (self.is_available is None or self.is_available(task)):
+                self._deferred.discard(task_id)
+                self._push(task, task.next_run)
+        self._arm()
+
+    def _push(self, task, next_run=None):
+        task.next_run = next_run or task.schedule.next_after(self.clock())
+        task.fire_at = task.next_run + (random.uniform(0, task.jitter) if task.jitter else 0)
+        heapq.heappush(self._heap, (task.fire_at, next(self._heap_seq), task.task_id))
+
+    def _arm(self):
+        if not self._heap:
+            return
+        self._wakeup_token += 1
+        token = self._wakeup_token
+        # Ngủ tối đa SCHEDULER_MAX_SLEEP để bắt kịp khi đồng hồ hệ thống bị chỉnh hoặc máy vừa thức dậy
+        delay = min(max(0.0, self._heap[0][0] - self.clock()), config.SCHEDULER_MAX_SLEEP)
+        self.schedule_wakeup(delay, lambda: self._on_wakeup(token))
+
+    def _on_wakeup(self, token):
+        if token != self._wakeup_token:
+            # Đã có lần hẹn mới hơn (thêm tác vụ...), bỏ qua lần hẹn cũ
+            return
+        self.run_due()
+        self._arm()
+
+    def _missed_occurrences(self, task, now):
+        """Các thời điểm theo lịch từ next_run tới `now` (tối đa SCHEDULER_MAX_CATCH_UP) và thời điểm kế tiếp sau `now`."""
+        occurrences = [task.next_run]
+        following = task.schedule.next_after(task.next_run)
+        while following <= now and len(occurrences) < config.SCHEDULER_MAX_CATCH_UP:
+            occurrences.append(following)
+            following = task.schedule.next_after(following)
+        if following <= now:
+            following = task.schedule.next_after(now)
+        return occurrences, following
+
+    def run_due(self):
+        """Chạy các tác vụ đã tới giờ và hẹn lại lần kế tiếp của chúng."""
+        now = self.clock()
+        fires = []
+        while self._heap and self._heap[0][0] <= now:
+            fire_at, _, task_id = heapq.heappop(self._heap)
+            task = self._tasks.get(task_id)
+            if task is None or task.fire_at != fire_at:
+                continue
+            if self.is_available is not None and not self.is_available(task):
+                # Section đích chưa có (vd: ngay sau khi khởi động lại): giữ nguyên lần chạy bị lỡ
+                self._deferred.add(task.task_id)
+                log_message(
+                    f"Tác vụ hẹn giờ #{task.task_id} ({task.action_text}): section '{task.section_name}' chưa sẵn sàng, "
+                    "hoãn tới khi section được tạo lại.",
+                    level="WARNING",
+                    section=task.section_name,
+                )
+                continue
+            occurrences, following = self._missed_occurrences(task, now)
+            if task.catch_up == "all":
+                runs = occurrences
+            elif task.catch_up == "skip" and now - occurrences[-1] > config.SCHEDULER_MISFIRE_GRACE + task.jitter:
+                runs = []
+            else:
+                runs = occurrences[-1:]
+            if len(occurrences) > len(runs):
+                log_message(
+                    f"Tác vụ hẹn giờ #{task.task_id} ({task.action_text}) bị lỡ {len(occurrences) - len(runs)} lần, "
+                    f"chạy {len(runs)} lần (chế độ: {CATCH_UP_POLICIES[task.catch_up]}).",
+                    level="WARNING",
+                    section=task.section_name,
+                )
+            if runs:
+                task.last_run = now
+            self._push(task, following)
+            fires.extend((task, scheduled) for scheduled in runs)
+
+        for task, scheduled in fires:
+            # Tác vụ có thể đã bị xóa bởi một tác vụ chạy trước đó trong cùng đợt
+            if task.task_id not in self._tasks:
+                continue
+            try:
+                self.on_fire(task, scheduled)
+            except Exception as e:
+                log_message(f"Lỗi khi chạy tác vụ hẹn giờ #{task.task_id}: {e}", level="ERROR", section=task.section_name)
+        if fires:
+            self.save()
+        return len(fires)
+
+    def close(self):
+        self._wakeup_token += 1
+        self.save()
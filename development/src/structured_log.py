@@ -0,0 +1,297 @@
+# development/src/structured_log.py
+"""
+Module ghi log có cấu trúc (JSONL) cho giao diện và chế độ headless.
+
+Mỗi bản ghi là một dict (thời gian, level, section, notebook, lần lặp, sự kiện,
+nội dung và payload). Luồng gọi chỉ đưa bản ghi vào queue rồi trả về ngay; một
+luồng nền duy nhất định dạng và ghi ra các sink:
+- JsonlFileSink: file `nbrunner.jsonl` trong thư mục log, xoay vòng theo dung lượng
+  hoặc thời gian, file cũ được nén gzip và chỉ giữ số file gần nhất.
+- ConsoleSink: in ra stdout theo định dạng dễ đọc như trước, giới hạn số dòng mỗi
+  giây để console chậm không làm nghẽn; số dòng bị bỏ qua được báo lại.
+
+Logger chỉ được tạo khi có bản ghi đầu tiên, nên tiến trình con chạy notebook không
+mở thêm luồng/file log. Không phụ thuộc Qt.
+"""
+
+import atexit
+import glob
+import gzip
+import json
+import os
+import queue as queue_module
+import shutil
+import sys
+import threading
+import time
+from datetime import datetime
+
+import config
+
+
+LOG_FILE_NAME = "nbrunner.jsonl"
+_STOP_SENTINEL = object()
+
+
+def format_output_for_cmd(log_type, section_name, nb_name, content, width=100, timestamp=None):
+    """
+    Tạo định dạng log mới theo yêu cầu.
+    Ví dụ: [09:42:45] [Output] [Section 2] [finext04_realtime_data.ipynb]
+    """
+    timestamp = timestamp or time.strftime("%H:%M:%S")
+
+    # Xác định tag là [Output] hay [ERROR]
+    tag = f"[{log_type.upper()}]"
+
+    # Tạo dòng tiêu đề
+    header = f"[{timestamp}] {tag} [{section_name}] [{nb_name}]"
+
+    separator = "=" * width
+
+    # Ghép lại thành chuỗi hoàn chỉnh
+    return f"""{header}
+{separator}
+{content.strip()}
+{separator}"""
+
+
+class JsonlFileSink:
+    """Ghi mỗi bản ghi thành một dòng JSON, xoay vòng file theo dung lượng/thời gian."""
+
+    def __init__(self, directory=None, max_mb=None, rotate_interval=None, backup_count=None, compress=None):
+        self.directory = directory or config.LOG_DIR
+        self.max_bytes = int((config.LOG_FILE_MAX_MB if max_mb is None else max_mb) * 1024 * 1024)
+        self.rotate_interval = config.LOG_ROTATE_INTERVAL if rotate_interval is None else rotate_interval
+        self.backup_count = config.LOG_BACKUP_COUNT if backup_count is None else backup_count
+        self.compress = config.LOG_COMPRESS if compress is None else compress
+        self.path = os.path.join(self.directory, LOG_FILE_NAME)
+        self._file = None
+        self._opened_at = None
+
+    def _open(self):
+        os.makedirs(self.directory, exist_ok=True)
+        self._file = open(self.path, "a", encoding="utf-8")
+        self._opened_at = time.time()
+
+    def _should_rotate(self):
+        if self._file is None:
+            return False
+        if self.max_bytes and self._file.tell() >= self.max_bytes:
+            return True
+        return bool(self.rotate_interval) and time.time() - self._opened_at >= self.rotate_interval
+
+    def _rotate(self):
+        self._file.close()
+        self._file = None
+        if os.path.getsize(self.path) == 0:
+            return
+        stamp = time.strftime("%Y%m%d-%H%M%S")
+        rotated_path = os.path.join(self.directory, f"nbrunner-{stamp}.jsonl")
+        suffix = 1
+        while os.path.exists(rotated_path) or os.path.exists(rotated_path + ".gz"):
+            rotated_path = os.path.join(self.directory, f"nbrunner-{stamp}-{suffix}.jsonl")
+            suffix += 1
+        os.replace(self.path, rotated_path)
+        if self.compress:
+            with open(rotated_path, "rb") as src, gzip.open(rotated_path + ".gz", "wb") as dst:
+                shutil.copyfileobj(src, dst)
+            os.remove(rotated_path)
+        self._prune()
+
+    def _prune(self):
+        if not self.backup_count:
+            return
+        backups = sorted(glob.glob(os.path.join(self.directory, "nbrunner-*.jsonl*")), key=os.path.getmtime)
+        for path in backups[: -self.backup_count]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def write(self, record):
+        if self._file is None:
+            self._open()
+        self._file.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+
+    def flush(self):
+        """Gọi sau mỗi lô bản ghi: đẩy dữ liệu xuống đĩa và xoay vòng file nếu cần."""
+        if self._file is None:
+            return
+        self._file.flush()
+        if self._should_rotate():
+            self._rotate()
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class ConsoleSink:
+    """In bản ghi có nội dung ra stdout, tối đa `max_per_second` bản ghi thông thường mỗi giây."""
+
+    def __init__(self, max_per_second=None):
+        self.max_per_second = config.CONSOLE_LOG_MAX_PER_SECOND if max_per_second is None else max_per_second
+        self._tokens = self.max_per_second
+        self._last_refill = time.monotonic()
+        self._dropped = 0
+
+    def _allow(self):
+        if not self.max_per_second:
+            return True
+        now = time.monotonic()
+        self._tokens = min(self.max_per_second, self._tokens + (now - self._last_refill) * self.max_per_second)
+        self._last_refill = now
+        if self._tokens >= 1:
+            self._tokens -= 1
+            return True
+        return False
+
+    def render(self, record):
+        timestamp = record["ts"][11:19]
+        if record.get("event") in ("output", "error"):
+            log_type = "ERROR" if record["event"] == "error" else "Output"
+            return format_output_for_cmd(log_type, record.get("section", ""), record.get("notebook", ""), record["message"], timestamp=timestamp)
+        prefix = f"[{record['section']}] " if record.get("section") else ""
+        return f"[{timestamp}] {prefix}{record['message']}"
+
+    def write(self, record):
+        if not record.get("message") or sys.stdout is None:
+            # Bản ghi chỉ có payload (vd: số liệu lần lặp) chỉ ghi vào file
+            return
+        # Lỗi luôn được in, chỉ giới hạn các bản ghi thông thường
+        if record["level"] != "ERROR" and not self._allow():
+            self._dropped += 1
+            return
+        if self._dropped:
+            print(f"[{record['ts'][11:19]}] ... bỏ qua {self._dropped} dòng log do console quá tải (xem file log).")
+            self._dropped = 0
+        print(self.render(record))
+
+    def flush(self):
+        if sys.stdout is not None:
+            sys.stdout.flush()
+
+    def close(self):
+        pass
+
+
+class StructuredLogger:
+    """Nhận bản ghi từ mọi luồng, một luồng nền ghi ra các sink theo lô."""
+
+    BATCH_SIZE = 500
+
+    def __init__(self, sinks):
+        self.sinks = sinks
+        self._queue = queue_module.SimpleQueue()
+        self._thread = threading.Thread(target=self._run, name="StructuredLogWriter", daemon=True)
+        self._thread.start()
+
+    def log(self, level, message=None, section=None, notebook=None, iteration=None, event=None, payload=None, **extra):
+        record = {"ts": datetime.now().isoformat(timespec="milliseconds"), "level": level}
+        for key, value in (
+            ("section", section),
+            ("notebook", notebook),
+            ("iteration", iteration),
+            ("event", event),
+            ("message", message),
+            ("payload", payload),
+        ):
+            if value is not None:
+                record[key] = value
+        record.update(extra)
+        self._queue.put(record)
+
+    def _write_batch(self, records):
+        for sink in self.sinks:
+            try:
+                for record in records:
+                    sink.write(record)
+                sink.flush()
+            except Exception as e:
+                # Lỗi ghi log (đĩa đầy, console bị đóng...) không được làm dừng ứng dụng
+                if sys.stderr is not None:
+                    sys.stderr.write(f"[ERROR] Lỗi ghi log ({type(sink).__name__}): {e}\n")
+
+    def _run(self):
+        while True:
+            try:
+                # Thức dậy định kỳ để xoay vòng file theo thời gian kể cả khi không có log
+                first = self._queue.get(timeout=1.0)
+            except queue_module.Empty:
+                self._write_batch([])
+                continue
+            records, stop = [], first is _STOP_SENTINEL
+            if not stop:
+                records.append(first)
+            while not stop and len(records) < self.BATCH_SIZE:
+                try:
+                    record = self._queue.get_nowait()
+                except queue_module.Empty:
+                    break
+                if record is _STOP_SENTINEL:
+                    stop = True
+                else:
+                    records.append(record)
+            self._write_batch(records)
+            if stop:
+                for sink in self.sinks:
+                    sink.close()
+                return
+
+    def close(self, timeout=5.0):
+        """Ghi nốt các bản ghi còn trong queue rồi dừng luồng nền."""
+        if self._thread.is_alive():
+            self._queue.put(_STOP_SENTINEL)
+            self._thread.join(timeout)
+
+
+_logger = None
+_logger_lock = threading.Lock()
+
+
+def get_logger():
+    """Logger dùng chung của tiến trình, được tạo ở lần gọi đầu tiên."""
+    global _logger
+    with _logger_lock:
+        if _logger is None:
+            sinks = []
+            if config.STRUCTURED_LOG_ENABLED:
+                sinks.append(JsonlFileSink())
+            if config.CONSOLE_LOG_ENABLED:
+                sinks.append(ConsoleSink())
+            _logger = StructuredLogger(sinks)
+            atexit.register(_logger.close)
+        return _logger
+
+
+def log_message(message, level="INFO", **fields):
+    """Ghi một dòng log (không chặn), fields: section, notebook, iteration, event, payload."""
+    get_logger().log(level, message, **fields)
+
+
+def log_notebook_output(msg_type, section_name, notebook_path, content, iteration=None):
+    """Ghi output (NOTEBOOK_PRINT) hoặc lỗi (EXECUTION_ERROR) của notebook."""
+    is_error = msg_type == "EXECUTION_ERROR"
+    text = content.get("details", "") if isinstance(content, dict) else str(content)
+    get_logger().log(
+        "ERROR" if is_error else "INFO",
+        text,
+        section=section_name,
+        notebook=os.path.basename(notebook_path),
+        iteration=iteration,
+        event="error" if is_error else "output",
+    )
+
+
+def log_iteration_end(section_name, notebook_path, content, message=None):
+    """Ghi kết quả một lần lặp (ITERATION_END) kèm số liệu; không có message thì chỉ ghi vào file."""
+    get_logger().log(
+        "INFO" if content["success"] else "WARNING",
+        message,
+        section=section_name,
+        notebook=os.path.basename(notebook_path),
+        iteration=content["iteration"],
+        event="iteration_end",
+        payload=content,
+    )
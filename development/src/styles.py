@@ -37,7 +37,7 @@ def get_stylesheet():
 
         /* === KHU VỰC CUỘN & VĂN BẢN === */
         QScrollArea { border: none; background-color: transparent; }
-        #AvailableScrollArea, #SectionScrollArea, #ScheduleListScrollArea { 
+        #AvailableScrollArea, #AvailableList, #SectionScrollArea, #ScheduleListScrollArea { 
             border: 1px solid #e9ecef; 
             border-radius: 8px; 
             background-color: #ffffff; 
@@ -51,6 +51,7 @@ def get_stylesheet():
             border-radius: 4px;
             font-family: 'Consolas', 'Monaco', monospace;
             font-size: 9pt;
+            padding: 5px;
         }        
         #SectionConsole QScrollBar:vertical {
             background: transparent;
@@ -94,7 +95,14 @@ def get_stylesheet():
             selection-background-color: #007bff; color: black;
         }
 
-        QSpinBox, #HourSpinBox, #MinuteSpinBox, #DelaySpinBox, #CountSpinBox {
+        #NotebookSearchBox, #ScheduleExpressionEdit, #ParametersEdit {
+            background-color: #ffffff; border: 1px solid #ced4da; border-radius: 6px;
+            padding: 4px 6px; color: black;
+            font-size: 9pt;
+        }
+        #NotebookSearchBox:focus, #ScheduleExpressionEdit:focus, #ParametersEdit:focus { border: 1px solid #007bff; }
+
+        QSpinBox, #HourSpinBox, #MinuteSpinBox, #DelaySpinBox, #CountSpinBox, #WorkersSpinBox {
             background-color: #f0f0f0;
             border: 1px solid #ccc;
             border-radius: 4px;
@@ -212,7 +220,7 @@ def get_stylesheet():
         }
         
         /* --- BUTTONS NHỎ (TRONG CARD) --- */
-        #RunButton, #StopButton, #RemoveButton, #ClearLogButton {
+        #RunButton, #StopButton, #RemoveButton, #ClearLogButton, #CellTimingsButton, #LimitsButton {
             border: none;
             border-radius: 6px;
             padding: 2px 4px;
@@ -230,6 +238,14 @@ def get_stylesheet():
 
         #RemoveButton { background: qlineargradient(x1:0, y1:0, x2:0, y2:1, stop:0 #dc3545, stop:1 #c82333); }
         #RemoveButton:hover { background: qlineargradient(x1:0, y1:0, x2:0, y2:1, stop:0 #e4606d, stop:1 #dc3545); }        
+
+        #CellTimingsButton { background: qlineargradient(x1:0, y1:0, x2:0, y2:1, stop:0 #17a2b8, stop:1 #117a8b); }
+        #CellTimingsButton:hover { background: qlineargradient(x1:0, y1:0, x2:0, y2:1, stop:0 #3ab7cc, stop:1 #17a2b8); }
+        #CellTimingsButton:disabled { background: #6c757d; }
+
+        #LimitsButton { background: qlineargradient(x1:0, y1:0, x2:0, y2:1, stop:0 #d63384, stop:1 #a61e61); }
+        #LimitsButton:hover { background: qlineargradient(x1:0, y1:0, x2:0, y2:1, stop:0 #e05a9d, stop:1 #d63384); }
+        #LimitsButton:disabled { background: #6c757d; }
         
         /* === DIALOG & MESSAGE BOX === */
         QMessageBox {
@@ -17,29 +17,37 @@ from PyQt6.QtWidgets import (
     QGroupBox,
     QComboBox,
     QSpinBox,
-    QTextEdit,
+    QDoubleSpinBox,
+    QPlainTextEdit,
     QSizePolicy,
     QMessageBox,
     QApplication,
+    QCheckBox,
+    QDialog,
+    QTableWidget,
+    QTableWidgetItem,
+    QHeaderView,
+    QLineEdit,
+    QFormLayout,
+    QDialogButtonBox,
 )
-from PyQt6.QtCore import Qt, pyqtSignal, QTimer, QTime, QMimeData, QPoint, QRect
+from PyQt6.QtCore import Qt, QObject, pyqtSignal, QTimer, QTime
 from PyQt6.QtGui import (
     QFont,
     QMouseEvent,
-    QDrag,
     QDropEvent,
     QDragEnterEvent,
-    QPixmap,
-    QPainter,
-    QColor,
-    QBrush,
-    QPen,
     QTextCursor,
     QWheelEvent,
     QIcon,
 )
 import config
+import dag
 import functions
+from notebook_list import modules_changed_text
+from parameters import expand_grid, parse_parameters, split_grid
+from resource_limits import LIMIT_KIND_LABELS, ResourceLimits, format_cpu_list
+from scheduler import CATCH_UP_POLICIES, ScheduledTask, describe_expression, format_timestamp
 
 
 class CustomSpinBox(QSpinBox):
@@ -68,6 +76,61 @@ class CustomSpinBox(QSpinBox):
             self.lineEdit().deselect()
 
 
+class SharedElapsedClock(QObject):
+    """
+    Một QTimer dùng chung cập nhật đồng hồ của mọi card đang chạy theo lô, thay cho
+    mỗi card một timer riêng. Chỉ card đang hiển thị mới được vẽ lại; khi cửa sổ bị
+    thu nhỏ hoặc bị che khuất, tần suất cập nhật giảm xuống.
+    """
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._cards = set()
+        self._timer = QTimer(self)
+        self._timer.timeout.connect(self._tick)
+
+    def register(self, card):
+        self._cards.add(card)
+        if not self._timer.isActive():
+            self._timer.start(config.ELAPSED_CLOCK_REFRESH_MS)
+
+    def unregister(self, card):
+        self._cards.discard(card)
+        if not self._cards:
+            self._timer.stop()
+
+    def _tick(self):
+        window_exposed = False
+        for card in list(self._cards):
+            try:
+                window = card.window().windowHandle()
+                if window is None or not window.isExposed() or card.window().isMinimized():
+                    continue
+                window_exposed = True
+                # Card bị cuộn khỏi vùng nhìn thấy không cần vẽ lại
+                if card.isVisible() and not card.visibleRegion().isEmpty():
+                    card.update_total_elapsed_timer()
+            except RuntimeError:
+                # Card đã bị xóa mà chưa kịp hủy đăng ký
+                self._cards.discard(card)
+
+        interval = config.ELAPSED_CLOCK_REFRESH_MS if window_exposed else config.ELAPSED_CLOCK_IDLE_REFRESH_MS
+        if not self._cards:
+            self._timer.stop()
+        elif self._timer.interval() != interval:
+            self._timer.setInterval(interval)
+
+
+_shared_elapsed_clock = None
+
+
+def shared_elapsed_clock():
+    global _shared_elapsed_clock
+    if _shared_elapsed_clock is None:
+        _shared_elapsed_clock = SharedElapsedClock(QApplication.instance())
+    return _shared_elapsed_clock
+
+
 class ClickableLabel(QLabel):
     doubleClicked = pyqtSignal()
 
@@ -96,120 +159,132 @@ class ClickableLink(QLabel):
         super().mousePressEvent(ev)
 
 
-class NotebookCard(QFrame):
-    clicked = pyqtSignal(str)
+def create_module_changed_label():
+    """Nhãn cảnh báo (ẩn mặc định) hiện trên card khi module notebook import vừa thay đổi."""
+    label = QLabel()
+    label.setFont(QFont("Segoe UI", 8))
+    label.setWordWrap(True)
+    label.setStyleSheet("color: #fd7e14;")
+    label.setVisible(False)
+    return label
+
+
+def show_modules_changed(label, module_names):
+    if module_names:
+        label.setText(modules_changed_text(module_names))
+        label.setToolTip("Lần chạy tiếp theo sẽ dùng code module mới")
+    label.setVisible(bool(module_names))
+
+
+class CellTimingsDialog(QDialog):
+    """Bảng thời gian chạy, CPU time và thay đổi RAM của từng cell trong lần lặp gần nhất, sắp xếp được theo cột."""
+
+    COLUMNS = [("Cell", "label"), ("Thời gian (s)", "wall"), ("CPU (s)", "cpu"), ("RAM Δ (MB)", "rss_delta_mb")]
 
-    def __init__(self, path, description, parent_runner, parent=None):
+    def __init__(self, notebook_name, cells, parent=None):
         super().__init__(parent)
-        self.path, self.is_highlighted, self.parent_runner = path, False, parent_runner
-        self.press_pos: QPoint | None = None
-        self.setFrameShape(QFrame.Shape.StyledPanel)
-        self.setObjectName("Card")
-        self.setCursor(Qt.CursorShape.PointingHandCursor)
+        self.setWindowTitle(f"Chi tiết từng cell - {notebook_name}")
+        self.resize(640, 400)
         layout = QVBoxLayout(self)
-        layout.setContentsMargins(5, 5, 5, 5)
-        layout.setSpacing(5)
-        self.filename_label = QLabel(os.path.basename(path))
-        self.filename_label.setFont(QFont("Segoe UI", 10, QFont.Weight.Bold))
-        self.filename_label.setObjectName("CardLabel")
-        self.filename_label.setWordWrap(True)
-        self.desc_label = QLabel(description)
-        self.desc_label.setFont(QFont("Segoe UI", 9))
-        self.desc_label.setObjectName("CardLabel")
-        self.desc_label.setWordWrap(True)
-        self.desc_label.setStyleSheet("color: #666666;")
-        layout.addWidget(self.filename_label)
-        layout.addWidget(self.desc_label)
 
-    def mousePressEvent(self, a0: QMouseEvent | None) -> None:
-        if not a0:
-            return
-        self.press_pos = a0.pos()
-        self.clicked.emit(self.path)
-
-    def create_transparent_drag_pixmap(self):
-        pixmap = QPixmap(self.size())
-        pixmap.fill(Qt.GlobalColor.transparent)
-        original_autofill = self.autoFillBackground()
-        self.setAutoFillBackground(False)
-        self.render(pixmap, flags=QWidget.RenderFlag.DrawChildren)
-        self.setAutoFillBackground(original_autofill)
-        return pixmap
-
-    def create_stacked_pixmap(self, selected_paths):
-        all_cards = self.parent_runner.available_notebook_cards
-        selected_cards = [all_cards[p] for p in selected_paths if p in all_cards]
-        if not selected_cards:
-            return self.create_transparent_drag_pixmap()
-        max_cards_to_show = 4
-        offset_x, offset_y = 8, 8
-        base_size = selected_cards[0].size()
-        card_width, card_height = base_size.width(), base_size.height()
-        num_cards_in_stack = min(len(selected_cards), max_cards_to_show)
-        total_width = card_width + (offset_x * (num_cards_in_stack - 1))
-        total_height = card_height + (offset_y * (num_cards_in_stack - 1))
-        final_pixmap = QPixmap(total_width, total_height)
-        final_pixmap.fill(Qt.GlobalColor.transparent)
-        painter = QPainter(final_pixmap)
-        for i in range(num_cards_in_stack):
-            index = num_cards_in_stack - 1 - i
-            card_to_draw = selected_cards[index]
-            card_pixmap = card_to_draw.create_transparent_drag_pixmap()
-            painter.drawPixmap(offset_x * index, offset_y * index, card_pixmap)
-        if len(selected_cards) > max_cards_to_show:
-            badge_size = 22
-            badge_rect = QRect(total_width - badge_size - 2, 2, badge_size, badge_size)
-            painter.setRenderHint(QPainter.RenderHint.Antialiasing)
-            painter.setBrush(QBrush(QColor("#0d6efd")))
-            painter.setPen(Qt.PenStyle.NoPen)
-            painter.drawEllipse(badge_rect)
-            painter.setPen(QPen(Qt.GlobalColor.white))
-            font = QFont("Segoe UI", 8, QFont.Weight.Bold)
-            painter.setFont(font)
-            painter.drawText(badge_rect, Qt.AlignmentFlag.AlignCenter, f"+{len(selected_cards) - max_cards_to_show + 1}")
-        painter.end()
-        return final_pixmap
-
-    def mouseMoveEvent(self, a0: QMouseEvent | None) -> None:
-        if not a0 or a0.buttons() != Qt.MouseButton.LeftButton or not self.is_highlighted:
-            return
-        selected_paths = self.parent_runner.highlighted_available
-        if not selected_paths:
-            return
-        drag = QDrag(self)
-        mime_data = QMimeData()
-        mime_data.setText("\n".join(selected_paths))
-        drag.setMimeData(mime_data)
-        if len(selected_paths) <= 1:
-            pixmap = self.create_transparent_drag_pixmap()
-        else:
-            pixmap = self.create_stacked_pixmap(selected_paths)
-        drag.setPixmap(pixmap)
-        drag.setHotSpot(a0.pos())
-        drag.exec(Qt.DropAction.MoveAction)
+        table = QTableWidget(len(cells), len(self.COLUMNS))
+        table.setHorizontalHeaderLabels([title for title, _ in self.COLUMNS])
+        table.setEditTriggers(QTableWidget.EditTrigger.NoEditTriggers)
+        table.verticalHeader().setVisible(False)
+        table.horizontalHeader().setSectionResizeMode(0, QHeaderView.ResizeMode.Stretch)
+        for row, cell in enumerate(cells):
+            for column, (_, key) in enumerate(self.COLUMNS):
+                value = cell.get(key)
+                item = QTableWidgetItem()
+                if isinstance(value, (int, float)):
+                    # Lưu dạng số để sắp xếp theo giá trị thay vì theo chuỗi
+                    item.setData(Qt.ItemDataRole.DisplayRole, round(value, 3))
+                else:
+                    item.setText("-" if value is None else str(value))
+                table.setItem(row, column, item)
+        table.setSortingEnabled(True)
+        table.sortByColumn(1, Qt.SortOrder.DescendingOrder)
+        layout.addWidget(table)
+
+
+class ResourceLimitsDialog(QDialog):
+    """Chỉnh giới hạn RAM, thời gian, timeout cell, mức ưu tiên và CPU của một card hoặc section (0 = dùng giới hạn cấp trên)."""
+
+    def __init__(self, title, limits, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle(title)
+        layout = QFormLayout(self)
+
+        self.memory_spin = CustomSpinBox()
+        self.memory_spin.setRange(0, 1024 * 1024)
+        self.memory_spin.setSingleStep(256)
+        self.memory_spin.setSuffix(" MB")
+        self.memory_spin.setSpecialValueText("Không giới hạn")
+        self.memory_spin.setValue(limits.memory_mb)
+        layout.addRow("RAM tối đa:", self.memory_spin)
+
+        self.timeout_spin = CustomSpinBox()
+        self.timeout_spin.setRange(0, 7 * 24 * 3600)
+        self.timeout_spin.setSingleStep(60)
+        self.timeout_spin.setSuffix(" s")
+        self.timeout_spin.setSpecialValueText("Không giới hạn")
+        self.timeout_spin.setValue(int(limits.timeout))
+        layout.addRow("Thời gian mỗi lần lặp:", self.timeout_spin)
+
+        self.cell_timeout_spin = CustomSpinBox()
+        self.cell_timeout_spin.setRange(0, 7 * 24 * 3600)
+        self.cell_timeout_spin.setSingleStep(60)
+        self.cell_timeout_spin.setSuffix(" s")
+        self.cell_timeout_spin.setSpecialValueText(f"Mặc định ({config.CELL_TIMEOUT}s)")
+        self.cell_timeout_spin.setToolTip('Cell có metadata "nbrunner": {"timeout": ...} dùng timeout riêng')
+        self.cell_timeout_spin.setValue(int(limits.cell_timeout))
+        layout.addRow("Timeout mỗi cell:", self.cell_timeout_spin)
+
+        self.adaptive_spin = QDoubleSpinBox()
+        self.adaptive_spin.setRange(0, 100)
+        self.adaptive_spin.setSingleStep(0.5)
+        self.adaptive_spin.setDecimals(1)
+        self.adaptive_spin.setPrefix("p99 x ")
+        self.adaptive_spin.setSpecialValueText("Tắt")
+        self.adaptive_spin.setToolTip(
+            f"Timeout của cell = p99 thời gian chạy trong lịch sử x hệ số (tối thiểu {config.ADAPTIVE_TIMEOUT_MIN_SECONDS}s, "
+            f"cần ít nhất {config.ADAPTIVE_TIMEOUT_MIN_SAMPLES} lần chạy thành công)"
+        )
+        self.adaptive_spin.setValue(limits.adaptive_timeout)
+        layout.addRow("Timeout thích ứng:", self.adaptive_spin)
+
+        self.nice_spin = CustomSpinBox()
+        self.nice_spin.setRange(0, 19)
+        self.nice_spin.setToolTip("Càng lớn càng nhường CPU cho tiến trình khác")
+        self.nice_spin.setValue(limits.nice)
+        layout.addRow("Mức nhường CPU (nice):", self.nice_spin)
+
+        self.cpu_edit = QLineEdit(format_cpu_list(limits.cpu_affinity))
+        self.cpu_edit.setPlaceholderText("Tất cả, vd: 0-3,6")
+        layout.addRow("CPU được dùng:", self.cpu_edit)
+
+        buttons = QDialogButtonBox(QDialogButtonBox.StandardButton.Ok | QDialogButtonBox.StandardButton.Cancel)
+        buttons.accepted.connect(self.accept)
+        buttons.rejected.connect(self.reject)
+        layout.addRow(buttons)
+
+    def limits(self):
+        return ResourceLimits(
+            self.memory_spin.value(),
+            self.timeout_spin.value(),
+            self.nice_spin.value(),
+            self.cpu_edit.text(),
+            self.cell_timeout_spin.value(),
+            self.adaptive_spin.value(),
+        )
 
-    def mouseReleaseEvent(self, a0: QMouseEvent | None) -> None:
-        if not a0 or self.press_pos is None:
-            return
-        moved_distance = (a0.pos() - self.press_pos).manhattanLength()
-        if moved_distance >= QApplication.startDragDistance():
+    def accept(self):
+        try:
+            self.limits()
+        except ValueError as e:
+            QMessageBox.warning(self, "Giới hạn không hợp lệ", str(e))
             return
-        is_ctrl_pressed = bool(QApplication.keyboardModifiers() & Qt.KeyboardModifier.ControlModifier)
-        if not is_ctrl_pressed and self.is_highlighted and len(self.parent_runner.highlighted_available) > 1:
-            other_selected_paths = list(self.parent_runner.highlighted_available)
-            for p in other_selected_paths:
-                if p != self.path and p in self.parent_runner.available_notebook_cards:
-                    self.parent_runner.available_notebook_cards[p].set_highlighted(False)
-            self.parent_runner.highlighted_available.clear()
-            self.parent_runner.highlighted_available.append(self.path)
-
-    def set_highlighted(self, highlighted):
-        self.is_highlighted = highlighted
-        self.setObjectName("SelectedCard" if highlighted else "Card")
-        style = self.style()
-        if style:
-            style.unpolish(self)
-            style.polish(self)
+        super().accept()
 
 
 class SectionNotebookCard(QFrame):
@@ -229,12 +304,25 @@ class SectionNotebookCard(QFrame):
             None,
         )
         self.consecutive_error_count = 0
+        self.force_run = False
+        # Số kernel chạy song song ở chế độ lưới tham số, tách biệt với số lần lặp
+        self.fanout_workers = config.FANOUT_MAX_WORKERS
+        # Tham số chèn vào notebook và lưới tham số của chế độ fan-out, đọc từ ô tham số khi bấm chạy
+        self.parameters, self.parameter_grid = {}, None
+        # Giới hạn tài nguyên riêng của card (ghi đè giới hạn của section) và lần vượt giới hạn gần nhất
+        self.limits = ResourceLimits()
+        self.last_limit = None
+        # Thời gian từng cell của lần lặp gần nhất có số liệu
+        self.last_cell_timings = []
+        # Module bị sửa kể từ lần chạy gần nhất
+        self.changed_modules = set()
         self.setFrameShape(QFrame.Shape.StyledPanel)
         self.setObjectName("SectionCard")
         self.setSizePolicy(QSizePolicy.Policy.Preferred, QSizePolicy.Policy.Fixed)
-        self.total_elapsed_timer = QTimer(self)
-        self.total_elapsed_timer.timeout.connect(self.update_total_elapsed_timer)
+        # Chỉ giữ chỉ số dòng của các lần lặp chưa kết thúc, bộ nhớ không tăng theo thời gian chạy
         self.iteration_logs = {}
+        self.log_line_total = 0
+        self.current_iteration = None
         self.setup_ui()
 
     def setup_ui(self):
@@ -245,15 +333,18 @@ class SectionNotebookCard(QFrame):
         title_label.setFont(QFont("Segoe UI", 10, QFont.Weight.Bold))
         title_label.setWordWrap(True)
         layout.addWidget(title_label)
-        desc_label = QLabel(self.description)
-        desc_label.setFont(QFont("Segoe UI", 8))
-        desc_label.setWordWrap(True)
-        desc_label.setStyleSheet("color: #666666;")
-        layout.addWidget(desc_label)
+        self.desc_label = QLabel(self.description)
+        self.desc_label.setFont(QFont("Segoe UI", 8))
+        self.desc_label.setWordWrap(True)
+        self.desc_label.setStyleSheet("color: #666666;")
+        layout.addWidget(self.desc_label)
+        self.module_label = create_module_changed_label()
+        layout.addWidget(self.module_label)
 
         mode_layout = QHBoxLayout()
         self.mode_combo = QComboBox()
-        self.mode_combo.addItems(["Lặp lại vô hạn", "Lặp lại hữu hạn"])
+        for mode, label in functions.EXECUTION_MODE_LABELS.items():
+            self.mode_combo.addItem(label, mode)
         self.mode_combo.currentTextChanged.connect(self.on_mode_changed)
         mode_layout.addWidget(self.mode_combo, 1)
 
@@ -285,8 +376,38 @@ class SectionNotebookCard(QFrame):
         mode_layout.addWidget(self.count_label)
         mode_layout.addWidget(self.count_spin)
 
+        self.workers_label = QLabel("Số luồng:")
+        self.workers_spin = CustomSpinBox()
+        self.workers_spin.setObjectName("WorkersSpinBox")
+        self.workers_spin.setMinimum(1)
+        self.workers_spin.setMaximum(config.FANOUT_MAX_WORKERS)
+        self.workers_spin.setValue(self.fanout_workers)
+        self.workers_spin.setFixedWidth(40)
+        self.workers_spin.setButtonSymbols(QSpinBox.ButtonSymbols.NoButtons)
+        self.workers_spin.setAlignment(Qt.AlignmentFlag.AlignCenter)
+        self.workers_spin.setToolTip("Số kernel chạy song song trên lưới tham số")
+        self.workers_label.setVisible(False)
+        self.workers_spin.setVisible(False)
+        self.workers_spin.valueChanged.connect(self.on_workers_changed)
+        mode_layout.addWidget(self.workers_label)
+        mode_layout.addWidget(self.workers_spin)
+
+        self.force_check = QCheckBox("Ép chạy")
+        self.force_check.setToolTip("Luôn chạy lại notebook, bỏ qua kết quả cache khi đầu vào không đổi")
+        self.force_check.toggled.connect(self.on_force_toggled)
+        mode_layout.addWidget(self.force_check)
+
         layout.addLayout(mode_layout)
 
+        self.parameters_edit = QLineEdit()
+        self.parameters_edit.setObjectName("ParametersEdit")
+        self.parameters_edit.setPlaceholderText("Tham số, vd: thang=1; phong='HR'")
+        self.parameters_edit.setToolTip(
+            "Ghi đè biến trong cell gắn tag 'parameters' (literal Python hoặc object JSON).\n"
+            "Chế độ lưới tham số: giá trị dạng list là một trục của lưới, vd: thang=[1, 2, 3]; phong=['HR', 'IT']"
+        )
+        layout.addWidget(self.parameters_edit)
+
         status_layout = QHBoxLayout()
         status_layout.addWidget(QLabel("Trạng thái:"))
         self.status_label = QLabel("Sẵn sàng")
@@ -299,8 +420,10 @@ class SectionNotebookCard(QFrame):
         status_layout.addWidget(self.timer_label)
         layout.addLayout(status_layout)
         log_layout = QVBoxLayout()
-        self.log_console = QTextEdit()
+        self.log_console = QPlainTextEdit()
         self.log_console.setReadOnly(True)
+        # Bộ đệm vòng: dòng cũ nhất tự bị xóa khi vượt giới hạn
+        self.log_console.setMaximumBlockCount(config.CARD_LOG_MAX_LINES)
         self.log_console.setObjectName("SectionConsole")
         self.log_console.setFixedHeight(60)
         log_layout.addWidget(self.log_console)
@@ -322,6 +445,19 @@ class SectionNotebookCard(QFrame):
         self.clear_log_btn.setCursor(Qt.CursorShape.PointingHandCursor)
         self.clear_log_btn.clicked.connect(self.clear_log)
         controls_layout.addWidget(self.clear_log_btn)
+        self.cells_btn = QPushButton("Cell")
+        self.cells_btn.setObjectName("CellTimingsButton")
+        self.cells_btn.setToolTip("Thời gian chạy của từng cell trong lần lặp gần nhất")
+        self.cells_btn.setEnabled(False)
+        self.cells_btn.setCursor(Qt.CursorShape.PointingHandCursor)
+        self.cells_btn.clicked.connect(self.show_cell_timings)
+        controls_layout.addWidget(self.cells_btn)
+        self.limits_btn = QPushButton("Giới hạn")
+        self.limits_btn.setObjectName("LimitsButton")
+        self.limits_btn.setToolTip(self.limits.describe())
+        self.limits_btn.setCursor(Qt.CursorShape.PointingHandCursor)
+        self.limits_btn.clicked.connect(self.edit_limits)
+        controls_layout.addWidget(self.limits_btn)
         self.remove_btn = QPushButton("Đóng")
         self.remove_btn.setObjectName("RemoveButton")
         self.remove_btn.setCursor(Qt.CursorShape.PointingHandCursor)
@@ -331,52 +467,106 @@ class SectionNotebookCard(QFrame):
         layout.addStretch()
 
     def on_mode_changed(self, text):
-        is_count_mode = text == "Lặp lại hữu hạn"
-        self.execution_mode = "count" if is_count_mode else "continuous"
+        self.execution_mode = self.mode_combo.currentData() or "continuous"
+        is_count_mode = self.execution_mode == "count"
+        is_fanout_mode = self.execution_mode == "fanout"
         self.count_label.setVisible(is_count_mode)
         self.count_spin.setVisible(is_count_mode)
-        self.delay_label.setVisible(not is_count_mode)
-        self.delay_spin.setVisible(not is_count_mode)
+        self.workers_label.setVisible(is_fanout_mode)
+        self.workers_spin.setVisible(is_fanout_mode)
+        self.delay_label.setVisible(not (is_count_mode or is_fanout_mode))
+        self.delay_spin.setVisible(not (is_count_mode or is_fanout_mode))
 
     def on_count_changed(self, value):
         self.execution_count = value
 
+    def on_workers_changed(self, value):
+        self.fanout_workers = value
+
+    def on_force_toggled(self, checked):
+        self.force_run = checked
+
     def on_delay_changed(self, value):
         self.execution_delay = value
 
+    def mark_modules_changed(self, module_names):
+        self.changed_modules.update(module_names)
+        show_modules_changed(self.module_label, self.changed_modules)
+
+    def edit_limits(self):
+        dialog = ResourceLimitsDialog(f"Giới hạn tài nguyên - {os.path.basename(self.path)}", self.limits, self)
+        if dialog.exec():
+            self.limits = dialog.limits()
+            self.limits_btn.setToolTip(self.limits.describe())
+
+    def show_cell_timings(self):
+        if self.last_cell_timings:
+            CellTimingsDialog(os.path.basename(self.path), self.last_cell_timings, self).exec()
+
     def run_notebook(self):
-        self.log_console.clear()
-        self.iteration_logs.clear()
+        self.clear_log()
         self.consecutive_error_count = 0
-
-        if self.execution_mode == "continuous":
-            log_text = "Bắt đầu: Vô hạn."
-        else:
-            log_text = f"Bắt đầu: {self.execution_count} lần."
-        self.log_message_to_section(log_text)
+        self.last_limit = None
+        self.changed_modules.clear()
+        show_modules_changed(self.module_label, self.changed_modules)
 
         self.set_status("running")
         self.run_btn.setEnabled(False)
         self.stop_btn.setEnabled(True)
         self.mode_combo.setEnabled(False)
         self.count_spin.setEnabled(False)
+        self.workers_spin.setEnabled(False)
         self.delay_spin.setEnabled(False)
+        self.force_check.setEnabled(False)
+        self.parameters_edit.setEnabled(False)
+        self.limits_btn.setEnabled(False)
+
+        try:
+            self._read_parameters()
+        except ValueError as e:
+            # Kết thúc như một lần chạy lỗi để chuỗi chạy lần lượt/theo phụ thuộc không bị treo
+            self.log_message_to_section(f"Tham số không hợp lệ: {e}")
+            self.on_execution_finished(was_stopped_by_error=True)
+            return
+
+        if self.execution_mode == "persistent":
+            log_text = "Bắt đầu: Vô hạn (giữ kernel)."
+        elif self.execution_mode == "continuous":
+            log_text = "Bắt đầu: Vô hạn."
+        elif self.execution_mode == "fanout":
+            log_text = f"Bắt đầu: {len(expand_grid(self.parameter_grid))} bộ tham số."
+        else:
+            log_text = f"Bắt đầu: {self.execution_count} lần."
+        self.log_message_to_section(log_text)
         self.run_requested.emit(self)
 
+    def _read_parameters(self):
+        parameters = parse_parameters(self.parameters_edit.text())
+        if self.execution_mode != "fanout":
+            self.parameters, self.parameter_grid = parameters, None
+            return
+        self.parameters, self.parameter_grid = split_grid(parameters)
+        if not self.parameter_grid:
+            raise ValueError("chế độ lưới tham số cần ít nhất một tham số dạng list, vd: thang=[1, 2, 3]")
+        expand_grid(self.parameter_grid)
+
     def stop_notebook(self):
-        if self.current_status == "running":
+        if self.current_status in ["running", "queued"]:
             self.set_status("stopping")
             self.stop_btn.setEnabled(False)
             QApplication.processEvents()
             self.stop_requested.emit(self.path)
 
     def remove_notebook(self):
-        if self.current_status == "running":
+        if self.current_status in ["running", "queued"]:
             self.stop_notebook()
         self.remove_requested.emit(self.path)
 
     def clear_log(self):
         self.log_console.clear()
+        self.iteration_logs.clear()
+        self.current_iteration = None
+        self.log_line_total = 0
 
     def on_execution_finished(self, was_stopped_by_error):
         if self.current_status not in ["running", "stopping"]:
@@ -388,6 +578,9 @@ class SectionNotebookCard(QFrame):
         if self.current_status == "stopping":
             self.set_status("stopped")
             self.log_message_to_section("Đã dừng bắt buộc.")
+        elif was_stopped_by_error and self.last_limit:
+            # Vượt giới hạn tài nguyên là trạng thái riêng, không phải lỗi của notebook
+            self.set_status("limit", LIMIT_KIND_LABELS.get(self.last_limit["kind"], self.last_limit["kind"]))
         elif was_stopped_by_error:
             self.set_status("error")
         else:
@@ -399,7 +592,11 @@ class SectionNotebookCard(QFrame):
         self.stop_btn.setEnabled(False)
         self.mode_combo.setEnabled(True)
         self.count_spin.setEnabled(True)
+        self.workers_spin.setEnabled(True)
         self.delay_spin.setEnabled(True)
+        self.force_check.setEnabled(True)
+        self.parameters_edit.setEnabled(True)
+        self.limits_btn.setEnabled(True)
 
         self.execution_truly_finished.emit(self.path, final_status_was_success)
 
@@ -407,11 +604,14 @@ class SectionNotebookCard(QFrame):
         self.current_status = status
         status_map = {
             "ready": ("Sẵn sàng", "#008000"),
+            "queued": ("Đang chờ...", "#6f42c1"),
             "running": ("Đang chạy...", "#0056b3"),
             "success": ("Thành công", "#008000"),
             "error": ("Lỗi", "#FF0000"),
             "stopping": ("Đang dừng...", "#fd7e14"),
             "stopped": ("Đã dừng", "#6c757d"),
+            "skipped": ("Bỏ qua", "#6c757d"),
+            "limit": ("Vượt giới hạn", "#d63384"),
         }
         if status in status_map:
             text, color = status_map[status]
@@ -421,10 +621,13 @@ class SectionNotebookCard(QFrame):
 
     def start_total_elapsed_timer(self):
         self.start_time = time.time()
-        self.total_elapsed_timer.start(10)
+        shared_elapsed_clock().register(self)
+        self.update_total_elapsed_timer()
 
     def stop_total_elapsed_timer(self):
-        self.total_elapsed_timer.stop()
+        shared_elapsed_clock().unregister(self)
+        # Cập nhật lần cuối để đồng hồ hiển thị đúng thời gian kết thúc
+        self.update_total_elapsed_timer()
 
     def update_total_elapsed_timer(self):
         if self.start_time:
@@ -436,9 +639,24 @@ class SectionNotebookCard(QFrame):
             self.timer_label.setText(f"{minutes:02d}:{seconds:02d}:{hundredths:02d}")
 
     def log_message_to_section(self, message):
+        """Ghi một dòng vào log của card, trả về chỉ số tuyệt đối của dòng đó."""
         timestamp = time.strftime("%H:%M:%S")
-        self.log_console.append(f"[{timestamp}] {message}")
+        self.log_console.appendPlainText(f"[{timestamp}] {message}".replace("\n", " "))
+        self.log_line_total += 1
         self._scroll_log_to_bottom()
+        return self.log_line_total - 1
+
+    def _append_to_log_line(self, line_index, text):
+        """Nối text vào cuối dòng có chỉ số tuyệt đối line_index, bỏ qua nếu dòng đã bị đẩy khỏi bộ đệm."""
+        document = self.log_console.document()
+        block_number = line_index - (self.log_line_total - document.blockCount())
+        if block_number < 0:
+            return
+        block = document.findBlockByNumber(block_number)
+        if block.isValid():
+            cursor = QTextCursor(block)
+            cursor.movePosition(QTextCursor.MoveOperation.EndOfBlock)
+            cursor.insertText(text)
 
     def _scroll_log_to_bottom(self):
         scrollbar = self.log_console.verticalScrollBar()
@@ -461,43 +679,54 @@ class SectionNotebookCard(QFrame):
             self.start_total_elapsed_timer()
         elif msg_type == "SECTION_LOG":
             self.log_message_to_section(content)
+        elif msg_type == "LIMIT_EXCEEDED":
+            self.last_limit = content
+            self.log_message_to_section(f"Vượt giới hạn: {content['details']}")
         elif msg_type == "ITERATION_START":
             iteration = content["iteration"]
-            log_line = f"Lần {iteration}:"
-            self.log_message_to_section(log_line)
-            cursor = self.log_console.textCursor()
-            cursor.movePosition(QTextCursor.MoveOperation.StartOfLine, QTextCursor.MoveMode.KeepAnchor)
-            self.iteration_logs[iteration] = cursor
+            self.current_iteration = iteration
+            log_line = f"Lần {iteration} ({content['parameters']}):" if content.get("parameters") else f"Lần {iteration}:"
+            self.iteration_logs[iteration] = self.log_message_to_section(log_line)
         elif msg_type == "ITERATION_END":
             iteration = content["iteration"]
-            cursor = self.iteration_logs.get(iteration)
+            line_index = self.iteration_logs.pop(iteration, None)
             duration_str = self._format_duration(content["duration"])
+            if content.get("cells"):
+                self.last_cell_timings = content["cells"]
+                self.cells_btn.setEnabled(True)
 
             if content["success"]:
                 self.consecutive_error_count = 0
-                if cursor:
-                    cursor.movePosition(QTextCursor.MoveOperation.EndOfLine)
-                    cursor.insertText(f" {duration_str}")
+                self.last_limit = None
+                if line_index is not None:
+                    self._append_to_log_line(line_index, f" {duration_str}")
+            elif content.get("limit"):
+                # Không tính vào số lỗi liên tiếp
+                if line_index is not None:
+                    self._append_to_log_line(line_index, f" {duration_str} [GIỚI HẠN {LIMIT_KIND_LABELS.get(content['limit'], content['limit'])}]")
             else:
                 self.consecutive_error_count += 1
-                if cursor:
-                    if self.execution_mode == "continuous":
+                if line_index is not None:
+                    if self.execution_mode == "fanout":
+                        # Các bộ tham số độc lập với nhau, không đếm lỗi liên tiếp
+                        error_message = f" {duration_str} [LỖI]"
+                    elif self.execution_mode in functions.CONTINUOUS_MODES:
                         error_message = f" {duration_str} [LỖI {self.consecutive_error_count}/{config.MAX_CONSECUTIVE_ERRORS_CONTINOUS}]"
                     else:
                         error_message = f" {duration_str} [LỖI {self.consecutive_error_count}/{config.MAX_CONSECUTIVE_ERRORS_FINITE}]"
 
-                    cursor.movePosition(QTextCursor.MoveOperation.EndOfLine)
-                    cursor.insertText(error_message)
+                    self._append_to_log_line(line_index, error_message)
 
         elif msg_type == "EXECUTION_FINISHED":
-            self.on_execution_finished(False)
+            # content là False khi tiến trình dừng vì lỗi liên tiếp hoặc không đủ số lần thành công
+            self.on_execution_finished(was_stopped_by_error=content is False)
 
 
 # MODIFIED: Redesigned for two-line display
 class ScheduledTaskDisplayWidget(QFrame):
     remove_requested = pyqtSignal(int)
 
-    def __init__(self, task_id, section_name, action_text, time_text, parent=None):
+    def __init__(self, task_id, section_name, action_text, schedule_text, next_run_text, parent=None):
         super().__init__(parent)
         self.task_id = task_id
         self.setFrameShape(QFrame.Shape.StyledPanel)
@@ -508,7 +737,7 @@ class ScheduledTaskDisplayWidget(QFrame):
         main_layout.setContentsMargins(8, 4, 4, 4)  # Reduce right margin
         main_layout.setSpacing(4)  # Reduce spacing between elements
 
-        # Vertical layout for the two lines of text
+        # Vertical layout for the lines of text
         text_layout = QVBoxLayout()
         text_layout.setSpacing(2)
 
@@ -517,11 +746,17 @@ class ScheduledTaskDisplayWidget(QFrame):
         section_label.setWordWrap(True)
         text_layout.addWidget(section_label)
 
-        # Line 2: Action and Time (bold parts)
-        details_label = QLabel(f"<b>{action_text}</b> lúc <b>{time_text}</b>")
+        # Line 2: Action and schedule (bold parts)
+        details_label = QLabel(f"<b>{action_text}</b> {schedule_text}")
         details_label.setWordWrap(True)
         text_layout.addWidget(details_label)
 
+        # Line 3: Next run time
+        next_run_label = QLabel(f"Lần tới: {next_run_text}")
+        next_run_label.setFont(QFont("Segoe UI", 8))
+        next_run_label.setStyleSheet("color: #666666;")
+        text_layout.addWidget(next_run_label)
+
         main_layout.addLayout(text_layout, 1)  # Give text area flexible space
 
         # Remove button on the right with fixed width, aligned to bottom
@@ -536,15 +771,24 @@ class ScheduledTaskDisplayWidget(QFrame):
 class ScheduleManagerWidget(QWidget):
     section_close_requested = pyqtSignal()
 
+    ACTION_MAP = {
+        "Chạy Đồng Thời": "run_all_simultaneously",
+        "Chạy Lần Lượt": "run_all_sequential_wrapper",
+        "Chạy Theo Phụ Thuộc": "run_all_dag",
+        "Dừng Tất Cả": "stop_all_notebooks",
+    }
+
     def __init__(self, parent_runner=None):
         super().__init__()
         self.parent_runner = parent_runner
-        self.tasks_data = {}
-        self.task_counter = 0
         self.setMinimumWidth(config.SCHEDULE_MANAGER_WIDTH)
         self.setObjectName("ScheduleManagerWidget")
         self.setup_ui()
 
+    @property
+    def scheduler(self):
+        return self.parent_runner.scheduler
+
     def setup_ui(self):
         main_layout = QVBoxLayout(self)
         main_layout.setContentsMargins(0, 0, 0, 0)
@@ -556,14 +800,14 @@ class ScheduleManagerWidget(QWidget):
         main_group_layout.setSpacing(8)
 
         creator_layout = QHBoxLayout()
-        creator_layout.setContentsMargins(0, 0, 0, 5)
+        creator_layout.setContentsMargins(0, 0, 0, 0)
 
         self.section_combo = QComboBox()
         self.section_combo.setObjectName("TaskSectionCombo")
         creator_layout.addWidget(self.section_combo, 1)
 
         self.action_combo = QComboBox()
-        self.action_combo.addItems(["Chạy Đồng Thời", "Chạy Lần Lượt", "Dừng Tất Cả"])
+        self.action_combo.addItems(list(self.ACTION_MAP))
         self.action_combo.setFont(QFont("Segoe UI", 9))
         creator_layout.addWidget(self.action_combo, 1)
 
@@ -587,6 +831,39 @@ class ScheduleManagerWidget(QWidget):
 
         main_group_layout.addLayout(creator_layout)
 
+        # Lịch nâng cao: biểu thức cron/khoảng cách (thay cho giờ:phút), jitter và cách chạy bù
+        advanced_layout = QHBoxLayout()
+        advanced_layout.setContentsMargins(0, 0, 0, 5)
+
+        self.expression_edit = QLineEdit()
+        self.expression_edit.setObjectName("ScheduleExpressionEdit")
+        self.expression_edit.setPlaceholderText("cron / every 10m (trống = giờ:phút)")
+        self.expression_edit.setToolTip(
+            "Để trống: chạy mỗi ngày vào giờ:phút đã chọn.\n"
+            "Cron 5 trường: phút giờ ngày tháng thứ (vd: */5 * * * *, 0 8 * * mon-fri)\n"
+            "Cron 6 trường (có giây ở đầu): */15 * * * * *\n"
+            "Khoảng cách: every 30s, every 5m, every 1h30m"
+        )
+        advanced_layout.addWidget(self.expression_edit, 1)
+
+        self.jitter_spin = CustomSpinBox()
+        self.jitter_spin.setRange(0, 3600)
+        self.jitter_spin.setSuffix("s")
+        self.jitter_spin.setObjectName("DelaySpinBox")
+        self.jitter_spin.setToolTip("Jitter: cộng thêm tối đa số giây ngẫu nhiên vào mỗi lần chạy")
+        self.jitter_spin.setFixedWidth(55)
+        advanced_layout.addWidget(self.jitter_spin)
+
+        self.catch_up_combo = QComboBox()
+        for policy, label in CATCH_UP_POLICIES.items():
+            self.catch_up_combo.addItem(label, policy)
+        self.catch_up_combo.setCurrentIndex(self.catch_up_combo.findData(config.SCHEDULER_DEFAULT_CATCH_UP))
+        self.catch_up_combo.setToolTip("Cách xử lý lần chạy bị lỡ (máy ngủ, ứng dụng đang tắt)")
+        self.catch_up_combo.setFont(QFont("Segoe UI", 9))
+        advanced_layout.addWidget(self.catch_up_combo)
+
+        main_group_layout.addLayout(advanced_layout)
+
         self.scroll_area = QScrollArea()
         self.scroll_area.setWidgetResizable(True)
         self.scroll_area.setObjectName("ScheduleListScrollArea")
@@ -633,42 +910,39 @@ class ScheduleManagerWidget(QWidget):
             QMessageBox.warning(self, "Lỗi", "Vui lòng chọn một Section hợp lệ.")
             return
 
-        action_map = {
-            "Chạy Đồng Thời": "run_all_simultaneously",
-            "Chạy Lần Lượt": "run_all_sequential_wrapper",
-            "Dừng Tất Cả": "stop_all_notebooks",
-        }
         action_text = self.action_combo.currentText()
-        time_val = QTime(self.hour_spin.value(), self.minute_spin.value())
-
-        self.task_counter += 1
-        task_id = self.task_counter
-
-        self.tasks_data[task_id] = {
-            "section_id": section_id,
-            "section_name": section_name,
-            "action_key": action_map.get(action_text),
-            "action_text": action_text,
-            "time": time_val,
-        }
+        expression = self.expression_edit.text().strip() or f"{self.hour_spin.value():02d}:{self.minute_spin.value():02d}"
+        try:
+            task = ScheduledTask(
+                section_name,
+                self.ACTION_MAP[action_text],
+                expression,
+                action_text=action_text,
+                jitter=self.jitter_spin.value(),
+                catch_up=self.catch_up_combo.currentData(),
+                section_id=section_id,
+            )
+        except ValueError as e:
+            QMessageBox.warning(self, "Lịch không hợp lệ", f"Không thể tạo tác vụ với lịch '{expression}':\n{e}")
+            return
+        self.scheduler.add(task)
 
         self.update_task_display()
-        if self.parent_runner:
-            self.parent_runner.log_message_to_cmd(f"Đã thêm tác vụ: {action_text} cho {section_name} lúc {time_val.toString('HH:mm')}.")
+        self.parent_runner.log_message_to_cmd(
+            f"Đã thêm tác vụ: {action_text} cho {section_name} {describe_expression(expression)}, "
+            f"lần tới lúc {format_timestamp(task.next_run)}."
+        )
 
     def remove_task(self, task_id):
-        if task_id in self.tasks_data:
-            task_info = self.tasks_data[task_id]
-            log_message = (
-                f"Đã xóa tác vụ: {task_info['action_text']} cho {task_info['section_name']} lúc {task_info['time'].toString('HH:mm')}."
-            )
-            del self.tasks_data[task_id]
+        task = self.scheduler.remove(task_id)
+        if task is not None:
             self.update_task_display()
-            if self.parent_runner:
-                self.parent_runner.log_message_to_cmd(log_message)
+            self.parent_runner.log_message_to_cmd(
+                f"Đã xóa tác vụ: {task.action_text} cho {task.section_name} {describe_expression(task.expression)}."
+            )
 
     def delete_all_tasks(self):
-        if not self.tasks_data:
+        if not self.scheduler.tasks():
             return
         reply = QMessageBox.question(
             self,
@@ -678,10 +952,9 @@ class ScheduleManagerWidget(QWidget):
             QMessageBox.StandardButton.No,
         )
         if reply == QMessageBox.StandardButton.Yes:
-            self.tasks_data.clear()
+            self.scheduler.clear()
             self.update_task_display()
-            if self.parent_runner:
-                self.parent_runner.log_message_to_cmd("Đã xóa tất cả các tác vụ định kỳ.")
+            self.parent_runner.log_message_to_cmd("Đã xóa tất cả các tác vụ định kỳ.")
 
     def update_task_display(self):
         while self.tasks_layout.count():
@@ -690,17 +963,23 @@ class ScheduleManagerWidget(QWidget):
             if widget:
                 widget.deleteLater()
 
-        if not self.tasks_data:
+        tasks = self.scheduler.tasks()
+        if not tasks:
             placeholder = QLabel("Chưa có lịch hẹn nào.")
             placeholder.setAlignment(Qt.AlignmentFlag.AlignCenter)
             placeholder.setStyleSheet("color: #888;")
             self.tasks_layout.addWidget(placeholder)
         else:
-            sorted_tasks = sorted(self.tasks_data.items(), key=lambda item: item[1]["time"])
-            for task_id, task_info in sorted_tasks:
-                # MODIFIED: Create new two-line widget
+            for task in tasks:
+                next_run_text = format_timestamp(task.next_run)
+                if self.scheduler.is_deferred(task.task_id):
+                    next_run_text += " (chờ section)"
                 task_widget = ScheduledTaskDisplayWidget(
-                    task_id, task_info["section_name"], task_info["action_text"], task_info["time"].toString("HH:mm")
+                    task.task_id,
+                    task.section_name,
+                    task.action_text,
+                    describe_expression(task.expression),
+                    next_run_text,
                 )
                 task_widget.remove_requested.connect(self.remove_task)
                 self.tasks_layout.addWidget(task_widget)
@@ -719,17 +998,6 @@ class ScheduleManagerWidget(QWidget):
             if index != -1:
                 self.section_combo.setCurrentIndex(index)
 
-    def get_tasks(self):
-        return self.tasks_data.copy()
-
-    def mark_task_as_run(self, task_id, time_str):
-        if task_id in self.tasks_data:
-            self.tasks_data[task_id]["last_run_time"] = time_str
-
-    def reset_task_run_marker(self, task_id):
-        if task_id in self.tasks_data and "last_run_time" in self.tasks_data[task_id]:
-            del self.tasks_data[task_id]["last_run_time"]
-
 
 class SectionWidget(QWidget):
     notebooks_dropped = pyqtSignal(object, list)
@@ -743,10 +1011,10 @@ class SectionWidget(QWidget):
 
         self.is_sequence_running = False
         self.sequential_queue = []
-
-        self.queue_checker_timer = QTimer(self)
-        self.queue_checker_timer.timeout.connect(self.check_all_queues)
-        self.queue_checker_timer.start(100)
+        self.dag_run = None
+        self.max_parallel = 0
+        # Giới hạn tài nguyên chung của section, card có thể ghi đè từng trường
+        self.limits = ResourceLimits()
 
         self.setMinimumWidth(config.RUN_SECTION_WIDTH)
         self.setAcceptDrops(True)
@@ -765,48 +1033,23 @@ class SectionWidget(QWidget):
         elif a0:
             a0.ignore()
 
-    def check_all_queues(self):
-        if not self.running_processes:
-            return
-
-        for path, proc_info in list(self.running_processes.items()):
-            queue = proc_info.get("queue")
-            card = proc_info.get("card")
-            if not queue or not card:
-                continue
-
-            while not queue.empty():
-                try:
-                    message = queue.get_nowait()
-                    if isinstance(message, tuple) and len(message) == 2:
-                        msg_type, content = message
-
-                        if msg_type in ["NOTEBOOK_PRINT", "EXECUTION_ERROR"]:
-                            self.log_to_cmd(path, msg_type, content)
-                        else:
-                            card.handle_log_message(msg_type, content)
-                except Exception:
-                    pass
-
-    def log_to_cmd(self, notebook_path, msg_type, content):
-        if not self.parent_runner:
+    def handle_process_message(self, path, msg_type, content):
+        """Nhận message (đã được LogDispatcher định tuyến) từ tiến trình đang chạy notebook `path`."""
+        if self.parent_runner:
+            self.parent_runner.metrics.observe_message(self.section_name, path, msg_type, content)
+        proc_info = self.running_processes.get(path)
+        card = proc_info.get("card") if proc_info else None
+        if not card or path not in self.notebook_cards:
+            # Card đã bị đóng, việc dọn dẹp do _on_process_stopped đảm nhận
             return
 
-        nb_name = os.path.basename(notebook_path)
-
-        # Chuyển đổi msg_type sang 'Output' hoặc 'ERROR'
-        log_type = "ERROR" if msg_type == "EXECUTION_ERROR" else "Output"
-
-        # Lấy nội dung thực sự từ dict (đối với lỗi)
-        log_content = content.get("details", "") if isinstance(content, dict) else str(content)
-
-        # Gọi hàm định dạng mới với đầy đủ thông tin
-        formatted_log = functions.format_output_for_cmd(
-            log_type=log_type, section_name=self.section_name, nb_name=nb_name, content=log_content
-        )
-
-        # Gửi chuỗi đã định dạng tới console chính
-        self.parent_runner.log_message_to_cmd(formatted_log, is_block=True)
+        if msg_type in ["NOTEBOOK_PRINT", "EXECUTION_ERROR"]:
+            # Ghi qua logger nền, luồng giao diện không phải chờ console
+            functions.log_notebook_output(msg_type, self.section_name, path, content, card.current_iteration)
+        else:
+            if msg_type == "ITERATION_END":
+                functions.log_iteration_end(self.section_name, path, content)
+            card.handle_log_message(msg_type, content)
 
     def setup_ui(self):
         main_layout = QVBoxLayout(self)
@@ -834,6 +1077,27 @@ class SectionWidget(QWidget):
         controls_layout.setContentsMargins(5, 10, 5, 5)
         controls_layout.setSpacing(8)
 
+        row0_layout = QHBoxLayout()
+        row0_layout.addWidget(QLabel("Số notebook chạy song song tối đa:"))
+        row0_layout.addStretch()
+        self.max_parallel_spin = CustomSpinBox()
+        self.max_parallel_spin.setObjectName("MaxParallelSpinBox")
+        self.max_parallel_spin.setRange(0, 99)
+        self.max_parallel_spin.setSpecialValueText("∞")
+        self.max_parallel_spin.setFixedWidth(40)
+        self.max_parallel_spin.setButtonSymbols(QSpinBox.ButtonSymbols.NoButtons)
+        self.max_parallel_spin.setAlignment(Qt.AlignmentFlag.AlignCenter)
+        self.max_parallel_spin.setToolTip("0 = không giới hạn (vẫn áp dụng giới hạn chung của ứng dụng)")
+        self.max_parallel_spin.valueChanged.connect(self.on_max_parallel_changed)
+        row0_layout.addWidget(self.max_parallel_spin)
+        self.limits_btn = QPushButton("Giới hạn")
+        self.limits_btn.setObjectName("LimitsButton")
+        self.limits_btn.setToolTip(f"Giới hạn tài nguyên cho mọi notebook trong section: {self.limits.describe()}")
+        self.limits_btn.setCursor(Qt.CursorShape.PointingHandCursor)
+        self.limits_btn.clicked.connect(self.edit_limits)
+        row0_layout.addWidget(self.limits_btn)
+        controls_layout.addLayout(row0_layout)
+
         row1_layout = QHBoxLayout()
         self.run_all_btn = QPushButton("Chạy Đồng Thời")
         self.run_all_btn.setObjectName("SectionRunButton")
@@ -847,6 +1111,13 @@ class SectionWidget(QWidget):
         row1_layout.addWidget(self.run_sequential_btn)
         controls_layout.addLayout(row1_layout)
 
+        self.run_dag_btn = QPushButton("Chạy Theo Phụ Thuộc")
+        self.run_dag_btn.setObjectName("SectionRunButton")
+        self.run_dag_btn.setCursor(Qt.CursorShape.PointingHandCursor)
+        self.run_dag_btn.setToolTip("Chạy theo metadata 'depends_on' của notebook: song song khi có thể, bỏ qua notebook phía sau khi có lỗi")
+        self.run_dag_btn.clicked.connect(self.run_all_dag)
+        controls_layout.addWidget(self.run_dag_btn)
+
         row2_layout = QHBoxLayout()
         self.stop_all_btn = QPushButton("Dừng Tất Cả")
         self.stop_all_btn.setObjectName("SectionStopButton")
@@ -892,22 +1163,57 @@ class SectionWidget(QWidget):
         card.stop_requested.connect(self.on_card_stop_requested)
         card.remove_requested.connect(self.on_card_remove_requested)
         card.execution_truly_finished.connect(self._on_sequential_notebook_finished)
+        card.execution_truly_finished.connect(self._on_dag_notebook_finished)
         card.execution_truly_finished.connect(self._cleanup_finished_process)
         self.cards_layout.addWidget(card)
         self.notebook_cards[path] = card
 
+    def edit_limits(self):
+        dialog = ResourceLimitsDialog(f"Giới hạn tài nguyên - {self.section_name}", self.limits, self)
+        if dialog.exec():
+            self.limits = dialog.limits()
+            self.limits_btn.setToolTip(f"Giới hạn tài nguyên cho mọi notebook trong section: {self.limits.describe()}")
+
+    def on_max_parallel_changed(self, value):
+        self.max_parallel = value
+        if self.parent_runner:
+            # Giới hạn mới có thể cho phép thêm notebook đang chờ được chạy
+            self.parent_runner.admission.pump()
+
+    def _admission_key(self, path):
+        return (self.section_id, path)
+
     def _cleanup_finished_process(self, path, success):
         if path in self.running_processes:
-            del self.running_processes[path]
+            proc_info = self.running_processes.pop(path)
+            if self.parent_runner:
+                self.parent_runner.log_dispatcher.unregister(proc_info["run_id"])
+                self.parent_runner.admission.release(self._admission_key(path))
         if not self.running_processes:
             self.stop_all_btn.setEnabled(True)
-            if not self.is_sequence_running:
-                self.run_all_btn.setEnabled(True)
-                self.run_sequential_btn.setEnabled(True)
+            if not self.is_sequence_running and self.dag_run is None:
+                self._set_run_buttons_enabled(True)
+
+    def _set_run_buttons_enabled(self, enabled):
+        self.run_all_btn.setEnabled(enabled)
+        self.run_sequential_btn.setEnabled(enabled)
+        self.run_dag_btn.setEnabled(enabled)
+
+    def _ordered_card_paths(self):
+        """Danh sách notebook theo thứ tự hiển thị trong section."""
+        paths = []
+        for i in range(self.cards_layout.count()):
+            item = self.cards_layout.itemAt(i)
+            if item is not None:
+                widget = item.widget()
+                if widget and isinstance(widget, SectionNotebookCard):
+                    paths.append(widget.path)
+        return paths
 
     def remove_notebook_card(self, path):
         if path in self.notebook_cards:
-            if path in self.running_processes:
+            is_queued = self.parent_runner and self.parent_runner.admission.is_queued(self._admission_key(path))
+            if path in self.running_processes or is_queued:
                 self.on_card_stop_requested(path)
             card = self.notebook_cards.pop(path)
             card.setParent(None)
@@ -917,8 +1223,10 @@ class SectionWidget(QWidget):
         self.run_notebook(card)
         if self.parent_runner:
             nb_name = os.path.basename(card.path)
-            mode_text = "Lặp lại hữu hạn" if card.execution_mode == "count" else "Lặp lại vô hạn"
-            count_text = f" (Số lần: {card.execution_count})" if mode_text == "Lặp lại hữu hạn" else ""
+            mode_text = functions.EXECUTION_MODE_LABELS.get(card.execution_mode, card.execution_mode)
+            count_text = f" (Số lần: {card.execution_count})" if card.execution_mode == "count" else ""
+            if card.execution_mode == "fanout":
+                count_text = f" (Số luồng: {card.fanout_workers})"
             self.parent_runner.log_message_to_cmd(
                 f"Bắt đầu thực thi '{nb_name}' tại section '{self.section_name}' ở chế độ '{mode_text}'{count_text}."
             )
@@ -929,25 +1237,53 @@ class SectionWidget(QWidget):
                 f"Đã gửi yêu cầu dừng notebook '{os.path.basename(path)}' tại section '{self.section_name}'."
             )
 
-        if path in self.running_processes:
-            proc_info = self.running_processes[path]
-            proc_info["stop_event"].set()
-            proc_info["process"].join(timeout=2.0)
-
-            if proc_info["process"].is_alive():
-                proc_info["process"].terminate()
-                if self.parent_runner:
-                    self.parent_runner.log_message_to_cmd(f"Buộc dừng: {os.path.basename(path)}")
-
+        if self.parent_runner and self.parent_runner.admission.cancel(self._admission_key(path)):
+            # Notebook còn trong hàng đợi, chưa có tiến trình nào để dừng
             card = self.notebook_cards.get(path)
             if card:
                 card.on_execution_finished(was_stopped_by_error=True)
+            return
+
+        if path in self.running_processes and self.parent_runner:
+            proc_info = self.running_processes[path]
+            if proc_info.get("stopping"):
+                return
+            proc_info["stopping"] = True
+            # Dừng trong luồng nền (ngắt kernel -> chờ -> terminate -> kill), giao diện không bị treo
+            self.parent_runner.process_stopper.stop(
+                proc_info["process"], proc_info["stop_event"], partial(self._on_process_stopped, path, proc_info["process"])
+            )
+
+    def _on_process_stopped(self, path, process, forced):
+        if forced and self.parent_runner:
+            self.parent_runner.log_message_to_cmd(f"Buộc dừng: {os.path.basename(path)}")
+        proc_info = self.running_processes.get(path)
+        if proc_info is None or proc_info["process"] is not process:
+            # Tiến trình đã tự báo EXECUTION_FINISHED và được dọn trước đó
+            return
+        card = self.notebook_cards.get(path)
+        if card:
+            card.on_execution_finished(was_stopped_by_error=True)
+        else:
+            self._cleanup_finished_process(path, False)
 
     def on_card_remove_requested(self, path):
         self.notebook_remove_requested.emit(self, [path])
 
     def run_notebook(self, card):
-        if self.parent_runner:
+        if not self.parent_runner or card.path in self.running_processes:
+            return
+        started = self.parent_runner.admission.request(
+            self._admission_key(card.path), self.section_id, self.max_parallel, partial(self._start_notebook_process, card)
+        )
+        if not started:
+            card.set_status("queued")
+            card.log_message_to_section("Đang chờ slot trống...")
+
+    def _start_notebook_process(self, card):
+        if card.current_status == "queued":
+            card.set_status("running")
+        try:
             functions.run_notebook_with_individual_logging(
                 card.path,
                 self.running_processes,
@@ -957,7 +1293,19 @@ class SectionWidget(QWidget):
                 card.execution_delay,
                 self.parent_runner.modules_path,
                 self.parent_runner.import_path,
+                self.parent_runner.log_dispatcher,
+                partial(self.handle_process_message, card.path),
+                force_run=card.force_run,
+                section_name=self.section_name,
+                parameters=card.parameters or None,
+                parameter_grid=card.parameter_grid,
+                limits=ResourceLimits.defaults().merged(self.limits).merged(card.limits),
+                fanout_workers=card.fanout_workers,
             )
+        except Exception as e:
+            self.parent_runner.admission.release(self._admission_key(card.path))
+            card.log_message_to_section(f"Không thể khởi động: {e}")
+            card.on_execution_finished(was_stopped_by_error=True)
 
     def run_all_simultaneously(self):
         if not self.notebook_cards:
@@ -965,7 +1313,7 @@ class SectionWidget(QWidget):
         if self.parent_runner:
             self.parent_runner.log_message_to_cmd(f"[{self.section_name}] Bắt đầu chạy đồng thời...")
         for card in self.notebook_cards.values():
-            if card.path not in self.running_processes:
+            if card.path not in self.running_processes and card.current_status != "queued":
                 card.run_notebook()
 
     def run_all_sequential_wrapper(self):
@@ -979,16 +1327,9 @@ class SectionWidget(QWidget):
             return
 
         self.is_sequence_running = True
-        self.run_all_btn.setEnabled(False)
-        self.run_sequential_btn.setEnabled(False)
+        self._set_run_buttons_enabled(False)
 
-        self.sequential_queue.clear()
-        for i in range(self.cards_layout.count()):
-            item = self.cards_layout.itemAt(i)
-            if item is not None:
-                widget = item.widget()
-                if widget and isinstance(widget, SectionNotebookCard):
-                    self.sequential_queue.append(widget.path)
+        self.sequential_queue = self._ordered_card_paths()
 
         if self.parent_runner:
             self.parent_runner.log_message_to_cmd(f"[{self.section_name}] Bắt đầu chạy lần lượt...")
@@ -1013,13 +1354,14 @@ class SectionWidget(QWidget):
                 self._run_next_in_sequence()
                 return
             card.run_notebook()
-            if card.execution_mode == "continuous":
+            if card.execution_mode in functions.CONTINUOUS_MODES:
                 if self.parent_runner:
                     nb_name = os.path.basename(card.path)
                     self.parent_runner.log_message_to_cmd(
-                        f"[{self.section_name}] Tuần tự: Đã bắt đầu '{nb_name}' (liên tục). Sẽ chạy notebook tiếp theo sau 60 giây."
+                        f"[{self.section_name}] Tuần tự: Đã bắt đầu '{nb_name}' (liên tục). "
+                        f"Sẽ chạy notebook tiếp theo sau {config.SEQUENTIAL_CONTINUOUS_DELAY} giây."
                     )
-                QTimer.singleShot(60000, self._run_next_in_sequence)
+                QTimer.singleShot(config.SEQUENTIAL_CONTINUOUS_DELAY * 1000, self._run_next_in_sequence)
         else:
             self._run_next_in_sequence()
 
@@ -1027,7 +1369,7 @@ class SectionWidget(QWidget):
         if not self.is_sequence_running:
             return
         card = self.notebook_cards.get(path)
-        if card and card.execution_mode == "continuous":
+        if card and card.execution_mode in functions.CONTINUOUS_MODES:
             return
         nb_name = os.path.basename(path)
         status_text = "thành công" if success else "thất bại"
@@ -1035,6 +1377,13 @@ class SectionWidget(QWidget):
             self.parent_runner.log_message_to_cmd(f"[{self.section_name}] Tuần tự: '{nb_name}' hoàn thành {status_text}.")
         if success:
             self._run_next_in_sequence()
+        elif card and card.last_limit:
+            # Vượt giới hạn tài nguyên không phải lỗi của notebook, các notebook sau vẫn được chạy
+            if self.parent_runner:
+                self.parent_runner.log_message_to_cmd(
+                    f"[{self.section_name}] Tuần tự: '{nb_name}' vượt giới hạn tài nguyên, tiếp tục notebook tiếp theo."
+                )
+            self._run_next_in_sequence()
         else:
             if self.parent_runner:
                 self.parent_runner.log_message_to_cmd(f"[{self.section_name}] Dừng chạy lần lượt do có lỗi.")
@@ -1043,23 +1392,117 @@ class SectionWidget(QWidget):
     def _stop_sequential_run(self):
         self.is_sequence_running = False
         self.sequential_queue.clear()
-        self.run_all_btn.setEnabled(True)
-        self.run_sequential_btn.setEnabled(True)
+        self._set_run_buttons_enabled(True)
+
+    def run_all_dag(self):
+        if self.is_sequence_running or self.dag_run is not None:
+            if self.parent_runner:
+                self.parent_runner.log_message_to_cmd(f"[{self.section_name}] Một chuỗi chạy khác đã đang chạy.")
+            return
+        if not self.notebook_cards:
+            if self.parent_runner:
+                self.parent_runner.log_message_to_cmd(f"[{self.section_name}] Không có notebook nào để chạy.")
+            return
+        if self.running_processes:
+            if self.parent_runner:
+                self.parent_runner.log_message_to_cmd(
+                    f"[{self.section_name}] Hãy dừng các notebook đang chạy trước khi chạy theo phụ thuộc."
+                )
+            return
+
+        dependencies, warnings = dag.build_dependencies(self._ordered_card_paths())
+        for warning in warnings:
+            if self.parent_runner:
+                self.parent_runner.log_message_to_cmd(f"[{self.section_name}] Cảnh báo: {warning}")
+        try:
+            self.dag_run = dag.DagRun(dependencies)
+        except ValueError as e:
+            if self.parent_runner:
+                self.parent_runner.log_message_to_cmd(f"[{self.section_name}] Không thể chạy theo phụ thuộc: {e}")
+            return
+
+        self._set_run_buttons_enabled(False)
+        if self.parent_runner:
+            self.parent_runner.log_message_to_cmd(f"[{self.section_name}] Bắt đầu chạy theo phụ thuộc...")
+        self._start_ready_dag_nodes()
+
+    def _start_ready_dag_nodes(self):
+        if self.dag_run is None:
+            return
+        ready = self.dag_run.claim_ready_nodes()
+        cards = {path: self.notebook_cards.get(path) for path in ready}
+        # Notebook đã bị gỡ khỏi section được tính là lỗi trước, sau đó mới khởi động các notebook còn lại;
+        # lần gọi lồng nhau từ _on_dag_node_done chỉ nhận các node mới sẵn sàng
+        for path in [path for path, card in cards.items() if card is None]:
+            self._on_dag_node_done(path, False)
+        for path, card in cards.items():
+            if card is None or self.dag_run is None or self.dag_run.state.get(path) != "running":
+                continue
+            card.run_notebook()
+            if card.execution_mode in functions.CONTINUOUS_MODES:
+                # Notebook chạy liên tục không bao giờ kết thúc, coi là xong sau một khoảng chờ như khi chạy lần lượt
+                if self.parent_runner:
+                    self.parent_runner.log_message_to_cmd(
+                        f"[{self.section_name}] Phụ thuộc: Đã bắt đầu '{os.path.basename(path)}' (liên tục). "
+                        f"Notebook phụ thuộc vào nó sẽ chạy sau {config.SEQUENTIAL_CONTINUOUS_DELAY} giây."
+                    )
+                QTimer.singleShot(config.SEQUENTIAL_CONTINUOUS_DELAY * 1000, partial(self._on_dag_node_done, path, True))
+
+    def _on_dag_notebook_finished(self, path, success):
+        if self.dag_run is None:
+            return
+        card = self.notebook_cards.get(path)
+        if card and card.execution_mode in functions.CONTINUOUS_MODES:
+            return
+        self._on_dag_node_done(path, success)
+
+    def _on_dag_node_done(self, path, success):
+        if self.dag_run is None or self.dag_run.state.get(path) != "running":
+            return
+        skipped = self.dag_run.mark_finished(path, success)
+        for skipped_path in skipped:
+            card = self.notebook_cards.get(skipped_path)
+            if card:
+                card.set_status("skipped", f"'{os.path.basename(path)}' lỗi")
+        if self.parent_runner:
+            card = self.notebook_cards.get(path)
+            status_text = "thành công" if success else ("vượt giới hạn tài nguyên" if card and card.last_limit else "thất bại")
+            skipped_text = f", bỏ qua {len(skipped)} notebook phía sau" if skipped else ""
+            self.parent_runner.log_message_to_cmd(
+                f"[{self.section_name}] Phụ thuộc: '{os.path.basename(path)}' hoàn thành {status_text}{skipped_text}."
+            )
+
+        if self.dag_run.is_finished:
+            if self.parent_runner:
+                self.parent_runner.log_message_to_cmd(
+                    f"[{self.section_name}] Đã hoàn thành chạy theo phụ thuộc. {self.dag_run.report()}"
+                )
+            self._stop_dag_run()
+        else:
+            self._start_ready_dag_nodes()
+
+    def _stop_dag_run(self):
+        self.dag_run = None
+        if not self.running_processes:
+            self._set_run_buttons_enabled(True)
 
     def stop_all_notebooks(self):
-        was_sequence_running = self.is_sequence_running
-        if was_sequence_running:
+        was_sequence_running = self.is_sequence_running or self.dag_run is not None
+        if self.is_sequence_running:
             if self.parent_runner:
                 self.parent_runner.log_message_to_cmd(f"[{self.section_name}] Đã dừng chuỗi chạy lần lượt.")
             self._stop_sequential_run()
+        if self.dag_run is not None:
+            if self.parent_runner:
+                self.parent_runner.log_message_to_cmd(f"[{self.section_name}] Đã dừng chuỗi chạy theo phụ thuộc.")
+            self._stop_dag_run()
 
-        running_cards = [card for card in self.notebook_cards.values() if card.current_status == "running"]
+        running_cards = [card for card in self.notebook_cards.values() if card.current_status in ["running", "queued"]]
         if not running_cards:
             return
 
         self.stop_all_btn.setEnabled(False)
-        self.run_all_btn.setEnabled(False)
-        self.run_sequential_btn.setEnabled(False)
+        self._set_run_buttons_enabled(False)
         QApplication.processEvents()
 
         if self.parent_runner and not was_sequence_running:
@@ -1090,6 +1533,4 @@ class SectionWidget(QWidget):
         self.section_close_requested.emit(self)
 
     def cleanup(self):
-        if hasattr(self, "queue_checker_timer"):
-            self.queue_checker_timer.stop()
         self.stop_all_notebooks()
@@ -0,0 +1,46 @@
+from admission import AdmissionController
+
+
+def _controller(max_global=2):
+    # Tắt kiểm tra CPU/RAM để kết quả không phụ thuộc máy chạy test
+    return AdmissionController(max_global=max_global, max_cpu_percent=0, max_memory_percent=0)
+
+
+def test_global_limit_queues_fifo():
+    controller, started = _controller(max_global=2), []
+    for key in "abc":
+        controller.request(key, "S", 0, lambda key=key: started.append(key))
+    assert started == ["a", "b"]
+    assert controller.is_queued("c")
+    controller.release("a")
+    assert started == ["a", "b", "c"]
+    assert controller.waiting_count == 0
+
+
+def test_section_limit_does_not_block_other_sections():
+    controller, started = _controller(max_global=0), []
+    assert controller.request("a1", "A", 1, lambda: started.append("a1"))
+    assert not controller.request("a2", "A", 1, lambda: started.append("a2"))
+    assert controller.request("b1", "B", 1, lambda: started.append("b1"))
+    assert started == ["a1", "b1"]
+    assert controller.counts_by_section() == {"A": (1, 1), "B": (1, 0)}
+    controller.release("a1")
+    assert started == ["a1", "b1", "a2"]
+
+
+def test_duplicate_request_and_cancel():
+    controller, started = _controller(max_global=1), []
+    assert controller.request("a", "S", 0, lambda: started.append("a"))
+    assert controller.request("a", "S", 0, lambda: started.append("a-again"))
+    assert not controller.request("b", "S", 0, lambda: started.append("b"))
+    assert controller.cancel("b")
+    assert not controller.cancel("b")
+    controller.release("a")
+    assert started == ["a"]
+    assert controller.running_count == 0
+
+
+def test_release_of_unknown_key_is_ignored():
+    controller = _controller()
+    controller.release("missing")
+    assert controller.running_count == 0
@@ -0,0 +1,127 @@
+import nbformat
+
+import config
+from cell_cache import HELPER_NAME, analyze_cell, apply_cell_cache
+from cell_profiling import mark_cell_positions
+
+
+def test_reads_and_writes_at_module_level():
+    reads, writes = analyze_cell("total = df['a'].sum() * rate\nlabel = str(total)")
+    assert reads == ["df", "rate"]
+    assert writes == ["total", "label"]
+
+
+def test_name_assigned_before_use_is_not_a_read():
+    reads, writes = analyze_cell("x = 1\ny = x + 1")
+    assert reads == []
+    assert writes == ["x", "y"]
+
+
+def test_builtins_are_not_reads():
+    reads, _ = analyze_cell("n = len(items) + max(1, 2)")
+    assert reads == ["items"]
+
+
+def test_in_place_mutation_is_read_and_write():
+    reads, writes = analyze_cell("df['b'] = 1\nobj.attr = 2")
+    assert reads == ["df", "obj"]
+    assert writes == ["df", "obj"]
+
+
+def test_aug_assign_reads_previous_value():
+    reads, writes = analyze_cell("counter += 1")
+    assert reads == ["counter"]
+    assert writes == ["counter"]
+
+
+def test_imports_are_writes():
+    reads, writes = analyze_cell("import pandas as pd\nimport os.path\nfrom math import sqrt")
+    assert reads == []
+    assert writes == ["pd", "os", "sqrt"]
+
+
+def test_globals_read_in_lambda_are_reads():
+    reads, writes = analyze_cell("out = df.apply(lambda r: r * rate)")
+    assert reads == ["df", "rate"]
+    assert writes == ["out"]
+
+
+def test_globals_read_in_nested_scopes_are_reads():
+    source = (
+        "def f(x, k=scale):\n"
+        "    def g(y):\n"
+        "        return y + x + offset\n"
+        "    return g(k) * rate\n"
+        "class C(Base):\n"
+        "    level = factor\n"
+        "    def m(self):\n"
+        "        return self.level * mult\n"
+        "res = f(1)"
+    )
+    reads, writes = analyze_cell(source)
+    # Tham số và biến cục bộ (x, y, k, g, self, level) không phải biến của notebook
+    assert sorted(reads) == ["Base", "factor", "mult", "offset", "rate", "scale"]
+    assert writes == ["f", "C", "res"]
+
+
+def test_global_declaration_in_function_is_a_write():
+    reads, writes = analyze_cell("def bump():\n    global counter\n    counter += 1\nbump()")
+    assert reads == ["counter"]
+    assert writes == ["bump", "counter"]
+
+
+def test_comprehension_variables_are_local():
+    reads, writes = analyze_cell("total = {k: v * rate for k, v in d.items() if v > lim}\nys = [y for xs in rows for y in xs]")
+    assert reads == ["d", "rate", "lim", "rows"]
+    assert writes == ["total", "ys"]
+
+
+def test_magic_cell_is_not_cacheable():
+    assert analyze_cell("%matplotlib inline\nx = 1") is None
+
+
+def _notebook(*cells):
+    return nbformat.v4.new_notebook(cells=list(cells))
+
+
+def test_apply_cell_cache_wraps_tagged_cells_only():
+    tagged = nbformat.v4.new_code_cell("df = load(path)", metadata={"tags": [config.CELL_CACHE_TAG]})
+    plain = nbformat.v4.new_code_cell("print(df)")
+    nb, skipped = apply_cell_cache(_notebook(tagged, plain), "ctx", cache_dir="/tmp/cache", max_mb=1)
+
+    assert skipped == []
+    assert nb.cells[0].metadata[config.NOTEBOOK_METADATA_KEY]["internal"] is True
+    assert nb.cells[1].source.startswith(f"{HELPER_NAME}.run(")
+    assert "['load', 'path']" in nb.cells[1].source
+    assert nb.cells[2].source == "print(df)"
+    # Notebook gốc không bị sửa
+    assert tagged.source == "df = load(path)"
+
+
+def test_apply_cell_cache_skips_uncacheable_cells():
+    tagged = nbformat.v4.new_code_cell("!pip list", metadata={"tags": [config.CELL_CACHE_TAG]})
+    source_nb = _notebook(tagged)
+    nb, skipped = apply_cell_cache(source_nb, "ctx", cache_dir="/tmp/cache", max_mb=1)
+    assert skipped == [1]
+    assert len(nb.cells) == 1
+    assert nb.cells[0].source == "!pip list"
+
+
+def test_notebook_without_tagged_cells_is_returned_unchanged():
+    source_nb = _notebook(nbformat.v4.new_code_cell("x = 1"))
+    nb, skipped = apply_cell_cache(source_nb, "ctx")
+    assert nb is source_nb
+    assert skipped == []
+
+
+def test_skipped_cells_are_numbered_as_in_the_source_notebook():
+    cells = [
+        nbformat.v4.new_code_cell("x = 1"),
+        nbformat.v4.new_code_cell("y = 2", metadata={"tags": [config.CELL_CACHE_TAG]}),
+        nbformat.v4.new_code_cell("%time z = 3", metadata={"tags": [config.CELL_CACHE_TAG]}),
+    ]
+    source_nb = mark_cell_positions(_notebook(*cells))
+    # Phần sau của notebook đã bị tách (vd: phần theo tham số của fan-out)
+    tail = _notebook(*source_nb.cells[1:])
+    _, skipped = apply_cell_cache(tail, "ctx", cache_dir="/tmp/cache", max_mb=1)
+    assert skipped == [3]
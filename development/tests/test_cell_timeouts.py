@@ -0,0 +1,96 @@
+import time
+
+import nbformat
+import pytest
+
+import config
+from cell_timeouts import CellTimeoutPolicy, cell_history_key, cell_timeout_override, invalid_cell_timeouts
+from run_history import RunHistory, percentile
+
+
+def _cell(source="x = 1", cell_id="c1", timeout=None, tags=None, position=0):
+    cell = nbformat.v4.new_code_cell(source)
+    cell.id = cell_id
+    metadata = {"position": position}
+    if timeout is not None:
+        metadata["timeout"] = timeout
+    cell.metadata[config.NOTEBOOK_METADATA_KEY] = metadata
+    if tags:
+        cell.metadata["tags"] = tags
+    return cell
+
+
+def test_percentile_nearest_rank():
+    values = list(range(1, 101))
+    assert percentile(values, 0.99) == 99
+    assert percentile(values, 0.5) == 50
+    assert percentile([7], 0.99) == 7
+    assert percentile([], 0.99) is None
+
+
+@pytest.mark.parametrize("value, expected", [(120, 120.0), (0.5, 0.5), (0, None), (-1, None), ("60", None), (True, None)])
+def test_cell_timeout_override(value, expected):
+    assert cell_timeout_override(_cell(timeout=value)) == expected
+
+
+def test_invalid_cell_timeouts_lists_bad_cells():
+    nb = nbformat.v4.new_notebook(cells=[_cell("a = 1", timeout=10), _cell("b = 2", cell_id="c2", timeout="x", position=1)])
+    assert invalid_cell_timeouts(nb) == ["[2] b = 2"]
+
+
+def test_policy_precedence(monkeypatch):
+    monkeypatch.setattr(config, "ADAPTIVE_TIMEOUT_MIN_SECONDS", 30)
+    policy = CellTimeoutPolicy(3600, 3, lambda: {"c1": 20.0, "c2": 2.0, "c3": 5000.0})
+    # Metadata của cell được ưu tiên hơn timeout thích ứng
+    assert policy.timeout_for(_cell(cell_id="c1", timeout=5)) == (5.0, "cell")
+    assert policy.timeout_for(_cell(cell_id="c1")) == (60.0, "adaptive")
+    # Không nhỏ hơn ngưỡng tối thiểu, không lớn hơn timeout mặc định
+    assert policy.timeout_for(_cell(cell_id="c2")) == (30, "adaptive")
+    assert policy.timeout_for(_cell(cell_id="c3")) == (3600, "adaptive")
+    # Cell chưa có lịch sử và cell cache dùng timeout mặc định
+    assert policy.timeout_for(_cell(cell_id="new")) == (3600, "default")
+    assert policy.timeout_for(_cell(cell_id="c1", tags=[config.CELL_CACHE_TAG])) == (3600, "default")
+
+
+def test_policy_without_history_is_not_adaptive():
+    policy = CellTimeoutPolicy(100, 3, None)
+    assert policy.adaptive_factor == 0
+    assert policy.timeout_for(_cell()) == (100, "default")
+
+
+def test_policy_keeps_old_percentiles_when_reload_fails(monkeypatch):
+    calls = []
+
+    def load():
+        calls.append(1)
+        if len(calls) > 1:
+            raise RuntimeError("db locked")
+        return {"c1": 100.0}
+
+    monkeypatch.setattr(config, "ADAPTIVE_TIMEOUT_REFRESH", 0)
+    policy = CellTimeoutPolicy(3600, 2, load)
+    assert policy.refresh() == 1
+    assert policy.timeout_for(_cell(cell_id="c1")) == (200.0, "adaptive")
+    assert len(calls) == 2
+
+
+def test_history_percentiles_use_recent_successful_runs(tmp_path):
+    history = RunHistory(str(tmp_path / "history.db"))
+    try:
+        now = time.time()
+        for i in range(30):
+            cells = [
+                {"cell_id": "c1", "label": "[1] a", "wall": float(i + 1), "cpu": None, "rss_delta_mb": None},
+                {"cell_id": "", "label": "[2] b", "wall": 2.0, "cpu": None, "rss_delta_mb": None},
+            ]
+            history.record_iteration("/nb.ipynb", "S", "count", i, now + i, now + i + 1, True, cells=cells)
+        # Lần lỗi và notebook khác không được tính
+        slow = [{"cell_id": "c1", "label": "[1] a", "wall": 9999.0, "cpu": None, "rss_delta_mb": None}]
+        history.record_iteration("/nb.ipynb", "S", "count", 99, now + 99, now + 100, False, cells=slow)
+        history.record_iteration("/other.ipynb", "S", "count", 1, now, now + 1, True, cells=slow)
+
+        percentiles = history.cell_duration_percentiles("/nb.ipynb", 0.99, last_iterations=20, min_samples=20)
+        assert percentiles == {"c1": 30.0, cell_history_key("", "[2] b"): 2.0}
+        assert history.cell_duration_percentiles("/nb.ipynb", 0.99, last_iterations=10, min_samples=20) == {}
+    finally:
+        history.close()
@@ -0,0 +1,77 @@
+import pytest
+
+import dag
+from dag import DagRun, build_dependencies
+
+
+def test_build_dependencies_matches_by_file_name(monkeypatch):
+    declared = {"/nb/b.ipynb": ["a.ipynb"], "/nb/c.ipynb": ["other/b.ipynb", "missing.ipynb", "c.ipynb"]}
+    monkeypatch.setattr(dag, "read_notebook_dependencies", lambda path: declared.get(path, []))
+    paths = ["/nb/a.ipynb", "/nb/b.ipynb", "/nb/c.ipynb"]
+    dependencies, warnings = build_dependencies(paths, {"/nb/a.ipynb": []})
+
+    assert dependencies == {"/nb/a.ipynb": set(), "/nb/b.ipynb": {"/nb/a.ipynb"}, "/nb/c.ipynb": {"/nb/b.ipynb"}}
+    assert len(warnings) == 1
+    assert "missing.ipynb" in warnings[0]
+
+
+def test_cycle_is_rejected():
+    with pytest.raises(ValueError, match="a, b"):
+        DagRun({"a": {"b"}, "b": {"a"}, "c": set()})
+
+
+def test_ready_nodes_follow_dependencies():
+    run = DagRun({"a": set(), "b": {"a"}, "c": set(), "d": {"b", "c"}})
+    assert run.ready_nodes() == ["a", "c"]
+    run.mark_started("a")
+    run.mark_started("c")
+    run.mark_finished("a", True)
+    assert run.ready_nodes() == ["b"]
+    run.mark_started("b")
+    run.mark_finished("b", True)
+    assert run.ready_nodes() == []
+    run.mark_finished("c", True)
+    assert run.ready_nodes() == ["d"]
+
+
+
+def test_nested_claims_never_start_a_node_twice():
+    # Mô phỏng _start_ready_dag_nodes: node "a" thiếu notebook nên lỗi ngay và kích hoạt lượt lồng nhau
+    run = DagRun({"a": set(), "b": set(), "c": set(), "d": {"b"}})
+    started = []
+
+    def start_ready():
+        claimed = run.claim_ready_nodes()
+        for node in [node for node in claimed if node == "a"]:
+            run.mark_finished(node, False)
+            start_ready()
+        for node in claimed:
+            if node != "a" and run.state[node] == "running":
+                started.append(node)
+                if node == "b":
+                    run.mark_finished(node, True)
+                    start_ready()
+
+    start_ready()
+    assert sorted(started) == ["b", "c", "d"]
+    assert run.claim_ready_nodes() == []
+
+def test_failure_skips_all_transitive_dependents():
+    run = DagRun({"a": set(), "b": {"a"}, "c": {"b"}, "d": set()})
+    run.mark_started("a")
+    assert sorted(run.mark_finished("a", False)) == ["b", "c"]
+    assert run.state == {"a": "failed", "b": "skipped", "c": "skipped", "d": "pending"}
+    assert not run.is_finished
+    run.mark_started("d")
+    run.mark_finished("d", True)
+    assert run.is_finished
+    assert run.summary() == {"failed": 1, "skipped": 2, "success": 1}
+
+
+def test_critical_path_uses_longest_chain():
+    run = DagRun({"a": set(), "b": set(), "c": {"a", "b"}, "d": {"b"}})
+    for node in run.order:
+        run.mark_started(node)
+        run.mark_finished(node, True)
+    run.durations = {"a": 5.0, "b": 1.0, "c": 2.0, "d": 3.0}
+    assert run.critical_path() == (["a", "c"], 7.0)
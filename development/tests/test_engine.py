@@ -0,0 +1,166 @@
+import threading
+
+import nbformat
+import pytest
+
+import config
+from cell_cache import HELPER_NAME
+from cell_profiling import mark_cell_positions
+from engine import _execute_notebook_process, split_loop_cells, untagged_loop_cells
+
+
+def _notebook(*cells):
+    nb = nbformat.v4.new_notebook()
+    for source, tags in cells:
+        if tags is None:
+            nb.cells.append(nbformat.v4.new_markdown_cell(source))
+        else:
+            nb.cells.append(nbformat.v4.new_code_cell(source, metadata={"tags": tags}))
+    return mark_cell_positions(nb)
+
+
+def _sources(nb):
+    return [cell.source for cell in nb.cells]
+
+
+def test_setup_is_only_cells_before_first_loop_cell():
+    nb = _notebook(
+        ("# Tiêu đề", None),
+        ("import pandas", []),
+        ("data = fetch()", [config.LOOP_CELL_TAG]),
+        ("summary = data.describe()", []),
+        ("save(data)", [config.LOOP_CELL_TAG]),
+        ("export(summary)", []),
+    )
+    setup_nb, loop_nb = split_loop_cells(nb)
+    assert _sources(setup_nb) == ["import pandas"]
+    # Cell không gắn tag phía sau vẫn chạy mỗi lần lặp, đúng thứ tự trong notebook
+    assert _sources(loop_nb) == ["data = fetch()", "summary = data.describe()", "save(data)", "export(summary)"]
+    assert untagged_loop_cells(loop_nb) == [4, 6]
+
+
+def test_without_loop_cells_everything_repeats():
+    setup_nb, loop_nb = split_loop_cells(_notebook(("a = 1", []), ("b = 2", [])))
+    assert setup_nb.cells == []
+    assert _sources(loop_nb) == ["a = 1", "b = 2"]
+
+
+def test_first_cell_tagged_loop_has_no_setup():
+    setup_nb, loop_nb = split_loop_cells(_notebook(("a = 1", [config.LOOP_CELL_TAG]), ("b = 2", [])))
+    assert setup_nb.cells == []
+    assert _sources(loop_nb) == ["a = 1", "b = 2"]
+
+
+class _ListQueue(list):
+    def put(self, message):
+        self.append(message)
+
+
+def test_result_cache_is_checked_only_on_first_iteration(tmp_path, monkeypatch):
+    pytest.importorskip("ipykernel")
+    monkeypatch.setattr(config, "CACHE_DIR", str(tmp_path / "cache"))
+    monkeypatch.setattr(config, "HISTORY_ENABLED", False)
+    monkeypatch.setattr(config, "KERNEL_PRELOAD_MODULES", [])
+    (tmp_path / "data.txt").write_text("1")
+    nb = nbformat.v4.new_notebook(cells=[nbformat.v4.new_code_cell("print('ran')")])
+    nb.metadata[config.NOTEBOOK_METADATA_KEY] = {"inputs": ["data.txt"]}
+    path = str(tmp_path / "nb.ipynb")
+    nbformat.write(nb, path)
+
+    def run(count):
+        log = _ListQueue()
+        _execute_notebook_process(path, log, threading.Event(), "count", count, 0, str(tmp_path), str(tmp_path))
+        hits = [m for m in log if m[0] == "SECTION_LOG" and "dùng kết quả cache" in m[1]]
+        outputs = [m for m in log if m[0] == "NOTEBOOK_PRINT" and "ran" in m[1]]
+        return hits, outputs, log[-1]
+
+    hits, outputs, finished = run(1)
+    assert hits == [] and len(outputs) == 1 and finished == ("EXECUTION_FINISHED", True)
+    # Lần chạy sau: chỉ lần lặp đầu được phát lại từ cache, các lần lặp còn lại chạy thật
+    hits, outputs, finished = run(3)
+    assert len(hits) == 1
+    assert len(outputs) == 3
+    assert finished == ("EXECUTION_FINISHED", True)
+
+
+def test_saved_fanout_notebooks_keep_outputs_on_their_cells(tmp_path, monkeypatch):
+    pytest.importorskip("ipykernel")
+    monkeypatch.setattr(config, "CACHE_DIR", str(tmp_path / "cache"))
+    monkeypatch.setattr(config, "FANOUT_OUTPUT_DIR", str(tmp_path / "runs"))
+    monkeypatch.setattr(config, "HISTORY_ENABLED", False)
+    monkeypatch.setattr(config, "KERNEL_PRELOAD_MODULES", [])
+    cached = {"tags": [config.CELL_CACHE_TAG]}
+    nb = nbformat.v4.new_notebook(
+        cells=[
+            nbformat.v4.new_code_cell("a = 'A'\nprint('setup')", metadata=cached),
+            nbformat.v4.new_code_cell("k = 0", metadata={"tags": ["parameters"]}),
+            nbformat.v4.new_code_cell("b = k * 10\nprint('tail', b)", metadata=cached),
+            nbformat.v4.new_code_cell("print('plain', a, k)"),
+        ]
+    )
+    path = str(tmp_path / "nb.ipynb")
+    nbformat.write(nb, path)
+
+    log = _ListQueue()
+    _execute_notebook_process(
+        path, log, threading.Event(), "fanout", 1, 0, str(tmp_path), str(tmp_path), parameter_grid={"k": [1, 2]}
+    )
+    assert log[-1] == ("EXECUTION_FINISHED", True)
+
+    saved = sorted((tmp_path / "runs" / "nb").glob("*/*.ipynb"))
+    assert len(saved) == 2
+    for k, saved_path in zip([1, 2], saved):
+        result = nbformat.read(str(saved_path), as_version=4)
+        texts = {
+            cell.source.splitlines()[0]: "".join(out.get("text", "") for out in cell.outputs)
+            for cell in result.cells
+            if cell.cell_type == "code"
+        }
+        # Notebook kết quả chứa mã gốc, không có cell nội bộ của cache
+        assert all(HELPER_NAME not in cell.source for cell in result.cells)
+        assert texts["b = k * 10"] == f"tail {k * 10}\n"
+        assert texts["print('plain', a, k)"] == f"plain A {k}\n"
+        assert texts["k = 0"] == ""
+
+
+class _StopAfterIterations(_ListQueue):
+    def __init__(self, stop_event, iterations):
+        super().__init__()
+        self.stop_event, self.iterations = stop_event, iterations
+
+    def put(self, message):
+        super().put(message)
+        if message[0] == "ITERATION_END" and len(self.iteration_ends()) >= self.iterations:
+            self.stop_event.set()
+
+    def iteration_ends(self):
+        return [content for msg_type, content in self if msg_type == "ITERATION_END"]
+
+
+@pytest.mark.parametrize("mode", ["persistent", "count"])
+def test_iterations_reuse_the_warm_kernel_client(tmp_path, monkeypatch, mode):
+    pytest.importorskip("ipykernel")
+    from jupyter_client.manager import KernelManager
+
+    monkeypatch.setattr(config, "HISTORY_ENABLED", False)
+    monkeypatch.setattr(config, "KERNEL_PRELOAD_MODULES", [])
+    monkeypatch.setattr(config, "KERNEL_MAX_RUNS", 0)
+    new_clients = []
+    original_client = KernelManager.client
+    monkeypatch.setattr(KernelManager, "client", lambda self, **kw: new_clients.append(1) or original_client(self, **kw))
+    nb = nbformat.v4.new_notebook(
+        cells=[nbformat.v4.new_code_cell("x = 1"), nbformat.v4.new_code_cell("pass", metadata={"tags": [config.LOOP_CELL_TAG]})]
+    )
+    path = str(tmp_path / "nb.ipynb")
+    nbformat.write(nb, path)
+
+    stop_event = threading.Event()
+    log = _StopAfterIterations(stop_event, 6)
+    _execute_notebook_process(path, log, stop_event, mode, 6, 0, str(tmp_path), str(tmp_path))
+
+    ends = log.iteration_ends()
+    assert len(ends) == 6 and all(end["success"] for end in ends)
+    # Chỉ một kernel client (lúc khởi động kernel), các lần lặp sau không mở kênh mới
+    assert new_clients == [1]
+    warm = sorted(end["duration"] for end in ends[1:])
+    assert warm[len(warm) // 2] < 0.3
@@ -0,0 +1,110 @@
+import os
+import threading
+
+import pytest
+
+import kernel_pool
+from kernel_pool import KernelPool
+
+
+class _FakeKernel:
+    def __init__(self, key, kernel_name, cwd, fingerprint):
+        self.key, self.kernel_name, self.cwd, self.fingerprint = key, kernel_name, cwd, fingerprint
+        self.run_count = 0
+        self.alive = True
+
+    def is_alive(self):
+        return self.alive
+
+    def rss_mb(self):
+        return None
+
+    def run_code(self, code, timeout=None):
+        pass
+
+    def shutdown(self):
+        self.alive = False
+
+
+class _FakePool(KernelPool):
+    """Pool với kernel giả; mỗi lần khởi động chờ `release` để kiểm tra việc không chặn."""
+
+    def __init__(self, fail=False, **kw):
+        super().__init__(watch_dirs=(), **kw)
+        self.release = threading.Event()
+        self.started = []
+        self.fail = fail
+
+    def _start_kernel(self, kernel_name, cwd, fingerprint):
+        self.release.wait(5)
+        if self.fail:
+            raise RuntimeError("kernel died")
+        kernel = _FakeKernel(self.make_key(kernel_name, cwd), kernel_name, cwd, fingerprint)
+        self.started.append(kernel)
+        return kernel
+
+
+def _kernel(pool):
+    return _FakeKernel(pool.make_key("python3", "/tmp"), "python3", "/tmp", kernel_pool.collect_source_fingerprint([]))
+
+
+def test_restart_on_checkin_does_not_block_and_checkout_waits_for_it():
+    pool = _FakePool(max_idle=1, max_runs=1, reset_namespace=False)
+    old = _kernel(pool)
+    pool.checkin(old)
+    # checkin trả về ngay trong khi kernel thay thế còn đang khởi động
+    assert not old.alive
+    assert pool.started == []
+
+    pool.release.set()
+    kernel = pool.checkout("python3", "/tmp")
+    assert pool.started == [kernel]
+    pool.shutdown()
+
+
+def test_failed_restart_is_reported_and_next_checkout_starts_a_kernel():
+    events = []
+    pool = _FakePool(fail=True, max_idle=1, max_runs=1, reset_namespace=False, on_event=events.append)
+    pool.checkin(_kernel(pool))
+    pool.release.set()
+    for thread in list(pool._starting.values()):
+        thread.join(5)
+    assert events[-1] == "Không khởi động sẵn được kernel: kernel died"
+
+    pool.fail = False
+    assert pool.checkout("python3", "/tmp") is pool.started[0]
+    pool.shutdown()
+
+
+def test_kernel_started_after_shutdown_is_not_kept():
+    pool = _FakePool(max_idle=1, max_runs=1, reset_namespace=False)
+    pool.checkin(_kernel(pool))
+    threading.Timer(0.05, pool.release.set).start()
+    pool.shutdown()
+    assert len(pool.started) == 1 and not pool.started[0].alive
+
+
+def test_pooled_kernel_reuses_its_client():
+    pytest.importorskip("ipykernel")
+    psutil = pytest.importorskip("psutil")
+    pool = KernelPool(warmup_code="x = 1", max_idle=1, reset_namespace=True)
+    kernel = pool.checkout("", os.getcwd())
+    try:
+        kc = kernel.kc
+        new_clients = []
+        original_client = kernel.km.client
+        kernel.km.client = lambda *a, **kw: new_clients.append(1) or original_client(*a, **kw)
+        process = psutil.Process()
+        kernel.run_code("pass")
+        fds, threads = process.num_fds(), process.num_threads()
+        for _ in range(10):
+            kernel.run_code("pass")
+        pool.checkin(kernel)
+        assert pool.checkout("", os.getcwd()) is kernel
+        assert new_clients == []
+        assert kernel.kc is kc
+        # Mỗi client mới mở thêm ~15 fd và một luồng, chạy lặp không được làm tăng số này
+        assert process.num_fds() <= fds + 2
+        assert process.num_threads() <= threads + 1
+    finally:
+        kernel.shutdown()
@@ -0,0 +1,73 @@
+import json
+
+import pytest
+
+import config
+from notebook_index import NO_DESCRIPTION, NotebookIndex, _parse_value, declared_parameters, extract_metadata, read_notebook_light
+
+
+def _write_notebook(path, cells, metadata=None):
+    path.write_text(json.dumps({"cells": cells, "metadata": metadata or {}, "nbformat": 4, "nbformat_minor": 5}))
+    return str(path)
+
+
+def test_parse_value_matches_json_for_plain_documents():
+    text = '{"a": [1, 2.5, {"b": null}], "c": "x\\"y", "d": true, "e": {}}'
+    assert _parse_value(text, 0)[0] == json.loads(text)
+
+
+def test_outputs_are_skipped_without_decoding():
+    # Chuỗi trong outputs chứa ngoặc, dấu nháy escape và backslash ở cuối chuỗi
+    outputs = [{"data": {"text/plain": ["]}{ \"quoted\" [[", "ends with \\\\"]}, "output_type": "execute_result"}]
+    cell = {"cell_type": "code", "source": ["x = 1"], "metadata": {}, "outputs": outputs, "execution_count": 1}
+    text = json.dumps({"cells": [cell], "metadata": {"k": "v"}})
+    parsed = _parse_value(text, 0)[0]
+    assert parsed["cells"][0]["outputs"] is None
+    assert parsed["cells"][0]["execution_count"] == 1
+    assert parsed["metadata"] == {"k": "v"}
+
+
+def test_truncated_document_raises():
+    with pytest.raises((ValueError, IndexError)):
+        _parse_value('{"cells": [{"outputs": [{"a": "b"', 0)
+
+
+def test_declared_parameters():
+    source = "thang = 1\nphong: str = 'HR'\nds = [1,\n  2]\nprint(thang)\nx, y = 1, 2"
+    assert declared_parameters(source) == {"thang": "1", "phong": "'HR'", "ds": "[1,\n  2]"}
+    assert declared_parameters("%magic") == {}
+
+
+def test_extract_metadata(tmp_path):
+    cells = [
+        {"cell_type": "markdown", "source": ["# Báo cáo tháng\n", "chi tiết"], "metadata": {}},
+        {"cell_type": "code", "source": "thang = 1", "metadata": {"tags": ["parameters"]}, "outputs": []},
+        {"cell_type": "code", "source": "import pandas as pd\nfrom os import path\n%time x", "metadata": {"tags": ["loop"]}, "outputs": []},
+    ]
+    metadata = {"kernelspec": {"name": "python3"}, config.NOTEBOOK_METADATA_KEY: {"depends_on": "a.ipynb"}}
+    path = _write_notebook(tmp_path / "report.ipynb", cells, metadata)
+    entry = extract_metadata(read_notebook_light(path))
+    assert entry == {
+        "description": "Báo cáo tháng",
+        "tags": ["parameters", "loop"],
+        "kernel": "python3",
+        "cell_count": 3,
+        "parameters": {"thang": "1"},
+        "imports": ["os", "pandas"],
+        "depends_on": ["a.ipynb"],
+    }
+    assert extract_metadata({"cells": []})["description"] == NO_DESCRIPTION
+
+
+def test_index_reads_again_only_when_file_changes(tmp_path):
+    path = _write_notebook(tmp_path / "a.ipynb", [{"cell_type": "markdown", "source": "# Một", "metadata": {}}])
+    index = NotebookIndex(str(tmp_path / "index.json"))
+    assert index.description(path) == "Một"
+    index.save()
+
+    reloaded = NotebookIndex(str(tmp_path / "index.json"))
+    assert reloaded.get(path)["description"] == "Một"
+    _write_notebook(tmp_path / "a.ipynb", [{"cell_type": "markdown", "source": "# Hai dài hơn", "metadata": {}}])
+    assert reloaded.description(path) == "Hai dài hơn"
+    reloaded.prune([])
+    assert reloaded.get(str(tmp_path / "missing.ipynb")) is None
@@ -0,0 +1,102 @@
+import nbformat
+import pytest
+
+from parameters import (
+    INJECTED_PARAMETERS_TAG,
+    expand_grid,
+    format_parameters,
+    inject_parameters,
+    parse_parameters,
+    run_output_name,
+    split_at_parameters,
+    split_grid,
+)
+
+
+def test_parse_parameters_json_and_assignments():
+    assert parse_parameters("") == {}
+    assert parse_parameters('{"thang": 1, "phong": "HR"}') == {"thang": 1, "phong": "HR"}
+    assert parse_parameters("thang = 1; phong='HR'\nds=[1, 2]") == {"thang": 1, "phong": "HR", "ds": [1, 2]}
+
+
+@pytest.mark.parametrize("text", ['{"a": ', "[1, 2]", "thang", "1x = 2", "a = os.getcwd()"])
+def test_parse_parameters_rejects_invalid(text):
+    with pytest.raises(ValueError):
+        parse_parameters(text)
+
+
+def test_split_grid():
+    assert split_grid({"nam": 2024, "thang": [1, 2]}) == ({"nam": 2024}, {"thang": [1, 2]})
+
+
+def test_expand_grid_cartesian_product_in_key_order():
+    assert expand_grid({"thang": [1, 2], "phong": ["HR", "IT"], "nam": 2024}) == [
+        {"thang": 1, "phong": "HR", "nam": 2024},
+        {"thang": 1, "phong": "IT", "nam": 2024},
+        {"thang": 2, "phong": "HR", "nam": 2024},
+        {"thang": 2, "phong": "IT", "nam": 2024},
+    ]
+
+
+def test_expand_grid_list_of_dicts():
+    grid = [{"a": 1}, {"a": 2, "b": 3}]
+    expanded = expand_grid(grid)
+    assert expanded == grid
+    assert expanded[0] is not grid[0]
+
+
+@pytest.mark.parametrize("grid", [{}, {"a": []}, [1, 2], "a"])
+def test_expand_grid_rejects_invalid(grid):
+    with pytest.raises(ValueError):
+        expand_grid(grid)
+
+
+def test_format_parameters():
+    assert format_parameters({"thang": 1, "phong": "HR"}) == "thang=1, phong='HR'"
+
+
+def _notebook(*sources, parameters_index=None):
+    cells = [nbformat.v4.new_code_cell(source) for source in sources]
+    if parameters_index is not None:
+        cells[parameters_index].metadata["tags"] = ["parameters"]
+    return nbformat.v4.new_notebook(cells=cells)
+
+
+def test_inject_parameters_after_parameters_cell():
+    nb = _notebook("import os", "thang = 1\nnam = 2023", "print(thang)", parameters_index=1)
+    nb, unknown, has_cell = inject_parameters(nb, {"thang": 5, "phong": "HR"})
+    assert has_cell
+    assert unknown == ["phong"]
+    assert INJECTED_PARAMETERS_TAG in nb.cells[2].metadata["tags"]
+    assert "thang = 5" in nb.cells[2].source
+    assert nb.cells[3].source == "print(thang)"
+
+
+def test_inject_parameters_replaces_previous_injection():
+    nb = _notebook("thang = 1", parameters_index=0)
+    nb, _, _ = inject_parameters(nb, {"thang": 2})
+    nb, _, _ = inject_parameters(nb, {"thang": 3})
+    injected = [cell for cell in nb.cells if INJECTED_PARAMETERS_TAG in cell.metadata.get("tags", [])]
+    assert len(injected) == 1
+    assert "thang = 3" in injected[0].source
+
+
+def test_inject_parameters_without_parameters_cell_goes_first():
+    nb, unknown, has_cell = inject_parameters(_notebook("print(1)"), {"a": 1})
+    assert not has_cell
+    assert unknown == []
+    assert "a = 1" in nb.cells[0].source
+
+
+def test_split_at_parameters():
+    nb = _notebook("import pandas", "thang = 1", "print(thang)", parameters_index=1)
+    setup_nb, tail_nb = split_at_parameters(nb)
+    assert [cell.source for cell in setup_nb.cells] == ["import pandas"]
+    assert [cell.source for cell in tail_nb.cells] == ["thang = 1", "print(thang)"]
+    assert split_at_parameters(_notebook("thang = 1", parameters_index=0)) is None
+    assert split_at_parameters(_notebook("x = 1")) is None
+
+
+def test_run_output_name_is_filesystem_safe():
+    assert run_output_name(3, {"thang": 1, "phong": "R&D / HR"}) == "003_thang=1_phong=R-D-HR.ipynb"
+    assert run_output_name(1, {}) == "001.ipynb"
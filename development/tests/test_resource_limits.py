@@ -0,0 +1,44 @@
+import pytest
+
+from resource_limits import ResourceLimits, format_cpu_list, parse_cpu_list
+
+
+def test_parse_cpu_list():
+    assert parse_cpu_list(None) is None
+    assert parse_cpu_list("") is None
+    assert parse_cpu_list("0-2, 5,1") == [0, 1, 2, 5]
+    assert parse_cpu_list([3, 1, 3]) == [1, 3]
+    assert format_cpu_list([0, 1, 4]) == "0,1,4"
+
+
+@pytest.mark.parametrize("value", ["a", "1-x", [-1]])
+def test_parse_cpu_list_rejects_invalid(value):
+    with pytest.raises(ValueError):
+        parse_cpu_list(value)
+
+
+def test_from_dict_rejects_unknown_fields_and_negative_values():
+    with pytest.raises(ValueError):
+        ResourceLimits.from_dict({"memory": 100})
+    with pytest.raises(ValueError):
+        ResourceLimits.from_dict({"timeout": -1})
+    assert ResourceLimits.from_dict(None).is_empty()
+
+
+def test_merged_prefers_override_fields():
+    section = ResourceLimits(memory_mb=1024, timeout=60, nice=5, cell_timeout=300)
+    card = ResourceLimits(memory_mb=2048, cpu_affinity="0-1", adaptive_timeout=3)
+    merged = section.merged(card)
+    assert merged.to_dict() == {
+        "memory_mb": 2048,
+        "timeout": 60.0,
+        "nice": 5,
+        "cpu_affinity": [0, 1],
+        "cell_timeout": 300.0,
+        "adaptive_timeout": 3.0,
+    }
+
+
+def test_describe():
+    assert ResourceLimits().describe() == "Không giới hạn"
+    assert ResourceLimits(memory_mb=512, timeout=90, cpu_affinity=[0]).describe() == "RAM 512MB, 90s/lần lặp, CPU 0"
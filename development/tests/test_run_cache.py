@@ -0,0 +1,85 @@
+import os
+
+import nbformat
+import pytest
+
+import config
+from run_cache import RunCache, collect_input_files, declared_inputs
+
+
+def _notebook(inputs=None, source="x = 1"):
+    nb = nbformat.v4.new_notebook(cells=[nbformat.v4.new_code_cell(source)])
+    if inputs is not None:
+        nb.metadata[config.NOTEBOOK_METADATA_KEY] = {"inputs": inputs}
+    return nb
+
+
+@pytest.fixture
+def workspace(tmp_path):
+    notebook_dir = tmp_path / "notebook"
+    data_dir = tmp_path / "data"
+    module_dir = tmp_path / "module"
+    for directory in (notebook_dir, data_dir, module_dir):
+        directory.mkdir()
+    (data_dir / "sales.csv").write_text("a,b\n1,2\n")
+    (module_dir / "helpers.py").write_text("X = 1\n")
+    (module_dir / "notes.txt").write_text("không phải module")
+    return tmp_path
+
+
+def test_declared_inputs():
+    assert declared_inputs(_notebook()) is None
+    assert declared_inputs(_notebook("../data/a.csv")) == ["../data/a.csv"]
+    assert declared_inputs(_notebook(["a", "b"])) == ["a", "b"]
+
+
+def test_collect_input_files_resolves_relative_to_notebook(workspace):
+    notebook_path = str(workspace / "notebook" / "report.ipynb")
+    files = collect_input_files(notebook_path, ["../data/*.csv", "../data/missing.xlsx"], [str(workspace / "module")])
+    assert files[0].endswith(os.path.join("data", "sales.csv"))
+    assert files[1].startswith("missing:")
+    assert files[2].endswith("helpers.py")
+    assert len(files) == 3
+
+
+def test_fingerprint_is_none_without_inputs(workspace):
+    cache = RunCache(str(workspace / "cache"))
+    assert cache.fingerprint(str(workspace / "notebook" / "a.ipynb"), _notebook(), []) is None
+
+
+def test_fingerprint_changes_with_source_and_inputs(workspace):
+    cache = RunCache(str(workspace / "cache"))
+    notebook_path = str(workspace / "notebook" / "a.ipynb")
+    nb = _notebook(["../data/sales.csv"])
+    key, files = cache.fingerprint(notebook_path, nb, [])
+
+    assert cache.fingerprint(notebook_path, nb, [])[0] == key
+    assert cache.fingerprint(notebook_path, _notebook(["../data/sales.csv"], "x = 2"), [])[0] != key
+
+    data_file = workspace / "data" / "sales.csv"
+    data_file.write_text("a,b\n1,3\n")
+    os.utime(data_file, ns=(1, 1))
+    assert cache.fingerprint(notebook_path, nb, [], {"files": files})[0] != key
+
+
+def test_fingerprint_reuses_hash_when_stat_unchanged(workspace):
+    cache = RunCache(str(workspace / "cache"))
+    notebook_path = str(workspace / "notebook" / "a.ipynb")
+    nb = _notebook(["../data/sales.csv"])
+    _, files = cache.fingerprint(notebook_path, nb, [])
+    path = next(iter(files))
+    # Hash cũ được dùng lại khi mtime/kích thước không đổi, không đọc lại file
+    files[path] = [files[path][0], files[path][1], "hash-cũ"]
+    _, reused = cache.fingerprint(notebook_path, nb, [], {"files": files})
+    assert reused[path][2] == "hash-cũ"
+
+
+def test_store_and_load_roundtrip(workspace):
+    cache = RunCache(str(workspace / "cache"))
+    notebook_path = str(workspace / "notebook" / "a.ipynb")
+    assert cache.load(notebook_path) is None
+    cache.store(notebook_path, "key", {"f": [1, 2, "h"]}, "output")
+    entry = cache.load(notebook_path)
+    assert entry["key"] == "key"
+    assert entry["output"] == "output"
+    assert os.listdir(workspace / "cache") == [os.path.basename(cache._entry_path(notebook_path))]
@@ -0,0 +1,106 @@
+import threading
+import time
+from multiprocessing import Process
+
+from run_channels import RunChannels
+
+
+def _send_then_block(channel, name):
+    channel.put(("SECTION_LOG", f"{name} started"))
+    threading.Event().wait()
+
+
+def _send_and_exit(channel, name):
+    for i in range(3):
+        channel.put(("SECTION_LOG", f"{name} {i}"))
+
+
+def _collect(channels, expected, timeout=10):
+    # wait() trả về [] khi bị đánh thức (mở/đóng kênh) nên chờ theo hạn chót
+    deadline = time.monotonic() + timeout
+    messages = []
+    while len(messages) < expected and time.monotonic() < deadline:
+        messages.extend(channels.wait(timeout))
+    return messages
+
+
+def _wait_all_closed(channels, timeout=10):
+    deadline = time.monotonic() + timeout
+    while channels.open_count and time.monotonic() < deadline:
+        assert channels.wait(timeout) == []
+    return channels.open_count == 0
+
+
+def _start(channels, target, name):
+    run_id, channel = channels.open()
+    process = Process(target=target, args=(channel, name), daemon=True)
+    process.start()
+    RunChannels.release_writer(channel)
+    return run_id, process
+
+
+def test_messages_are_tagged_with_run_id():
+    channels = RunChannels()
+    try:
+        run_a, proc_a = _start(channels, _send_and_exit, "a")
+        run_b, proc_b = _start(channels, _send_and_exit, "b")
+        messages = _collect(channels, 6)
+        assert [m for r, m in messages if r == run_a] == [("SECTION_LOG", f"a {i}") for i in range(3)]
+        assert [m for r, m in messages if r == run_b] == [("SECTION_LOG", f"b {i}") for i in range(3)]
+        proc_a.join(5)
+        proc_b.join(5)
+        # EOF sau khi tiến trình kết thúc: kênh tự đóng
+        assert _wait_all_closed(channels)
+    finally:
+        channels.shutdown()
+
+
+def test_killed_process_only_breaks_its_own_channel():
+    channels = RunChannels()
+    try:
+        run_killed, killed = _start(channels, _send_then_block, "killed")
+        run_alive, alive = _start(channels, _send_then_block, "alive")
+        assert sorted(_collect(channels, 2)) == [
+            (run_killed, ("SECTION_LOG", "killed started")),
+            (run_alive, ("SECTION_LOG", "alive started")),
+        ]
+        killed.kill()
+        killed.join(5)
+        deadline = time.monotonic() + 10
+        while channels.open_count > 1 and time.monotonic() < deadline:
+            channels.wait(10)
+        # Chỉ kênh của tiến trình bị kill bị đóng, các kênh khác vẫn nhận message bình thường
+        assert channels.open_count == 1
+
+        run_ok, ok = _start(channels, _send_and_exit, "ok")
+        assert _collect(channels, 3) == [(run_ok, ("SECTION_LOG", f"ok {i}")) for i in range(3)]
+        ok.join(5)
+        alive.kill()
+        alive.join(5)
+        assert _wait_all_closed(channels)
+    finally:
+        channels.shutdown()
+
+
+def test_close_and_shutdown_wake_a_blocked_waiter():
+    channels = RunChannels()
+    run_id, writer = channels.open()
+    results = []
+    waiter = threading.Thread(target=lambda: results.append(channels.wait()))
+    waiter.start()
+    channels.close(run_id)
+    waiter.join(5)
+    assert results == [[]]
+    assert channels.wait(0) == []
+    assert channels.open_count == 0
+    # Ghi vào kênh đã đóng phía đọc không làm hỏng tiến trình ghi
+    writer.put(("SECTION_LOG", "sau khi đóng"))
+    writer.close()
+
+    waiter = threading.Thread(target=lambda: results.append(channels.wait()))
+    waiter.start()
+    channels.shutdown()
+    waiter.join(5)
+    assert not waiter.is_alive()
+    assert channels.is_shut_down
+    assert channels.wait(None) == []
@@ -0,0 +1,195 @@
+from datetime import datetime
+
+import pytest
+
+import scheduler
+from scheduler import CronSchedule, IntervalSchedule, ScheduledTask, Scheduler, _parse_cron_field, parse_schedule
+
+
+def ts(*args):
+    return datetime(*args).timestamp()
+
+
+def test_parse_cron_field_syntax():
+    assert _parse_cron_field("*/15", 0, 59) == [0, 15, 30, 45]
+    assert _parse_cron_field("1-3,10", 0, 59) == [1, 2, 3, 10]
+    assert _parse_cron_field("5/20", 0, 59) == [5, 25, 45]
+    assert _parse_cron_field("mon-fri", 0, 7, scheduler.WEEKDAY_NAMES) == [1, 2, 3, 4, 5]
+
+
+@pytest.mark.parametrize("text", ["60", "*/0", "5-1", "x"])
+def test_parse_cron_field_rejects_invalid(text):
+    with pytest.raises(ValueError):
+        _parse_cron_field(text, 0, 59)
+
+
+def test_cron_next_after():
+    schedule = CronSchedule("*/15 9-17 * * mon-fri")
+    # Thứ Sáu 2024-03-01 17:50 -> thứ Hai 2024-03-04 09:00
+    assert schedule.next_after(ts(2024, 3, 1, 17, 50)) == ts(2024, 3, 4, 9, 0)
+    assert schedule.next_after(ts(2024, 3, 4, 9, 0)) == ts(2024, 3, 4, 9, 15)
+
+
+def test_cron_with_seconds_field():
+    schedule = CronSchedule("*/20 * * * * *")
+    assert schedule.next_after(ts(2024, 1, 1, 0, 0, 5)) == ts(2024, 1, 1, 0, 0, 20)
+    assert schedule.next_after(ts(2024, 1, 1, 0, 0, 40)) == ts(2024, 1, 1, 0, 1, 0)
+
+
+def test_cron_day_or_weekday_like_cron():
+    # Ngày 13 hoặc thứ Sáu: 2024-09-06 là thứ Sáu, tới trước ngày 13
+    schedule = CronSchedule("0 0 13 * fri")
+    assert schedule.next_after(ts(2024, 9, 1)) == ts(2024, 9, 6)
+    assert schedule.next_after(ts(2024, 9, 12, 1)) == ts(2024, 9, 13)
+
+
+def test_cron_macros_and_names():
+    assert CronSchedule("@monthly").next_after(ts(2024, 1, 15)) == ts(2024, 2, 1)
+    assert CronSchedule("0 6 1 jan *").next_after(ts(2024, 1, 2)) == ts(2025, 1, 1, 6)
+
+
+def test_cron_that_never_matches_is_rejected():
+    with pytest.raises(ValueError):
+        CronSchedule("0 0 30 2 *")
+    with pytest.raises(ValueError):
+        CronSchedule("* * *")
+
+
+def test_parse_schedule_forms():
+    assert parse_schedule("07:30").next_after(ts(2024, 1, 1, 8)) == ts(2024, 1, 2, 7, 30)
+    interval = parse_schedule("every 1h30m", anchor=1000)
+    assert isinstance(interval, IntervalSchedule)
+    assert interval.interval == 5400
+    with pytest.raises(ValueError):
+        parse_schedule("25:00")
+    with pytest.raises(ValueError):
+        parse_schedule("")
+
+
+def test_interval_does_not_drift():
+    schedule = IntervalSchedule(60, anchor=100)
+    assert schedule.next_after(50) == 100
+    assert schedule.next_after(100) == 160
+    assert schedule.next_after(219.5) == 220
+
+
+class FakeClock:
+    def __init__(self, now):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def quiet_log(monkeypatch):
+    messages = []
+    monkeypatch.setattr(scheduler, "log_message", lambda message, **fields: messages.append(message))
+    return messages
+
+
+def _run_missed(catch_up, quiet_log):
+    clock = FakeClock(ts(2024, 1, 1, 0, 0, 30))
+    fired, wakeups = [], []
+    runner = Scheduler(lambda task, scheduled: fired.append(scheduled), lambda delay, callback: wakeups.append(delay), clock=clock)
+    task = runner.add(ScheduledTask("S", "run", "every 1m", catch_up=catch_up, created_at=ts(2024, 1, 1)))
+    assert task.next_run == ts(2024, 1, 1, 0, 1)
+    # Máy ngủ 5 phút rưỡi: lỡ các lần 00:01 ... 00:05
+    clock.now = ts(2024, 1, 1, 0, 5, 30)
+    runner.run_due()
+    return fired, task
+
+
+def test_catch_up_all_runs_every_missed_occurrence(quiet_log):
+    fired, task = _run_missed("all", quiet_log)
+    assert fired == [ts(2024, 1, 1, 0, minute) for minute in range(1, 6)]
+    assert task.next_run == ts(2024, 1, 1, 0, 6)
+
+
+def test_catch_up_once_runs_latest_occurrence(quiet_log):
+    fired, task = _run_missed("once", quiet_log)
+    assert fired == [ts(2024, 1, 1, 0, 5)]
+    assert task.next_run == ts(2024, 1, 1, 0, 6)
+    assert quiet_log
+
+
+def test_catch_up_skip_drops_late_occurrences(quiet_log, monkeypatch):
+    monkeypatch.setattr(scheduler.config, "SCHEDULER_MISFIRE_GRACE", 10)
+    fired, task = _run_missed("skip", quiet_log)
+    assert fired == []
+    assert task.next_run == ts(2024, 1, 1, 0, 6)
+
+
+def test_removed_task_does_not_fire(quiet_log):
+    clock = FakeClock(ts(2024, 1, 1))
+    fired = []
+    runner = Scheduler(lambda task, scheduled: fired.append(task), lambda delay, callback: None, clock=clock)
+    task = runner.add(ScheduledTask("S", "run", "every 1m", created_at=ts(2024, 1, 1)))
+    runner.remove(task.task_id)
+    clock.now = ts(2024, 1, 1, 0, 2)
+    assert runner.run_due() == 0
+    assert fired == []
+
+
+def test_task_roundtrip(quiet_log):
+    task = ScheduledTask("S", "run", "0 6 * * *", jitter=5, catch_up="skip", task_id=3, created_at=10)
+    task.next_run = 1234
+    restored = ScheduledTask.from_dict(task.to_dict())
+    assert restored.to_dict() == task.to_dict()
+    with pytest.raises(ValueError):
+        ScheduledTask("S", "run", "0 6 * * *", catch_up="never")
+
+
+def test_task_without_section_id_is_keyed_by_name(quiet_log):
+    data = ScheduledTask("S", "run", "every 1m", task_id=1, created_at=0).to_dict()
+    del data["section_id"]
+    assert ScheduledTask.from_dict(data).section_id == "S"
+
+
+def test_restart_defers_catch_up_until_section_is_restored(tmp_path, quiet_log):
+    path = str(tmp_path / "schedules.json")
+    clock = FakeClock(ts(2024, 1, 1, 0, 0, 30))
+    before = Scheduler(lambda task, scheduled: None, lambda delay, callback: None, path=path, clock=clock)
+    before.add(ScheduledTask("Section 1", "run", "every 1m", section_id="section_1", created_at=ts(2024, 1, 1)))
+    before.close()
+
+    # Khởi động lại sau 5 phút, lúc chưa có section nào
+    clock.now = ts(2024, 1, 1, 0, 5, 30)
+    sections, fired = set(), []
+    after = Scheduler(
+        lambda task, scheduled: fired.append((task.section_id, scheduled)),
+        lambda delay, callback: None,
+        path=path,
+        clock=clock,
+        is_available=lambda task: task.section_id in sections,
+    )
+    after.load()
+    assert after.run_due() == 0
+    task = after.tasks()[0]
+    assert after.is_deferred(task.task_id)
+    # Lần chạy bị lỡ vẫn được giữ, kể cả khi ứng dụng lại bị tắt
+    assert task.next_run == ts(2024, 1, 1, 0, 1)
+    after.save()
+    reloaded = Scheduler(None, lambda delay, callback: None, path=path, clock=clock)
+    reloaded.load()
+    assert [t.next_run for t in reloaded.tasks()] == [ts(2024, 1, 1, 0, 1)]
+
+    # Section khác được tạo không làm tác vụ chạy
+    sections.add("section_2")
+    after.retry_deferred()
+    assert after.run_due() == 0
+
+    sections.add("section_1")
+    after.retry_deferred()
+    assert after.run_due() == 1
+    assert fired == [("section_1", ts(2024, 1, 1, 0, 5))]
+    assert not after.is_deferred(task.task_id)
+    assert task.next_run == ts(2024, 1, 1, 0, 6)
+
+
+def test_remove_section_drops_its_tasks(quiet_log):
+    runner = Scheduler(lambda task, scheduled: None, lambda delay, callback: None, clock=FakeClock(ts(2024, 1, 1)))
+    runner.add(ScheduledTask("A", "run", "every 1m", section_id="section_1"))
+    runner.add(ScheduledTask("B", "run", "every 1m", section_id="section_2"))
+    assert [task.section_name for task in runner.remove_section("section_1")] == ["A"]
+    assert [task.section_id for task in runner.tasks()] == ["section_2"]